@@ -0,0 +1,307 @@
+import hashlib
+import json
+import logging
+import time
+
+import httpx
+
+from chunker import count_tokens, tokenize, truncate_tokens
+from embedding_cache import normalize_text
+from lru_cache import LRUCache
+from metrics import STAGE_SECONDS, span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SYSTEM_PROMPT = (
+    "你是企业知识库助手。只根据给出的资料回答问题，资料中没有答案时直接说明无法从资料中找到答案。"
+    "引用资料时在句末标注资料编号，例如 [1]。"
+)
+# 每段资料的编号、来源等标注行大约占用的 token 数
+PASSAGE_OVERHEAD_TOKENS = 12
+# 判断两个块重叠时使用的 token n-gram 长度
+SHINGLE_SIZE = 8
+
+
+def _shingles(text: str) -> set:
+    tokens = tokenize(text.lower())
+    if len(tokens) < SHINGLE_SIZE:
+        return {" ".join(tokens)} if tokens else set()
+    return {" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+
+
+def _edge_overlap(left: str, right: str, min_chars: int) -> int:
+    """left 的后缀与 right 的前缀重合的最大长度（相邻块之间的 chunk_overlap），不足 min_chars 时返回 0"""
+    if len(left) < min_chars or len(right) < min_chars:
+        return 0
+    probe = right[:min_chars]
+    start = max(0, len(left) - len(right))
+    while True:
+        pos = left.find(probe, start)
+        if pos < 0:
+            return 0
+        if right.startswith(left[pos:]):
+            return len(left) - pos
+        start = pos + 1
+
+
+def pack_context(hits, max_tokens: int, containment: float = 0.8, min_overlap_chars: int = 20) -> list:
+    """按相关度依次选取检索结果放入上下文，直到用完 token 预算
+
+    - 与已选内容的 n-gram 重合比例不低于 containment 的块视为重复，跳过；
+    - 同一文件相邻块之间的重叠部分（分块时的 chunk_overlap）只保留一份；
+    - 放不下的块跳过，继续尝试后面更短的块；第一块本身超出预算时截断。
+
+    返回 [{"id", "text", "metadata", "score", "tokens"}]，按文件和在文件中的位置排序：
+    相同的资料集合总是得到相同的提示词前缀，便于模型服务复用前缀的 KV 缓存。
+    """
+    selected = []
+    seen = set()
+    used = 0
+    for hit in hits:
+        text = hit["text"].strip()
+        shingles = _shingles(text)
+        if not shingles or len(shingles & seen) >= containment * len(shingles):
+            continue
+
+        source = (hit.get("metadata") or {}).get("source")
+        for passage in selected:
+            if (passage["metadata"] or {}).get("source") != source:
+                continue
+            overlap = _edge_overlap(passage["text"], text, min_overlap_chars)
+            if overlap:
+                text = text[overlap:].lstrip()
+            overlap = _edge_overlap(text, passage["text"], min_overlap_chars)
+            if overlap:
+                text = text[:len(text) - overlap].rstrip()
+        if not text:
+            continue
+
+        tokens = count_tokens(text) + PASSAGE_OVERHEAD_TOKENS
+        if used + tokens > max_tokens:
+            if selected or max_tokens <= PASSAGE_OVERHEAD_TOKENS:
+                continue
+            text = truncate_tokens(text, max_tokens - PASSAGE_OVERHEAD_TOKENS)
+            tokens = max_tokens
+        selected.append({
+            "id": hit.get("id"),
+            "text": text,
+            "metadata": hit.get("metadata") or {},
+            "score": hit.get("score"),
+            "tokens": tokens,
+        })
+        seen |= shingles
+        used += tokens
+
+    def position(passage):
+        metadata = passage["metadata"]
+        return (
+            str(metadata.get("source", "")),
+            metadata.get("page") or 0,
+            metadata.get("chunk_index", 0),
+            passage["id"] if isinstance(passage["id"], int) else 0,
+        )
+
+    return sorted(selected, key=position)
+
+
+def build_prompt(question: str, passages) -> str:
+    """资料在前、问题在后：同一批资料上的不同问题共享提示词前缀"""
+    blocks = []
+    for i, passage in enumerate(passages, 1):
+        metadata = passage["metadata"]
+        label = metadata.get("source", "")
+        if metadata.get("page"):
+            label += f" 第 {metadata['page']} 页"
+        if metadata.get("path"):
+            label += f" {metadata['path']}"
+        blocks.append(f"[{i}] {label}\n{passage['text']}")
+    context = "\n\n".join(blocks) if blocks else "（没有检索到相关资料）"
+    return f"资料：\n\n{context}\n\n问题：{question}\n回答："
+
+
+def format_sse(event: str, data) -> str:
+    """Server-Sent Events 格式的一条消息，data 以 JSON 编码（可以包含换行）"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class GenerationError(Exception):
+    """模型服务返回错误"""
+
+
+class OllamaLLM:
+    """Ollama /api/generate 的流式客户端
+
+    keep_alive 让模型（及其 KV 缓存）在两次请求之间常驻，提示词前缀相同的请求不必重新计算前缀。
+    任何实现了同样 stream() 接口的对象都可以替换它（例如测试用的桩服务或其他模型服务）。
+    """
+
+    def __init__(
+        self,
+        url: str = "http://localhost:11434/api/generate",
+        model_name: str = "qwen2.5:7b",
+        keep_alive: str = "30m",
+        options: dict = None,
+        timeout: float = 300.0,
+        max_connections: int = 8,
+    ):
+        self.url = url
+        self.model_name = model_name
+        self.keep_alive = keep_alive
+        self.options = options or {}
+        self.timeout = timeout
+        self.max_connections = max(1, max_connections)
+        self._client = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # 在事件循环中第一次使用时创建
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout, connect=10.0),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+        return self._client
+
+    async def stream(self, prompt: str, system: str = None, stats: dict = None):
+        """逐段产出生成的文本；结束时把模型服务返回的统计（token 数、耗时）写入 stats"""
+        payload = {
+            "model": self.model_name,
+            "prompt": prompt,
+            "stream": True,
+            "keep_alive": self.keep_alive,
+        }
+        if system:
+            payload["system"] = system
+        if self.options:
+            payload["options"] = self.options
+        async with self._get_client().stream("POST", self.url, json=payload) as response:
+            if response.status_code != 200:
+                body = (await response.aread()).decode("utf-8", "replace")
+                raise GenerationError(f"LLM returned HTTP {response.status_code}: {body[:200]}")
+            async for line in response.aiter_lines():
+                if not line.strip():
+                    continue
+                data = json.loads(line)
+                if data.get("error"):
+                    raise GenerationError(data["error"])
+                if data.get("response"):
+                    yield data["response"]
+                if data.get("done"):
+                    if stats is not None:
+                        stats.update({
+                            key: data[key]
+                            for key in ("prompt_eval_count", "eval_count", "prompt_eval_duration", "eval_duration")
+                            if key in data
+                        })
+                    return
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class AnswerGenerator:
+    """检索结果 -> 上下文打包 -> 提示词 -> 流式生成，完整的答案按 (问题, 资料) 缓存
+
+    缓存键包含打包后的资料内容，文档更新后检索到的资料变化时自然不会命中旧答案。
+    """
+
+    def __init__(
+        self,
+        llm,
+        system_prompt: str = DEFAULT_SYSTEM_PROMPT,
+        max_context_tokens: int = 3000,
+        cache_size: int = 1000,
+        cache_ttl: float = 3600.0,
+    ):
+        self.llm = llm
+        self.system_prompt = system_prompt
+        self.max_context_tokens = max_context_tokens
+        self.cache = LRUCache(max_entries=cache_size, ttl=cache_ttl)
+        self.generated = 0
+        self.failed = 0
+
+    def prepare(self, question: str, hits, max_context_tokens: int = None):
+        """打包上下文，返回 (提示词, 资料列表, 缓存键)"""
+        with span("pack_context"):
+            passages = pack_context(hits, max_context_tokens or self.max_context_tokens)
+            prompt = build_prompt(question, passages)
+        digest = hashlib.sha256()
+        for part in (getattr(self.llm, "model_name", ""), self.system_prompt, normalize_text(question).lower()):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        for passage in passages:
+            digest.update(passage["text"].encode("utf-8"))
+            digest.update(b"\0")
+        return prompt, passages, digest.hexdigest()
+
+    @staticmethod
+    def sources(passages) -> list:
+        return [
+            {"index": i, "id": p["id"], "text": p["text"], "metadata": p["metadata"], "score": p["score"]}
+            for i, p in enumerate(passages, 1)
+        ]
+
+    async def stream(self, question: str, hits, max_context_tokens: int = None):
+        """产出 (事件名, 数据)：先是 sources，然后逐段 token，最后 done；出错时为 error"""
+        prompt, passages, key = self.prepare(question, hits, max_context_tokens)
+        yield "sources", self.sources(passages)
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            yield "token", {"text": cached["answer"]}
+            yield "done", {"cached": True, **cached["stats"]}
+            return
+
+        start = time.perf_counter()
+        first_token = None
+        parts = []
+        stats = {}
+        try:
+            with span("llm_generate"):
+                async for text in self.llm.stream(prompt, system=self.system_prompt, stats=stats):
+                    if first_token is None:
+                        first_token = time.perf_counter() - start
+                        STAGE_SECONDS.observe(first_token, stage="llm_first_token")
+                    parts.append(text)
+                    yield "token", {"text": text}
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Answer generation failed: {e}")
+            yield "error", {"detail": str(e)}
+            return
+
+        self.generated += 1
+        stats.update({
+            "context_tokens": sum(p["tokens"] for p in passages),
+            "first_token_ms": round(first_token * 1000, 1) if first_token is not None else None,
+            "generation_ms": round((time.perf_counter() - start) * 1000, 1),
+        })
+        self.cache.put(key, {"answer": "".join(parts), "stats": stats})
+        yield "done", {"cached": False, **stats}
+
+    async def answer(self, question: str, hits, max_context_tokens: int = None) -> dict:
+        """非流式：生成完整答案"""
+        result = {"answer": "", "sources": [], "cached": False}
+        parts = []
+        async for event, data in self.stream(question, hits, max_context_tokens):
+            if event == "sources":
+                result["sources"] = data
+            elif event == "token":
+                parts.append(data["text"])
+            elif event == "error":
+                raise GenerationError(data["detail"])
+            elif event == "done":
+                result.update(data)
+        result["answer"] = "".join(parts)
+        return result
+
+    def stats(self) -> dict:
+        return {"generated": self.generated, "failed": self.failed, "cache": self.cache.stats()}
+
+    async def aclose(self):
+        if hasattr(self.llm, "aclose"):
+            await self.llm.aclose()
@@ -0,0 +1,129 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class BulkWriter:
+    """缓冲写入：攒够 max_rows 行 / max_bytes 字节，或最早的一批等待超过 max_delay 秒后，合并成一次写入
+
+    write(batches) 一次写入多批数据，返回与 batches 一一对应的结果；
+    每批写入成功后调用 callback(result, None)，失败时调用 callback(None, error)。
+    缓冲的行数超过 2 * max_rows 时 add 阻塞，直到后台线程写完（背压）。
+    """
+
+    def __init__(self, write, max_rows: int = 2048, max_bytes: int = 32 * 1024 * 1024, max_delay: float = 0.5):
+        self._write = write
+        self.max_rows = max(1, max_rows)
+        self.max_bytes = max_bytes
+        self.max_delay = max_delay
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()  # 同一时刻只有一次写入，保证写入顺序
+        self._batches = []  # [(batch, rows, callback)]
+        self._rows = 0
+        self._bytes = 0
+        self._oldest = None  # 缓冲中最早一批的加入时间
+        self._closed = False
+        self.writes = 0
+        self.rows_written = 0
+        self.errors = 0
+        self._thread = threading.Thread(target=self._run, name="bulk-writer", daemon=True)
+        self._thread.start()
+
+    def add(self, batch, rows: int, nbytes: int = 0, callback=None):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("BulkWriter is closed")
+            while self._rows >= 2 * self.max_rows:
+                self._cond.wait()
+            self._batches.append((batch, rows, callback))
+            self._rows += rows
+            self._bytes += nbytes
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            self._cond.notify_all()
+
+    def flush(self) -> int:
+        """立即写入缓冲中的全部数据（等待正在进行的写入完成），返回写入的行数"""
+        with self._flush_lock:
+            with self._cond:
+                batches = self._take()
+            results, error = self._write_batches(batches)
+        self._notify(batches, results, error)
+        return sum(rows for _, rows, _ in batches) if error is None else 0
+
+    def pending_rows(self) -> int:
+        with self._cond:
+            return self._rows
+
+    def close(self):
+        """写入剩余数据并停止后台线程"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self.flush()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "pending_rows": self._rows,
+                "pending_bytes": self._bytes,
+                "writes": self.writes,
+                "rows_written": self.rows_written,
+                "errors": self.errors,
+            }
+
+    def _take(self):
+        # 调用方持有 self._cond
+        batches = self._batches
+        self._batches = []
+        self._rows = 0
+        self._bytes = 0
+        self._oldest = None
+        self._cond.notify_all()
+        return batches
+
+    def _due(self) -> bool:
+        return (
+            self._rows >= self.max_rows
+            or self._bytes >= self.max_bytes
+            or time.monotonic() - self._oldest >= self.max_delay
+        )
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed and (self._oldest is None or not self._due()):
+                    timeout = None if self._oldest is None else self._oldest + self.max_delay - time.monotonic()
+                    self._cond.wait(timeout)
+                if self._closed:
+                    return
+            self.flush()
+
+    def _write_batches(self, batches):
+        if not batches:
+            return [], None
+        try:
+            results = self._write([batch for batch, _, _ in batches])
+        except Exception as e:
+            logger.error(f"Bulk write of {len(batches)} batches failed: {e}")
+            with self._cond:
+                self.errors += 1
+            return None, e
+        with self._cond:
+            self.writes += 1
+            self.rows_written += sum(rows for _, rows, _ in batches)
+        return results, None
+
+    @staticmethod
+    def _notify(batches, results, error):
+        # 在写入锁之外调用回调，回调中可以再次写入或 flush
+        for i, (_, _, callback) in enumerate(batches):
+            if callback is None:
+                continue
+            try:
+                callback(None if error else results[i], error)
+            except Exception as e:
+                logger.exception(f"Bulk write callback failed: {e}")
@@ -0,0 +1,103 @@
+import re
+from typing import Dict, Iterable, Iterator
+
+# 句子：以中英文句末标点、英文句点 + 空白或换行结尾
+_SENTENCE_RE = re.compile(r".+?(?:[。！？!?；;…]+|\.(?=\s)|\n+|$)", re.S)
+# 近似分词：一个汉字、一个英文单词/数字串或一个标点算一个 token
+_TOKEN_RE = re.compile(r"[\u4e00-\u9fff]|[A-Za-z0-9_]+|[^\sA-Za-z0-9_\u4e00-\u9fff]")
+
+
+def count_tokens(text: str) -> int:
+    """近似估计文本的 token 数"""
+    return len(_TOKEN_RE.findall(text))
+
+
+def tokenize(text: str) -> list:
+    """按与 count_tokens 相同的规则切分 token"""
+    return _TOKEN_RE.findall(text)
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """截取文本的前 max_tokens 个 token"""
+    for i, match in enumerate(_TOKEN_RE.finditer(text)):
+        if i == max_tokens:
+            return text[:match.start()].rstrip()
+    return text
+
+
+def iter_sentences(text: str) -> Iterator[str]:
+    """按句子切分文本（生成器）"""
+    for match in _SENTENCE_RE.finditer(text):
+        sentence = match.group(0)
+        if sentence.strip():
+            yield sentence
+
+
+class TextChunker:
+    """流式分块：按句子装箱到固定窗口，窗口之间保留重叠，不跨越段落"""
+
+    def __init__(self, chunk_size: int = 500, chunk_overlap: int = 50, unit: str = "char"):
+        if unit not in ("char", "token"):
+            raise ValueError(f"Unsupported chunk unit: {unit}")
+        if not 0 <= chunk_overlap < chunk_size:
+            raise ValueError("chunk_overlap must be >= 0 and smaller than chunk_size")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.unit = unit
+        self._length = len if unit == "char" else count_tokens
+
+    def split_sections(self, sections: Iterable[Dict]) -> Iterator[Dict]:
+        """对段落流 {"text", "metadata"} 分块，chunk_index 在整个文档内递增"""
+        index = 0
+        for section in sections:
+            for chunk in self.split_text(section["text"], section.get("metadata")):
+                chunk["metadata"]["chunk_index"] = index
+                index += 1
+                yield chunk
+
+    def split_text(self, text: str, metadata: Dict = None) -> Iterator[Dict]:
+        """对单个段落分块，每个块继承段落的元数据"""
+        metadata = metadata or {}
+        window = []  # [(piece, length)]
+        window_len = 0
+        for piece in self._pieces(text):
+            n = self._length(piece)
+            if window and window_len + n > self.chunk_size:
+                yield self._make_chunk(window, metadata)
+                window, window_len = self._overlap_tail(window)
+                # 重叠部分加上新句子仍超长时，逐句丢弃重叠
+                while window and window_len + n > self.chunk_size:
+                    window_len -= window.pop(0)[1]
+            window.append((piece, n))
+            window_len += n
+        if window:
+            chunk = self._make_chunk(window, metadata)
+            if chunk["text"]:
+                yield chunk
+
+    def _pieces(self, text: str) -> Iterator[str]:
+        """句子流；超过窗口大小的长句按字符硬切（字符数总是不小于 token 数）"""
+        for sentence in iter_sentences(text):
+            if self._length(sentence) <= self.chunk_size:
+                yield sentence
+                continue
+            for start in range(0, len(sentence), self.chunk_size):
+                yield sentence[start:start + self.chunk_size]
+
+    def _overlap_tail(self, window):
+        """取窗口末尾总长度不超过 chunk_overlap 的若干句作为下一个窗口的开头"""
+        tail = []
+        tail_len = 0
+        for piece, n in reversed(window):
+            if tail_len + n > self.chunk_overlap:
+                break
+            tail.insert(0, (piece, n))
+            tail_len += n
+        return tail, tail_len
+
+    @staticmethod
+    def _make_chunk(window, metadata):
+        return {
+            "text": "".join(piece for piece, _ in window).strip(),
+            "metadata": dict(metadata),
+        }
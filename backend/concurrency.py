@@ -0,0 +1,67 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+
+class OverloadedError(Exception):
+    """排队的请求已满，调用方应稍后重试"""
+
+
+class ConcurrencyLimiter:
+    """限制同时处理的请求数；排队的请求超过上限时直接拒绝（背压），避免请求无限堆积、延迟无限增长"""
+
+    def __init__(self, max_concurrent: int = 64, max_waiting: int = 256):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_waiting = max_waiting
+        self._semaphore = None  # 在事件循环中第一次使用时创建
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    async def __aenter__(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        if self._semaphore.locked() and self.waiting >= self.max_waiting:
+            self.rejected += 1
+            raise OverloadedError(
+                f"Too many concurrent requests ({self.active} active, {self.waiting} waiting)"
+            )
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.active -= 1
+        self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_waiting": self.max_waiting,
+            "active": self.active,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+        }
+
+
+class BlockingExecutor:
+    """有界线程池：把 pymilvus、SQLite、模型推理等无法异步化的阻塞调用移出事件循环"""
+
+    def __init__(self, max_workers: int = 16, thread_name_prefix: str = "blocking"):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+
+    async def run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        # 与 asyncio.to_thread 一样把上下文（请求追踪等）带到工作线程
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(context.run, func, *args, **kwargs)
+        )
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,177 @@
+"""服务配置：环境变量优先，其次是 RAG_CONFIG_FILE 指向的配置文件，最后是默认值
+
+配置文件每行一个 KEY=VALUE（与环境变量同名，# 开头为注释），例如：
+
+    RAG_WORKERS=4
+    RAG_TENANT_ISOLATION=collection
+    RAG_TENANTS=team_a,team_b
+"""
+import os
+import re
+import typing
+from dataclasses import dataclass, field, fields
+from typing import Optional, Tuple
+
+from index_profiles import DEFAULT_INDEX_PROFILE
+
+TENANT_ISOLATION_MODES = ("none", "collection", "partition")
+# 租户名会拼进 Milvus 集合名和本地文件名，只允许字母、数字和下划线
+TENANT_NAME_RE = re.compile(r"^[A-Za-z0-9_]{1,64}$")
+
+
+def _env(name: str, default):
+    return field(default=default, metadata={"env": name})
+
+
+@dataclass(frozen=True)
+class Settings:
+    # 服务进程
+    host: str = _env("RAG_HOST", "0.0.0.0")
+    port: int = _env("RAG_PORT", 9081)
+    workers: int = _env("RAG_WORKERS", 1)
+    reload: bool = _env("RAG_RELOAD", False)  # 开发模式：代码变化时自动重启（只能单进程）
+    log_level: str = _env("RAG_LOG_LEVEL", "info")
+    access_log: bool = _env("RAG_ACCESS_LOG", True)
+
+    # 向量存储
+    vector_backend: str = _env("RAG_VECTOR_BACKEND", "milvus")
+    milvus_host: str = _env("RAG_MILVUS_HOST", "localhost")
+    milvus_port: str = _env("RAG_MILVUS_PORT", "19530")
+    collection: str = _env("RAG_COLLECTION", "documents")
+    local_store_path: str = _env("RAG_LOCAL_STORE_PATH", "data/local_store")
+    reset_on_schema_mismatch: bool = _env("RAG_RESET_ON_SCHEMA_MISMATCH", False)
+    index_profile: str = _env("RAG_INDEX_PROFILE", DEFAULT_INDEX_PROFILE)
+    vector_type: str = _env("RAG_VECTOR_TYPE", "float32")
+    partition_key: Optional[str] = _env("RAG_PARTITION_KEY", None)
+    # Milvus 检索的一致性级别；Session/Bounded 延迟更低，但写入后的检索结果可能不含新数据并被缓存
+    search_consistency: str = _env("RAG_SEARCH_CONSISTENCY", "Strong")
+    insert_buffer_rows: int = _env("RAG_INSERT_BUFFER_ROWS", 2048)
+    insert_buffer_delay_ms: float = _env("RAG_INSERT_BUFFER_DELAY_MS", 500.0)
+    lexical_index_path: str = _env("RAG_LEXICAL_INDEX_PATH", "data/lexical_index.npz")
+    # RAG_VECTOR_TYPE=binary 时保存全精度向量（检索后重新打分用）的文件
+    rescore_vectors_path: str = _env("RAG_RESCORE_VECTORS_PATH", "data/rescore_vectors.sqlite3")
+    # 多进程之间共享的状态（初始化锁、写入代数计数、入库任务状态）所在的目录
+    state_dir: str = _env("RAG_STATE_DIR", "data/state")
+
+    # 嵌入
+    ollama_url: str = _env("RAG_OLLAMA_URL", "http://localhost:11434/api/embeddings")
+    embedding_model: str = _env("RAG_EMBEDDING_MODEL", "bge-m3")
+    embedding_dim: Optional[int] = _env("RAG_EMBEDDING_DIM", None)
+    embedding_cache_path: str = _env("RAG_EMBEDDING_CACHE_PATH", "data/embedding_cache.sqlite3")
+
+    # 入库
+    parse_workers: int = _env("RAG_PARSE_WORKERS", 0)  # 解析子进程数，0 表示 CPU 核数
+    ingest_parse_workers: int = _env("RAG_INGEST_PARSE_WORKERS", 4)  # 同时解析的文件数
+    # 单个解析任务（一个文件或一段 PDF 页）从开始执行算起的超时秒数
+    parse_task_timeout: float = _env("RAG_PARSE_TASK_TIMEOUT", 300.0)
+    parse_memory_limit_mb: int = _env("RAG_PARSE_MEMORY_LIMIT_MB", 2048)  # 0 表示不限制
+    parse_pages_per_task: int = _env("RAG_PARSE_PAGES_PER_TASK", 16)
+    upload_spool_dir: str = _env("RAG_UPLOAD_SPOOL_DIR", "data/uploads")
+    max_ingest_mb: int = _env("RAG_MAX_INGEST_MB", 2048)
+
+    # 检索
+    rerank_model: str = _env("RAG_RERANK_MODEL", "")
+    rerank_candidates: int = _env("RAG_RERANK_CANDIDATES", 50)
+    rerank_budget_ms: float = _env("RAG_RERANK_BUDGET_MS", 300.0)
+    query_cache_size: int = _env("RAG_QUERY_CACHE_SIZE", 10000)
+    query_cache_ttl: float = _env("RAG_QUERY_CACHE_TTL", 300.0)
+    semantic_cache_threshold: float = _env("RAG_SEMANTIC_CACHE_THRESHOLD", 0.97)
+    blocking_workers: int = _env("RAG_BLOCKING_WORKERS", 16)
+    max_concurrent_searches: int = _env("RAG_MAX_CONCURRENT_SEARCHES", 64)
+    max_queued_searches: int = _env("RAG_MAX_QUEUED_SEARCHES", 256)
+
+    # 答案生成
+    llm_url: str = _env("RAG_LLM_URL", "http://localhost:11434/api/generate")
+    llm_model: str = _env("RAG_LLM_MODEL", "qwen2.5:7b")
+    llm_keep_alive: str = _env("RAG_LLM_KEEP_ALIVE", "30m")
+    ask_context_tokens: int = _env("RAG_ASK_CONTEXT_TOKENS", 3000)
+    answer_cache_size: int = _env("RAG_ANSWER_CACHE_SIZE", 1000)
+    answer_cache_ttl: float = _env("RAG_ANSWER_CACHE_TTL", 3600.0)
+
+    # 多租户：none 为单租户；collection 每个租户一个集合（本地后端为一个目录）；partition 每个租户一个 Milvus 分区
+    tenant_isolation: str = _env("RAG_TENANT_ISOLATION", "none")
+    tenant_header: str = _env("RAG_TENANT_HEADER", "X-Tenant-ID")
+    default_tenant: str = _env("RAG_DEFAULT_TENANT", "default")
+    tenants: Tuple[str, ...] = _env("RAG_TENANTS", ())  # 允许的租户，为空时不限制
+    max_tenants: int = _env("RAG_MAX_TENANTS", 64)  # 每个进程最多同时打开的租户数
+    # 单个租户同时处理的检索数，避免一个租户占满全部检索并发（0 表示不单独限制）
+    max_tenant_searches: int = _env("RAG_MAX_TENANT_SEARCHES", 16)
+
+    def validate(self):
+        if self.workers < 1:
+            raise ValueError(f"RAG_WORKERS must be at least 1, got {self.workers}")
+        if self.reload and self.workers > 1:
+            raise ValueError("RAG_RELOAD only works with a single worker")
+        if self.vector_backend == "local" and self.workers > 1:
+            # 本地后端的向量矩阵和行状态在进程内存中，多个进程同时写入会互相覆盖
+            raise ValueError("The local vector backend is single-process, set RAG_WORKERS=1 or use milvus")
+        if self.parse_task_timeout <= 0:
+            raise ValueError(f"RAG_PARSE_TASK_TIMEOUT must be positive, got {self.parse_task_timeout}")
+        if self.parse_pages_per_task < 1:
+            raise ValueError(f"RAG_PARSE_PAGES_PER_TASK must be at least 1, got {self.parse_pages_per_task}")
+        if self.tenant_isolation not in TENANT_ISOLATION_MODES:
+            raise ValueError(
+                f"Unknown RAG_TENANT_ISOLATION: {self.tenant_isolation}, expected one of {TENANT_ISOLATION_MODES}"
+            )
+        if self.tenant_isolation == "partition":
+            if self.vector_backend != "milvus":
+                raise ValueError("RAG_TENANT_ISOLATION=partition requires the milvus backend")
+            if self.partition_key:
+                raise ValueError("RAG_TENANT_ISOLATION=partition cannot be combined with RAG_PARTITION_KEY")
+        for tenant in (self.default_tenant,) + self.tenants:
+            if not TENANT_NAME_RE.match(tenant):
+                raise ValueError(f"Invalid tenant name: {tenant!r}, use letters, digits and underscores")
+        return self
+
+
+def read_config_file(path: str) -> dict:
+    values = {}
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if "=" not in line:
+                raise ValueError(f"{path}:{number}: expected KEY=VALUE, got {line!r}")
+            key, value = line.split("=", 1)
+            values[key.strip()] = value.strip().strip("'\"")
+    return values
+
+
+def _convert(name: str, kind, raw: str):
+    if typing.get_origin(kind) is typing.Union:
+        # Optional[X]：空字符串表示不设置
+        if raw == "":
+            return None
+        kind = next(arg for arg in typing.get_args(kind) if arg is not type(None))
+    try:
+        if kind is bool:
+            if raw.lower() in ("1", "true", "yes", "on"):
+                return True
+            if raw.lower() in ("0", "false", "no", "off", ""):
+                return False
+            raise ValueError(raw)
+        if kind in (int, float):
+            value = kind(raw)
+            # 维度等可选的整数配置里 0 也表示不设置
+            return None if value == 0 and name == "RAG_EMBEDDING_DIM" else value
+        if typing.get_origin(kind) is tuple:
+            return tuple(item.strip() for item in raw.split(",") if item.strip())
+        return raw
+    except ValueError:
+        raise ValueError(f"Invalid value for {name}: {raw!r}")
+
+
+def load_settings(environ=None, config_file: str = None) -> Settings:
+    """读取配置：环境变量 > 配置文件 > 默认值"""
+    environ = os.environ if environ is None else environ
+    config_file = config_file or environ.get("RAG_CONFIG_FILE")
+    file_values = read_config_file(config_file) if config_file else {}
+    hints = typing.get_type_hints(Settings)
+    values = {}
+    for item in fields(Settings):
+        name = item.metadata["env"]
+        raw = environ.get(name, file_values.get(name))
+        if raw is not None:
+            values[item.name] = _convert(name, hints[item.name], raw)
+    return Settings(**values).validate()
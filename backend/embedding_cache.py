@@ -0,0 +1,203 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+
+import numpy as np
+
+from lru_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# SQLite 单条语句的参数个数有上限，批量查询时分段
+_SQLITE_BATCH = 500
+
+
+def normalize_text(text: str) -> str:
+    """文本归一化：NFKC + 合并空白，使格式上的差异命中同一缓存"""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def cache_key(model_name: str, text: str) -> str:
+    """按 (模型名, 归一化文本) 计算内容寻址的缓存键"""
+    digest = hashlib.sha256()
+    digest.update(model_name.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(normalize_text(text).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class EmbeddingCache:
+    """两级嵌入缓存：进程内 LRU + 磁盘 SQLite"""
+
+    def __init__(
+        self,
+        path: str = None,
+        max_entries: int = 100000,
+        ttl: float = None,
+        disk_ttl: float = None,
+    ):
+        self.memory = LRUCache(max_entries=max_entries, ttl=ttl)
+        self.disk_ttl = disk_ttl
+        self.disk_hits = 0
+        self.disk_misses = 0
+        self.computed = 0
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            # WAL 模式允许多个进程同时读写同一个缓存文件
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, model TEXT NOT NULL, dim INTEGER NOT NULL, "
+                "vector BLOB NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def get_or_compute(self, model_name: str, texts, compute, dim: int = None) -> np.ndarray:
+        """返回 texts 的嵌入矩阵，只对未命中的文本调用 compute(list_of_texts)
+
+        给出 dim 时，维度不符的旧缓存条目视为未命中。
+        """
+        texts = list(texts)
+        keys, found, missing = self._lookup(model_name, texts, dim)
+        if missing:
+            vectors = compute(list(missing.values()))
+            self._remember(model_name, missing, vectors, found)
+        return self._assemble(keys, found)
+
+    async def aget_or_compute(self, model_name: str, texts, compute, dim: int = None) -> np.ndarray:
+        """get_or_compute 的异步版本，compute 为协程函数"""
+        texts = list(texts)
+        keys, found, missing = self._lookup(model_name, texts, dim)
+        if missing:
+            vectors = await compute(list(missing.values()))
+            self._remember(model_name, missing, vectors, found)
+        return self._assemble(keys, found)
+
+    def get_cached(self, model_name: str, texts, dim: int = None) -> list:
+        """只查缓存、不调用嵌入服务：每个文本的向量，未命中为 None"""
+        texts = list(texts)
+        keys, found, _ = self._lookup(model_name, texts, dim)
+        return [found.get(key) for key in keys]
+
+    def _lookup(self, model_name, texts, dim):
+        """查两级缓存，返回 (keys, 已命中 {key: vector}, 未命中 {key: text})"""
+        keys = [cache_key(model_name, text) for text in texts]
+        found = {}
+
+        # 第一级：进程内 LRU
+        pending = []
+        for key in dict.fromkeys(keys):
+            vector = self.memory.get(key)
+            if vector is None or (dim and len(vector) != dim):
+                pending.append(key)
+            else:
+                found[key] = vector
+
+        # 第二级：磁盘，命中后提升到内存
+        if pending and self._db is not None:
+            loaded = self._load(pending, dim)
+            for key, vector in loaded.items():
+                found[key] = vector
+                self.memory.put(key, vector)
+            with self._lock:
+                self.disk_hits += len(loaded)
+                self.disk_misses += len(pending) - len(loaded)
+
+        # 未命中的文本（同一批内的重复文本只计算一次）
+        missing = {}
+        for text, key in zip(texts, keys):
+            if key not in found and key not in missing:
+                missing[key] = text
+        return keys, found, missing
+
+    def _remember(self, model_name, missing, vectors, found):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        for key, vector in zip(missing, vectors):
+            found[key] = vector
+            # 复制一行，避免缓存条目引用整块批量结果
+            self.memory.put(key, vector.copy())
+        self._store(model_name, missing.keys(), vectors)
+        with self._lock:
+            self.computed += len(missing)
+
+    @staticmethod
+    def _assemble(keys, found):
+        if not keys:
+            return np.zeros((0, 0), dtype=np.float32)
+        dim = len(found[keys[0]])
+        out = np.empty((len(keys), dim), dtype=np.float32)
+        for row, key in enumerate(keys):
+            out[row] = found[key]
+        return out
+
+    def stats(self) -> dict:
+        with self._lock:
+            disk = {
+                "enabled": self._db is not None,
+                "hits": self.disk_hits,
+                "misses": self.disk_misses,
+            }
+            computed = self.computed
+        return {"memory": self.memory.stats(), "disk": disk, "computed": computed}
+
+    def prune(self) -> int:
+        """删除磁盘上超过 disk_ttl 的条目，返回删除的条数"""
+        if self._db is None or not self.disk_ttl:
+            return 0
+        with self._lock:
+            cursor = self._db.execute(
+                "DELETE FROM embeddings WHERE created_at < ?", (time.time() - self.disk_ttl,)
+            )
+            self._db.commit()
+            return cursor.rowcount
+
+    def close(self):
+        if self._db is not None:
+            with self._lock:
+                self._db.close()
+                self._db = None
+
+    def _load(self, keys, dim=None) -> dict:
+        result = {}
+        min_created = time.time() - self.disk_ttl if self.disk_ttl else 0
+        dim_filter = "AND dim = ?" if dim else ""
+        with self._lock:
+            for start in range(0, len(keys), _SQLITE_BATCH):
+                batch = keys[start:start + _SQLITE_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._db.execute(
+                    f"SELECT key, vector FROM embeddings "
+                    f"WHERE key IN ({placeholders}) AND created_at >= ? {dim_filter}",
+                    (*batch, min_created, *([dim] if dim else [])),
+                )
+                for key, blob in rows:
+                    result[key] = np.frombuffer(blob, dtype=np.float32)
+        return result
+
+    def _store(self, model_name, keys, vectors):
+        if self._db is None:
+            return
+        now = time.time()
+        rows = [
+            (key, model_name, len(vector), vector.tobytes(), now)
+            for key, vector in zip(keys, vectors)
+        ]
+        try:
+            with self._lock:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, model, dim, vector, created_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self._db.commit()
+        except sqlite3.Error as e:
+            # 磁盘缓存写入失败不影响主流程
+            logger.warning(f"Failed to persist embeddings to cache: {e}")
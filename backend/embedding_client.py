@@ -0,0 +1,240 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# 可以重试的 HTTP 状态码（限流 / 服务端临时错误）
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class TransientEmbeddingError(Exception):
+    """嵌入服务的临时性错误，可以重试"""
+
+
+def _check_count(embeddings, batch):
+    # 返回条数不足时输出矩阵中会留下未初始化的行，被当作向量缓存和写入，直接报错
+    if len(embeddings) != len(batch):
+        raise ValueError(f"Expected {len(batch)} embeddings, but the service returned {len(embeddings)}")
+
+
+class EmbeddingClient:
+    """Ollama 嵌入客户端：长连接池、分批、有界并发、失败重试"""
+
+    def __init__(
+        self,
+        url: str = "http://localhost:11434/api/embeddings",
+        model_name: str = "bge-m3",
+        dim: int = None,
+        batch_size: int = 16,
+        max_workers: int = 4,
+        max_retries: int = 3,
+        backoff: float = 0.5,
+        timeout: float = 60.0,
+    ):
+        self.url = url
+        self.model_name = model_name
+        self.dim = dim  # 为 None 时在第一次调用时从模型探测
+        self.batch_size = max(1, batch_size)
+        self.max_workers = max(1, max_workers)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        # /api/embed 支持一次请求多条文本，/api/embeddings 只支持单条
+        self._batch_api = url.rstrip("/").endswith("/api/embed")
+
+        # 连接池大小与并发数一致，保证每个工作线程都能复用 keep-alive 连接
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="embedding"
+        )
+
+    def discover_dim(self) -> int:
+        """向模型发送一条探测文本，得到向量维度"""
+        if self._batch_api:
+            data = self._post({"model": self.model_name, "input": ["dimension probe"]})
+            embedding = data["embeddings"][0]
+        else:
+            data = self._post({"model": self.model_name, "prompt": "dimension probe"})
+            embedding = data["embedding"]
+        self.dim = len(embedding)
+        return self.dim
+
+    def embed(self, texts) -> np.ndarray:
+        """获取一组文本的嵌入向量，返回 (len(texts), dim) 的 float32 矩阵"""
+        texts = list(texts)
+        if self.dim is None:
+            self.discover_dim()
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        if not texts:
+            return out
+
+        batches = [
+            (start, texts[start:start + self.batch_size])
+            for start in range(0, len(texts), self.batch_size)
+        ]
+        if len(batches) == 1:
+            self._embed_batch(out, *batches[0])
+        else:
+            futures = [
+                self._executor.submit(self._embed_batch, out, start, batch)
+                for start, batch in batches
+            ]
+            for future in futures:
+                future.result()
+        return out
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self._session.close()
+
+    def _embed_batch(self, out: np.ndarray, start: int, batch):
+        """嵌入一批文本，结果直接写入预分配矩阵的对应行"""
+        if self._batch_api:
+            data = self._post({"model": self.model_name, "input": batch})
+            _check_count(data["embeddings"], batch)
+            for offset, embedding in enumerate(data["embeddings"]):
+                self._write_row(out, start + offset, embedding)
+        else:
+            for offset, text in enumerate(batch):
+                data = self._post({"model": self.model_name, "prompt": text})
+                self._write_row(out, start + offset, data["embedding"])
+
+    def _write_row(self, out: np.ndarray, row: int, embedding):
+        # 维度不一致说明模型或配置变了，截断/补零会悄悄损坏检索结果，直接报错
+        if len(embedding) != self.dim:
+            raise ValueError(
+                f"Expected embedding dimension {self.dim}, but got {len(embedding)}"
+            )
+        out[row] = embedding
+
+    def _post(self, payload: dict) -> dict:
+        """发送请求，对连接错误、超时和 5xx/429 进行指数退避重试"""
+        attempt = 0
+        while True:
+            try:
+                response = self._session.post(self.url, json=payload, timeout=self.timeout)
+                if response.status_code in RETRY_STATUS_CODES:
+                    raise TransientEmbeddingError(
+                        f"Embedding service returned {response.status_code}"
+                    )
+                response.raise_for_status()
+                return response.json()
+            except (requests.ConnectionError, requests.Timeout, TransientEmbeddingError) as e:
+                if attempt >= self.max_retries:
+                    logger.error(f"获取嵌入向量失败: {e}")
+                    raise
+                delay = self.backoff * (2 ** attempt)
+                logger.warning(
+                    f"Embedding request failed ({e}), retrying in {delay:.2f}s "
+                    f"(attempt {attempt + 1}/{self.max_retries})"
+                )
+                time.sleep(delay)
+                attempt += 1
+
+
+class AsyncEmbeddingClient:
+    """EmbeddingClient 的异步版本（httpx.AsyncClient）：在事件循环里等待嵌入服务，不占用线程
+
+    并发数由连接池大小限制，分批、重试策略与 EmbeddingClient 相同。
+    """
+
+    def __init__(
+        self,
+        url: str = "http://localhost:11434/api/embeddings",
+        model_name: str = "bge-m3",
+        dim: int = None,
+        batch_size: int = 16,
+        max_connections: int = 16,
+        max_retries: int = 3,
+        backoff: float = 0.5,
+        timeout: float = 60.0,
+    ):
+        self.url = url
+        self.model_name = model_name
+        self.dim = dim
+        self.batch_size = max(1, batch_size)
+        self.max_connections = max(1, max_connections)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self._batch_api = url.rstrip("/").endswith("/api/embed")
+        self._client = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # 在事件循环中第一次使用时创建，连接池满时请求在池上排队
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+        return self._client
+
+    async def embed(self, texts) -> np.ndarray:
+        """获取一组文本的嵌入向量，返回 (len(texts), dim) 的 float32 矩阵"""
+        texts = list(texts)
+        if self.dim is None:
+            raise ValueError("Embedding dimension is unknown, set dim before using the async client")
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        await asyncio.gather(*(
+            self._embed_batch(out, start, texts[start:start + self.batch_size])
+            for start in range(0, len(texts), self.batch_size)
+        ))
+        return out
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _embed_batch(self, out: np.ndarray, start: int, batch):
+        if self._batch_api:
+            data = await self._post({"model": self.model_name, "input": batch})
+            embeddings = data["embeddings"]
+        else:
+            results = await asyncio.gather(*(
+                self._post({"model": self.model_name, "prompt": text}) for text in batch
+            ))
+            embeddings = [data["embedding"] for data in results]
+        _check_count(embeddings, batch)
+        for offset, embedding in enumerate(embeddings):
+            if len(embedding) != self.dim:
+                raise ValueError(
+                    f"Expected embedding dimension {self.dim}, but got {len(embedding)}"
+                )
+            out[start + offset] = embedding
+
+    async def _post(self, payload: dict) -> dict:
+        attempt = 0
+        while True:
+            try:
+                response = await self._get_client().post(self.url, json=payload)
+                if response.status_code in RETRY_STATUS_CODES:
+                    raise TransientEmbeddingError(
+                        f"Embedding service returned {response.status_code}"
+                    )
+                response.raise_for_status()
+                return response.json()
+            except (httpx.TransportError, TransientEmbeddingError) as e:
+                if attempt >= self.max_retries:
+                    logger.error(f"获取嵌入向量失败: {e}")
+                    raise
+                delay = self.backoff * (2 ** attempt)
+                logger.warning(
+                    f"Embedding request failed ({e}), retrying in {delay:.2f}s "
+                    f"(attempt {attempt + 1}/{self.max_retries})"
+                )
+                await asyncio.sleep(delay)
+                attempt += 1
@@ -0,0 +1,106 @@
+"""标量字段与结构化过滤条件
+
+入库时从块元数据中提取来源文件、文件类型、页码、章节路径和入库时间，写入带标量索引的字段；
+检索时把结构化过滤条件转成 Milvus 布尔表达式，下推到向量检索的 expr 中。
+"""
+import json
+from typing import Dict, Optional
+
+# 写入时从块元数据中提取的标量字段：字段名 -> (类型, VARCHAR 最大字节数)
+# 没有对应元数据时字符串为 ""，整数为 0（页码从 1 开始）
+SCALAR_FIELDS = {
+    "source": (str, 1024),
+    "doc_type": (str, 32),
+    "page": (int, None),
+    "section_path": (str, 2048),
+    "upload_time": (int, None),
+}
+
+# 可以在结构化过滤条件中使用的字段（doc_id 是已有的标量字段）
+FILTER_FIELDS = dict(SCALAR_FIELDS, doc_id=(str, 1024))
+
+# 比较运算符 -> Milvus 表达式中的运算符
+_COMPARISONS = {"eq": "==", "ne": "!=", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+_OPERATORS = set(_COMPARISONS) | {"in", "prefix"}
+
+
+def _truncate(value: str, max_bytes: int) -> str:
+    """按 UTF-8 字节数截断，不截断多字节字符"""
+    return value.encode("utf-8")[:max_bytes].decode("utf-8", errors="ignore")
+
+
+def scalar_values(metadata: Optional[Dict], upload_time: int) -> Dict:
+    """从块元数据中提取标量字段的值"""
+    metadata = metadata or {}
+    values = {
+        "source": metadata.get("source") or "",
+        "doc_type": metadata.get("file_type") or "",
+        "page": metadata.get("page") or 0,
+        # PDF/XML 的章节路径，表格文件用工作表名
+        "section_path": metadata.get("path") or metadata.get("sheet") or "",
+        "upload_time": int(upload_time),
+    }
+    for name, (kind, max_length) in SCALAR_FIELDS.items():
+        if kind is str:
+            values[name] = _truncate(str(values[name]), max_length)
+        else:
+            values[name] = int(values[name])
+    return values
+
+
+def _literal(field: str, value):
+    kind = FILTER_FIELDS[field][0]
+    if kind is int:
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise ValueError(f"Filter on {field} expects an integer, got {value!r}")
+        return str(value)
+    if not isinstance(value, str):
+        raise ValueError(f"Filter on {field} expects a string, got {value!r}")
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _condition(field: str, op: str, value) -> str:
+    if op not in _OPERATORS:
+        raise ValueError(f"Unsupported filter operator: {op}, expected one of {sorted(_OPERATORS)}")
+    if op == "in":
+        if not isinstance(value, list) or not value:
+            raise ValueError(f"Filter {field}.in expects a non-empty list")
+        return f"{field} in [{', '.join(_literal(field, v) for v in value)}]"
+    if op == "prefix":
+        if FILTER_FIELDS[field][0] is not str or not isinstance(value, str) or "%" in value:
+            raise ValueError(f"Filter {field}.prefix expects a string without '%' on a string field")
+        return f"{field} like {_literal(field, value + '%')}"
+    return f"{field} {_COMPARISONS[op]} {_literal(field, value)}"
+
+
+def build_filter_expr(filters: Optional[Dict]) -> Optional[str]:
+    """把结构化过滤条件转成 Milvus 表达式，各条件之间为 and
+
+    {"doc_type": "pdf"}                      -> doc_type == "pdf"
+    {"source": ["a.pdf", "b.pdf"]}           -> source in ["a.pdf", "b.pdf"]
+    {"page": {"gte": 3, "lte": 10}}          -> page >= 3 and page <= 10
+    {"section_path": {"prefix": "第一章"}}    -> section_path like "第一章%"
+    """
+    if not filters:
+        return None
+    conditions = []
+    for field, spec in filters.items():
+        if field not in FILTER_FIELDS:
+            raise ValueError(f"Unknown filter field: {field}, expected one of {sorted(FILTER_FIELDS)}")
+        if isinstance(spec, dict):
+            if not spec:
+                raise ValueError(f"Empty filter on {field}")
+            conditions.extend(_condition(field, op, value) for op, value in spec.items())
+        elif isinstance(spec, list):
+            conditions.append(_condition(field, "in", spec))
+        else:
+            conditions.append(_condition(field, "eq", spec))
+    return " and ".join(conditions)
+
+
+def combine_exprs(*exprs: Optional[str]) -> Optional[str]:
+    """用 and 连接多个表达式，忽略空表达式"""
+    exprs = [expr for expr in exprs if expr]
+    if len(exprs) <= 1:
+        return exprs[0] if exprs else None
+    return " and ".join(f"({expr})" for expr in exprs)
@@ -0,0 +1,126 @@
+"""向量索引配置：按名称选择度量方式、索引类型、构建参数和默认检索参数"""
+import json
+
+INDEX_PROFILES = {
+    # 旧版本的默认配置
+    "ivf_flat": {
+        "metric_type": "L2",
+        "index_type": "IVF_FLAT",
+        "params": {"nlist": 1024},
+        "search_params": {"nprobe": 10},
+    },
+    # 精确检索，适合小规模数据或作为召回率基准
+    "flat": {
+        "metric_type": "COSINE",
+        "index_type": "FLAT",
+        "params": {},
+        "search_params": {},
+    },
+    # 内存图索引：召回率高、延迟低，内存占用较大
+    "hnsw": {
+        "metric_type": "COSINE",
+        "index_type": "HNSW",
+        "params": {"M": 16, "efConstruction": 200},
+        "search_params": {"ef": 64},
+    },
+    # 标量量化：内存约为 IVF_FLAT 的 1/4
+    "ivf_sq8": {
+        "metric_type": "COSINE",
+        "index_type": "IVF_SQ8",
+        "params": {"nlist": 1024},
+        "search_params": {"nprobe": 16},
+    },
+    # 乘积量化：内存最小，召回率损失也最大（m 需要整除向量维度）
+    "ivf_pq": {
+        "metric_type": "COSINE",
+        "index_type": "IVF_PQ",
+        "params": {"nlist": 1024, "m": 64, "nbits": 8},
+        "search_params": {"nprobe": 16},
+    },
+    # 磁盘索引：数据规模超过内存时使用，需要 Milvus 挂载 NVMe 磁盘
+    "diskann": {
+        "metric_type": "COSINE",
+        "index_type": "DISKANN",
+        "params": {},
+        "search_params": {"search_list": 100},
+    },
+    # 二值向量（vector_type=binary）使用的索引，汉明距离
+    "bin_flat": {
+        "metric_type": "HAMMING",
+        "index_type": "BIN_FLAT",
+        "params": {},
+        "search_params": {},
+    },
+    "bin_ivf_flat": {
+        "metric_type": "HAMMING",
+        "index_type": "BIN_IVF_FLAT",
+        "params": {"nlist": 1024},
+        "search_params": {"nprobe": 16},
+    },
+}
+
+DEFAULT_INDEX_PROFILE = "hnsw"
+DEFAULT_BINARY_INDEX_PROFILE = "bin_ivf_flat"
+
+# 各索引类型允许在单次请求中调整的检索参数及其取值范围
+SEARCH_PARAM_LIMITS = {
+    "FLAT": {},
+    "IVF_FLAT": {"nprobe": (1, 65536)},
+    "IVF_SQ8": {"nprobe": (1, 65536)},
+    "IVF_PQ": {"nprobe": (1, 65536)},
+    "HNSW": {"ef": (1, 32768)},
+    "DISKANN": {"search_list": (1, 65535)},
+    "BIN_FLAT": {},
+    "BIN_IVF_FLAT": {"nprobe": (1, 65536)},
+}
+
+
+def get_index_profile(name: str) -> dict:
+    if name not in INDEX_PROFILES:
+        raise ValueError(
+            f"Unknown index profile: {name} (available: {', '.join(sorted(INDEX_PROFILES))})"
+        )
+    return INDEX_PROFILES[name]
+
+
+def build_search_params(profile: dict, overrides: dict = None, limit: int = None) -> dict:
+    """合并默认检索参数和单次请求的参数，用于 collection.search(param=...)"""
+    params = dict(profile["search_params"])
+    allowed = SEARCH_PARAM_LIMITS.get(profile["index_type"], {})
+    for key, value in (overrides or {}).items():
+        if key not in allowed:
+            raise ValueError(
+                f"Search parameter {key!r} is not supported by {profile['index_type']} "
+                f"(supported: {', '.join(sorted(allowed)) or 'none'})"
+            )
+        low, high = allowed[key]
+        if not isinstance(value, int) or not low <= value <= high:
+            raise ValueError(f"Search parameter {key!r} must be an integer in [{low}, {high}]")
+        params[key] = value
+    # HNSW 要求 ef >= topk，DISKANN 要求 search_list >= topk
+    if limit:
+        for key in ("ef", "search_list"):
+            if key in params:
+                params[key] = max(params[key], limit)
+    return {"metric_type": profile["metric_type"], "params": params}
+
+
+def index_matches(index_params: dict, profile: dict) -> bool:
+    """判断集合上已有的索引是否与配置一致"""
+    if index_params.get("index_type") != profile["index_type"]:
+        return False
+    if index_params.get("metric_type") != profile["metric_type"]:
+        return False
+    existing = index_params.get("params") or {}
+    if isinstance(existing, str):
+        existing = json.loads(existing)
+    return all(str(existing.get(k)) == str(v) for k, v in profile["params"].items())
+
+
+def is_binary_profile(profile: dict) -> bool:
+    return profile["index_type"].startswith("BIN_")
+
+
+def higher_is_better(metric_type: str) -> bool:
+    """COSINE/IP 分数越大越相似，L2 距离越小越相似"""
+    return metric_type in ("COSINE", "IP")
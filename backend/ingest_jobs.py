@@ -0,0 +1,439 @@
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+
+from chunker import count_tokens
+from metrics import INGESTED_BYTES, INGESTED_CHUNKS, INGESTED_TOKENS, PARSE_SECONDS, span
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("parse", "chunk", "embed", "insert")
+
+# 队列中的结束标记
+_STOP = object()
+
+
+class IngestJob:
+    """一次上传对应的后台入库任务及其分阶段进度"""
+
+    def __init__(self, file_names, tenant: str = ""):
+        self.id = uuid.uuid4().hex
+        self.tenant = tenant
+        self.file_names = list(file_names)
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.documents_done = 0
+        self.errors = []
+        self.totals = {"inserted": 0, "skipped": 0, "deleted": 0}
+        self.stages = {stage: {"items": 0, "seconds": 0.0} for stage in STAGES}
+        self.dirty = True  # 上次写入 JobStore 之后状态有变化
+        self._lock = threading.Lock()
+
+    def record(self, stage, items, seconds):
+        with self._lock:
+            if self.started_at is None:
+                self.started_at = time.time()
+                self.status = "running"
+            self.stages[stage]["items"] += items
+            self.stages[stage]["seconds"] += seconds
+            self.dirty = True
+
+    def add_totals(self, **counts):
+        with self._lock:
+            for key, value in counts.items():
+                self.totals[key] += value
+            self.dirty = True
+
+    def fail(self, file_name, error):
+        with self._lock:
+            self.errors.append({"file": file_name, "error": str(error)})
+            self.dirty = True
+
+    def document_finished(self):
+        with self._lock:
+            self.documents_done += 1
+            if self.documents_done == len(self.file_names):
+                self.finished_at = time.time()
+                self.status = "failed" if self.errors else "completed"
+            self.dirty = True
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            end = self.finished_at or time.time()
+            elapsed = end - self.started_at if self.started_at else 0.0
+            stages = {}
+            for stage, stats in self.stages.items():
+                stages[stage] = {
+                    "items": stats["items"],
+                    "seconds": round(stats["seconds"], 3),
+                    # 单阶段吞吐：条目数 / 该阶段实际忙碌时间
+                    "items_per_second": (
+                        round(stats["items"] / stats["seconds"], 2) if stats["seconds"] else None
+                    ),
+                }
+            return {
+                "job_id": self.id,
+                "tenant": self.tenant,
+                "status": self.status,
+                "files": self.file_names,
+                "documents_done": self.documents_done,
+                "documents_total": len(self.file_names),
+                "created_at": self.created_at,
+                "elapsed_seconds": round(elapsed, 3),
+                "stages": stages,
+                **self.totals,
+                "errors": list(self.errors),
+            }
+
+
+class _Document:
+    """流水线中单个文件的状态"""
+
+    def __init__(self, job, store, doc_id, file_extension, content, on_done=None):
+        self.job = job
+        self.store = store  # 写入的目标 VectorStore（多租户时每个租户一个）
+        self.doc_id = doc_id
+        self.file_extension = file_extension
+        self.content = content  # 文件内容或落盘后的文件路径
+        self.on_done = on_done
+        self.existing = {}
+        self.seen = set()
+        self.batch = []
+        self.next_index = 0
+        self.pending = 0  # 已送入 embed 队列但还没有写入完成的批次数
+        self.parsed = False
+        self.failed = False
+        self.finished = False
+        self.lock = threading.Lock()
+
+
+class IngestPipeline:
+    """后台入库流水线：parse -> chunk -> embed -> insert，阶段之间使用有界队列
+
+    所有租户共用一条流水线，每个任务写入提交时指定的 VectorStore。
+    给出 job_store 时任务状态定期写入其中，供其他服务进程查询。
+    """
+
+    def __init__(
+        self,
+        vector_store,
+        extract_sections,
+        chunker,
+        parse_workers: int = 2,
+        embed_workers: int = 2,
+        insert_workers: int = 1,
+        queue_size: int = 64,
+        batch_size: int = 64,
+        max_jobs: int = 1000,
+        job_store=None,
+        persist_interval: float = 0.5,
+    ):
+        self.vector_store = vector_store  # submit 未指定 store 时的默认目标
+        self.extract_sections = extract_sections
+        self.chunker = chunker
+        self.batch_size = batch_size
+        self.max_jobs = max_jobs
+        self._jobs = {}
+        self._jobs_lock = threading.Lock()
+
+        self.queues = {stage: queue.Queue(maxsize=queue_size) for stage in STAGES}
+        # chunk 阶段只用一个线程，保证同一文档的段落按顺序分块编号
+        workers = {
+            "parse": (self._parse, parse_workers),
+            "chunk": (self._chunk, 1),
+            "embed": (self._embed, embed_workers),
+            "insert": (self._insert, insert_workers),
+        }
+        self._threads = {stage: [] for stage in STAGES}
+        for stage, (handler, count) in workers.items():
+            for i in range(max(1, count)):
+                thread = threading.Thread(
+                    target=self._run, args=(stage, handler), name=f"ingest-{stage}-{i}", daemon=True
+                )
+                thread.start()
+                self._threads[stage].append(thread)
+
+        self.job_store = job_store
+        self.persist_interval = persist_interval
+        # (store, doc_id) -> 按提交顺序排队的 _Document，同一文档同时只有队首在入库
+        self._doc_turns = {}
+        self._doc_turns_changed = threading.Condition()
+        self._stopped = threading.Event()
+        self._persist_thread = None
+        if job_store is not None:
+            self._persist_thread = threading.Thread(target=self._persist_loop, name="ingest-jobs", daemon=True)
+            self._persist_thread.start()
+
+    def submit(self, files, on_done=None, store=None, tenant: str = "") -> IngestJob:
+        """提交一组 (file_name, file_extension, content)，立即返回任务
+
+        content 可以是文件内容或文件路径；每个文件解析结束（无论成功与否）后调用 on_done(content)，
+        例如删除上传时落盘的临时文件。submit 抛出异常时，还没有进入流水线的文件也会调用 on_done。
+        """
+        files = list(files)
+        queued = 0
+        try:
+            store = store or self.vector_store
+            job = IngestJob([name for name, _, _ in files], tenant=tenant)
+            with self._jobs_lock:
+                self._jobs[job.id] = job
+                self._prune_jobs()
+            self._persist([job])
+            for file_name, file_extension, content in files:
+                doc = _Document(job, store, file_name, file_extension, content, on_done)
+                with self._doc_turns_changed:
+                    self._doc_turns.setdefault((store, file_name), deque()).append(doc)
+                try:
+                    self.queues["parse"].put(doc)
+                except BaseException:
+                    self._end_turn(doc)
+                    raise
+                queued += 1
+        except BaseException:
+            if on_done is not None:
+                for _, _, content in files[queued:]:
+                    on_done(content)
+            raise
+        return job
+
+    def get(self, job_id):
+        """返回任务状态 dict；本进程中没有时再查 JobStore（任务可能由其他进程执行）"""
+        with self._jobs_lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        if self.job_store is not None:
+            return self.job_store.get(job_id)
+        return None
+
+    def queue_depths(self) -> dict:
+        return {stage: q.qsize() for stage, q in self.queues.items()}
+
+    def close(self):
+        for stage, threads in self._threads.items():
+            for _ in threads:
+                self.queues[stage].put(_STOP)
+        self._stopped.set()
+        if self._persist_thread is not None:
+            self._persist_thread.join()
+
+    def _persist(self, jobs):
+        if self.job_store is None:
+            return
+        snapshots = []
+        for job in jobs:
+            if job.dirty:
+                job.dirty = False
+                snapshots.append(job.to_dict())
+        if not snapshots:
+            return
+        try:
+            self.job_store.save_many(snapshots)
+        except Exception as e:
+            logger.warning(f"Failed to persist ingest job status: {e}")
+
+    def _persist_loop(self):
+        # 进度变化频繁，定期把有变化的任务合并写入一次
+        while not self._stopped.wait(self.persist_interval):
+            with self._jobs_lock:
+                jobs = list(self._jobs.values())
+            self._persist(jobs)
+        with self._jobs_lock:
+            jobs = list(self._jobs.values())
+        self._persist(jobs)
+
+    def _prune_jobs(self):
+        # 只保留最近的 max_jobs 个任务，优先丢弃已结束的
+        if len(self._jobs) <= self.max_jobs:
+            return
+        for job_id in [j.id for j in self._jobs.values() if j.finished_at][: len(self._jobs) - self.max_jobs]:
+            del self._jobs[job_id]
+
+    def _run(self, stage, handler):
+        q = self.queues[stage]
+        while True:
+            item = q.get()
+            if item is _STOP:
+                break
+            try:
+                handler(item)
+            except Exception as e:
+                logger.exception(f"Unexpected error in ingest stage {stage}: {e}")
+
+    def _wait_for_turn(self, doc):
+        """同一文档的多次入库按提交顺序逐个进行
+
+        每次入库结束时会删除本次没有出现的旧块，并发执行时会互相删除对方刚写入的块。
+        等待时占用一个解析线程，只在同一文件被重复上传时发生。
+        """
+        with self._doc_turns_changed:
+            self._doc_turns_changed.wait_for(lambda: self._doc_turns[(doc.store, doc.doc_id)][0] is doc)
+
+    def _end_turn(self, doc):
+        key = (doc.store, doc.doc_id)
+        with self._doc_turns_changed:
+            turns = self._doc_turns[key]
+            turns.remove(doc)
+            if not turns:
+                del self._doc_turns[key]
+            self._doc_turns_changed.notify_all()
+
+    def _parse(self, doc):
+        self._wait_for_turn(doc)
+        start = time.perf_counter()
+        parse_seconds = 0.0  # 不含等待 chunk 队列的时间
+        try:
+            INGESTED_BYTES.inc(self._content_size(doc.content), file_type=doc.file_extension)
+            with span("existing_hashes"):
+                doc.existing = doc.store.get_document_hashes(doc.doc_id)
+            sections = self.extract_sections(doc.doc_id, doc.file_extension, doc.content)
+            for section in sections:
+                seconds = time.perf_counter() - start
+                parse_seconds += seconds
+                doc.job.record("parse", 1, seconds)
+                self.queues["chunk"].put((doc, section))
+                start = time.perf_counter()
+            parse_seconds += time.perf_counter() - start
+        except Exception as e:
+            logger.error(f"Error parsing {doc.doc_id}: {e}")
+            doc.failed = True
+            doc.job.fail(doc.doc_id, e)
+        finally:
+            # 解析结束后文件内容就不再需要了
+            if doc.on_done is not None:
+                try:
+                    doc.on_done(doc.content)
+                except Exception as e:
+                    logger.warning(f"Cleanup of {doc.doc_id} failed: {e}")
+            doc.content = None
+            PARSE_SECONDS.observe(parse_seconds, file_type=doc.file_extension)
+            self.queues["chunk"].put((doc, None))
+
+    @staticmethod
+    def _content_size(content) -> int:
+        if isinstance(content, (bytes, bytearray)):
+            return len(content)
+        try:
+            return os.path.getsize(content)
+        except (OSError, TypeError):
+            return 0
+
+    def _chunk(self, item):
+        doc, section = item
+        if section is None:
+            # 文档解析结束：送出最后一批
+            self._send_batch(doc)
+            with doc.lock:
+                doc.parsed = True
+            self._maybe_finish(doc)
+            return
+        if doc.failed:
+            return
+
+        start = time.perf_counter()
+        count = 0
+        for chunk in self.chunker.split_text(section["text"], section.get("metadata")):
+            chunk["metadata"]["chunk_index"] = doc.next_index
+            doc.next_index += 1
+            count += 1
+            digest = doc.store.chunk_hash(chunk["text"], chunk["metadata"])
+            if digest in doc.seen or digest in doc.existing:
+                doc.seen.add(digest)
+                doc.job.add_totals(skipped=1)
+                continue
+            doc.seen.add(digest)
+            doc.batch.append((chunk, digest))
+            if len(doc.batch) >= self.batch_size:
+                doc.job.record("chunk", count, time.perf_counter() - start)
+                self._send_batch(doc)
+                start = time.perf_counter()
+                count = 0
+        doc.job.record("chunk", count, time.perf_counter() - start)
+
+    def _send_batch(self, doc):
+        if not doc.batch or doc.failed:
+            doc.batch = []
+            return
+        batch, doc.batch = doc.batch, []
+        with doc.lock:
+            doc.pending += 1
+        self.queues["embed"].put((doc, batch))
+
+    def _embed(self, item):
+        doc, batch = item
+        if doc.failed:
+            self._batch_done(doc)
+            return
+        start = time.perf_counter()
+        try:
+            texts = [chunk["text"] for chunk, _ in batch]
+            embeddings = doc.store.get_embeddings(texts)
+        except Exception as e:
+            self._batch_failed(doc, e)
+            return
+        doc.job.record("embed", len(batch), time.perf_counter() - start)
+        self.queues["insert"].put((doc, batch, embeddings))
+
+    def _insert(self, item):
+        doc, batch, embeddings = item
+        if doc.failed:
+            self._batch_done(doc)
+            return
+        start = time.perf_counter()
+
+        def written(primary_keys, error):
+            # 在写入缓冲实际写入 Milvus 之后调用；insert 阶段耗时包含在缓冲中等待的时间
+            if error is not None:
+                self._batch_failed(doc, error)
+                return
+            doc.job.record("insert", len(batch), time.perf_counter() - start)
+            doc.job.add_totals(inserted=len(batch))
+            INGESTED_CHUNKS.inc(len(batch))
+            INGESTED_TOKENS.inc(sum(count_tokens(chunk["text"]) for chunk, _ in batch))
+            self._batch_done(doc)
+
+        try:
+            doc.store.write_embeddings(
+                [chunk["text"] for chunk, _ in batch],
+                embeddings,
+                [chunk["metadata"] for chunk, _ in batch],
+                doc.doc_id,
+                [digest for _, digest in batch],
+                callback=written,
+            )
+        except Exception as e:
+            self._batch_failed(doc, e)
+
+    def _batch_failed(self, doc, error):
+        logger.error(f"Error ingesting {doc.doc_id}: {error}")
+        if not doc.failed:
+            doc.failed = True
+            doc.job.fail(doc.doc_id, error)
+        self._batch_done(doc)
+
+    def _batch_done(self, doc):
+        with doc.lock:
+            doc.pending -= 1
+        self._maybe_finish(doc)
+
+    def _maybe_finish(self, doc):
+        with doc.lock:
+            if not doc.parsed or doc.pending > 0 or doc.finished:
+                return
+            doc.finished = True
+        if not doc.failed:
+            try:
+                # 所有新块写入后，删除文档中已经不存在的旧块
+                deleted = doc.store.delete_document(doc.doc_id, keep_hashes=doc.seen)
+                doc.job.add_totals(deleted=deleted)
+            except Exception as e:
+                logger.error(f"Error removing stale chunks of {doc.doc_id}: {e}")
+                doc.job.fail(doc.doc_id, e)
+        self._end_turn(doc)
+        doc.job.document_finished()
@@ -0,0 +1,255 @@
+"""BM25 倒排索引：用于精确词（型号、错误码、中文产品名）检索，与向量检索互补"""
+import logging
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from collections import Counter
+
+import numpy as np
+
+try:
+    import jieba
+except ImportError:  # 没有安装 jieba 时中文按字符二元组切分
+    jieba = None
+
+logger = logging.getLogger(__name__)
+
+# 英文单词 / 数字 / 型号（允许中间出现 - _ . /，例如 AB-1234、E1.02）
+_WORD_RE = re.compile(r"[a-z0-9]+(?:[\-_./][a-z0-9]+)*")
+_CJK_RE = re.compile(r"[一-鿿]+")
+_PART_RE = re.compile(r"[\-_./]")
+
+
+def tokenize(text: str):
+    """分词：英文和型号整体保留并拆出各部分，中文用 jieba 或字符二元组"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    tokens = []
+    for word in _WORD_RE.findall(text):
+        tokens.append(word)
+        parts = _PART_RE.split(word)
+        if len(parts) > 1:
+            tokens.extend(part for part in parts if part)
+    for run in _CJK_RE.findall(text):
+        if jieba is not None:
+            tokens.extend(t for t in jieba.lcut_for_search(run) if t.strip())
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class LexicalIndex:
+    """可增量更新的 BM25 倒排索引
+
+    倒排表按词存放两个紧凑数组（文档内部编号 uint32、词频 uint32），
+    文档内部编号映射到 Milvus 主键；删除只做标记，保存时按需压缩。
+    """
+
+    def __init__(self, path: str = None, k1: float = 1.2, b: float = 0.75, save_interval: float = 60.0):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.save_interval = save_interval
+        self._lock = threading.RLock()
+        self._reset()
+        self._dirty = False
+        self._last_save = time.monotonic()
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def _reset(self):
+        self._postings = {}  # term -> (array docs, array tfs)
+        self._doc_ids = array("q")  # 内部编号 -> 主键
+        self._doc_lens = array("I")
+        self._deleted = bytearray()
+        self._internal = {}  # 主键 -> 内部编号
+        self._live_docs = 0
+        self._live_len = 0
+
+    def __len__(self):
+        return self._live_docs
+
+    def add(self, ids, texts):
+        """加入文档（ids 为 Milvus 主键），同一主键重复加入时以最后一次为准"""
+        with self._lock:
+            for pk, text in zip(ids, texts):
+                pk = int(pk)
+                if pk in self._internal:
+                    self._delete_one(pk)
+                counts = Counter(tokenize(text))
+                doc = len(self._doc_ids)
+                self._doc_ids.append(pk)
+                length = sum(counts.values())
+                self._doc_lens.append(length)
+                self._deleted.append(0)
+                self._internal[pk] = doc
+                self._live_docs += 1
+                self._live_len += length
+                for term, tf in counts.items():
+                    postings = self._postings.get(term)
+                    if postings is None:
+                        postings = self._postings[term] = (array("I"), array("I"))
+                    postings[0].append(doc)
+                    postings[1].append(tf)
+            self._dirty = True
+
+    def delete(self, ids):
+        with self._lock:
+            for pk in ids:
+                self._delete_one(int(pk))
+            self._dirty = True
+
+    def _delete_one(self, pk):
+        doc = self._internal.pop(pk, None)
+        if doc is None or self._deleted[doc]:
+            return
+        self._deleted[doc] = 1
+        self._live_docs -= 1
+        self._live_len -= self._doc_lens[doc]
+
+    def search(self, query: str, k: int = 10):
+        """返回按 BM25 分数降序的 [(主键, 分数)]"""
+        terms = set(tokenize(query))
+        with self._lock:
+            if not terms or not self._live_docs:
+                return []
+            n_docs = self._live_docs
+            avgdl = self._live_len / n_docs
+            doc_lens = np.frombuffer(self._doc_lens, dtype=np.uint32)
+            deleted = np.frombuffer(self._deleted, dtype=np.uint8)
+            all_docs, all_scores = [], []
+            for term in terms:
+                postings = self._postings.get(term)
+                if postings is None:
+                    continue
+                docs = np.frombuffer(postings[0], dtype=np.uint32)
+                tfs = np.frombuffer(postings[1], dtype=np.uint32).astype(np.float32)
+                df = len(docs)
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                norm = self.k1 * (1 - self.b + self.b * doc_lens[docs] / avgdl)
+                all_docs.append(docs.copy())
+                all_scores.append(idf * tfs * (self.k1 + 1) / (tfs + norm))
+            if not all_docs:
+                return []
+            docs = np.concatenate(all_docs)
+            unique, inverse = np.unique(docs, return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate(all_scores))
+            scores[deleted[unique] == 1] = -np.inf
+            top = min(k, len(unique))
+            best = np.argpartition(-scores, top - 1)[:top]
+            best = best[np.argsort(-scores[best])]
+            doc_ids = np.frombuffer(self._doc_ids, dtype=np.int64)
+            results = [
+                (int(doc_ids[unique[i]]), float(scores[i])) for i in best if np.isfinite(scores[i])
+            ]
+            # 释放对 array 缓冲区的引用，之后才能继续追加
+            del doc_lens, deleted, doc_ids
+            return results
+
+    def search_batch(self, queries, k: int = 10):
+        return [self.search(query, k) for query in queries]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "documents": self._live_docs,
+                "deleted": len(self._doc_ids) - self._live_docs,
+                "terms": len(self._postings),
+                "postings": sum(len(p[0]) for p in self._postings.values()),
+                "tokenizer": "jieba" if jieba is not None else "bigram",
+            }
+
+    def compact(self):
+        """去掉已删除文档，重新编号"""
+        with self._lock:
+            live = [doc for doc in range(len(self._doc_ids)) if not self._deleted[doc]]
+            remap = np.full(len(self._doc_ids), -1, dtype=np.int64)
+            remap[live] = np.arange(len(live))
+            postings = {}
+            for term, (docs, tfs) in self._postings.items():
+                docs_np = np.frombuffer(docs, dtype=np.uint32)
+                keep = remap[docs_np] >= 0
+                if keep.any():
+                    postings[term] = (
+                        array("I", remap[docs_np[keep]].astype(np.uint32).tobytes()),
+                        array("I", np.frombuffer(tfs, dtype=np.uint32)[keep].tobytes()),
+                    )
+                del docs_np
+            doc_ids = array("q", (self._doc_ids[doc] for doc in live))
+            doc_lens = array("I", (self._doc_lens[doc] for doc in live))
+            self._postings = postings
+            self._doc_ids = doc_ids
+            self._doc_lens = doc_lens
+            self._deleted = bytearray(len(live))
+            self._internal = {int(pk): doc for doc, pk in enumerate(doc_ids)}
+
+    def maybe_save(self):
+        """距上次保存超过 save_interval 且有改动时保存"""
+        if self.path and self._dirty and time.monotonic() - self._last_save >= self.save_interval:
+            self.save()
+
+    def save(self, path: str = None):
+        path = path or self.path
+        if not path:
+            return
+        with self._lock:
+            if len(self._doc_ids) - self._live_docs > 0.25 * max(len(self._doc_ids), 1):
+                self.compact()
+            terms = list(self._postings)
+            lengths = np.fromiter((len(self._postings[t][0]) for t in terms), dtype=np.uint64, count=len(terms))
+            docs = np.frombuffer(b"".join(self._postings[t][0].tobytes() for t in terms), dtype=np.uint32)
+            tfs = np.frombuffer(b"".join(self._postings[t][1].tobytes() for t in terms), dtype=np.uint32)
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f,
+                    terms=np.frombuffer("\n".join(terms).encode("utf-8"), dtype=np.uint8),
+                    lengths=lengths,
+                    docs=docs,
+                    tfs=tfs,
+                    doc_ids=np.array(self._doc_ids, dtype=np.int64),
+                    doc_lens=np.array(self._doc_lens, dtype=np.uint32),
+                    deleted=np.frombuffer(bytes(self._deleted), dtype=np.uint8),
+                )
+            os.replace(tmp_path, path)
+            self._dirty = False
+            self._last_save = time.monotonic()
+
+    def load(self, path: str):
+        with self._lock:
+            self._reset()
+            with np.load(path) as data:
+                terms = data["terms"].tobytes().decode("utf-8").split("\n") if data["terms"].size else []
+                offsets = np.concatenate([[0], np.cumsum(data["lengths"])]).astype(np.int64)
+                docs, tfs = data["docs"], data["tfs"]
+                for i, term in enumerate(terms):
+                    start, end = offsets[i], offsets[i + 1]
+                    self._postings[term] = (
+                        array("I", docs[start:end].tobytes()),
+                        array("I", tfs[start:end].tobytes()),
+                    )
+                self._doc_ids = array("q", data["doc_ids"].tobytes())
+                self._doc_lens = array("I", data["doc_lens"].tobytes())
+                self._deleted = bytearray(data["deleted"].tobytes())
+            for doc, pk in enumerate(self._doc_ids):
+                if not self._deleted[doc]:
+                    self._internal[pk] = doc
+                    self._live_docs += 1
+                    self._live_len += self._doc_lens[doc]
+            self._dirty = False
+        logger.info(f"Loaded lexical index from {path}: {self._live_docs} documents")
+
+
+def reciprocal_rank_fusion(rankings, k: int = 60):
+    """倒数排名融合：score(d) = sum(1 / (k + rank))，rankings 为若干个按相关度排序的主键列表"""
+    scores = {}
+    for ranking in rankings:
+        for rank, pk in enumerate(ranking):
+            scores[pk] = scores.get(pk, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,545 @@
+"""进程内向量存储后端：不依赖外部服务，适合测试、小规模部署和快速启动
+
+向量存放在磁盘上的 float32 矩阵文件中（numpy.memmap），标量字段和文本存放在 SQLite 中；
+过滤条件与 Milvus 使用同一种布尔表达式，转换成 SQL 条件执行。
+检索默认是分块矩阵乘法的精确检索；索引配置为 IVF_* 时使用 NumPy 实现的倒排（k-means 聚类）索引。
+"""
+import ast
+import json
+import os
+import re
+import shutil
+import sqlite3
+import threading
+
+import numpy as np
+
+from filters import SCALAR_FIELDS
+from index_profiles import DEFAULT_INDEX_PROFILE, build_search_params, get_index_profile, is_binary_profile
+
+SCHEMA_VERSION = 1
+# 除向量以外的字段（id 是主键，同时是向量在矩阵文件中的行号）
+COLUMNS = ("id", "doc_id", "chunk_hash", "text", "metadata") + tuple(SCALAR_FIELDS)
+QUERY_BATCH_SIZE = 1000
+BLOCK_ROWS = 65536  # 精确检索时每次参与矩阵乘法的行数
+MIN_CAPACITY = 1024
+IVF_MIN_POINTS_PER_LIST = 39  # 每个聚类中心至少对应的训练样本数
+IVF_TRAIN_SAMPLE = 65536
+IVF_TRAIN_ITERATIONS = 10
+
+_TOKEN_RE = re.compile(
+    r"\s*(?:(?P<num>-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)"
+    r"|(?P<str>\"(?:[^\"\\]|\\.)*\"|'(?:[^'\\]|\\.)*')"
+    r"|(?P<op>==|!=|>=|<=|&&|\|\||[<>!()\[\],])"
+    r"|(?P<name>[A-Za-z_][A-Za-z0-9_]*))"
+)
+_COMPARISONS = {"==": "=", "!=": "!=", ">": ">", ">=": ">=", "<": "<", "<=": "<="}
+
+
+class _ExprTranslator:
+    """把 Milvus 布尔表达式（比较、in / not in、like、and / or / not、括号、metadata["key"]）转换成 SQL 条件"""
+
+    def __init__(self, expr):
+        self.expr = expr
+        self.tokens = []
+        pos = 0
+        expr = expr.rstrip()
+        while pos < len(expr):
+            match = _TOKEN_RE.match(expr, pos)
+            if match is None or match.end() == pos:
+                raise self._error(f"unexpected character at position {pos}")
+            kind = match.lastgroup
+            self.tokens.append((kind, match.group(kind)))
+            pos = match.end()
+        self.pos = 0
+        self.params = []
+
+    def _error(self, message):
+        return ValueError(f"Invalid filter expression {self.expr!r}: {message}")
+
+    def _peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def _next(self):
+        token = self._peek()
+        if token[0] is None:
+            raise self._error("unexpected end of expression")
+        self.pos += 1
+        return token
+
+    def _accept(self, *values):
+        kind, value = self._peek()
+        if kind in ("op", "name") and value.lower() in values:
+            self.pos += 1
+            return True
+        return False
+
+    def _expect(self, value):
+        if not self._accept(value):
+            raise self._error(f"expected {value!r}")
+
+    def translate(self):
+        sql = self._or()
+        if self.pos != len(self.tokens):
+            raise self._error(f"unexpected token {self.tokens[self.pos][1]!r}")
+        return sql, self.params
+
+    def _or(self):
+        sql = self._and()
+        while self._accept("or", "||"):
+            sql = f"({sql} OR {self._and()})"
+        return sql
+
+    def _and(self):
+        sql = self._not()
+        while self._accept("and", "&&"):
+            sql = f"({sql} AND {self._not()})"
+        return sql
+
+    def _not(self):
+        if self._accept("not", "!"):
+            return f"(NOT {self._not()})"
+        return self._atom()
+
+    def _atom(self):
+        if self._accept("("):
+            sql = self._or()
+            self._expect(")")
+            return sql
+        column = self._field()
+        kind, value = self._next()
+        if kind == "op" and value in _COMPARISONS:
+            self.params.append(self._literal())
+            return f"{column} {_COMPARISONS[value]} ?"
+        negate = kind == "name" and value.lower() == "not"
+        if negate:
+            kind, value = self._next()
+        if kind == "name" and value.lower() == "in":
+            values = self._list()
+            if not values:
+                return "1" if negate else "0"
+            self.params.extend(values)
+            return f"{column} {'NOT IN' if negate else 'IN'} ({', '.join('?' * len(values))})"
+        if kind == "name" and value.lower() == "like" and not negate:
+            pattern = self._literal()
+            if not isinstance(pattern, str):
+                raise self._error("like expects a string pattern")
+            # Milvus 的 like 区分大小写，用 GLOB 实现：先转义 GLOB 的特殊字符，再把 % 换成 *
+            escaped = re.sub(r"([*?\[])", r"[\1]", pattern).replace("%", "*")
+            self.params.append(escaped)
+            return f"{column} GLOB ?"
+        raise self._error(f"unexpected token {value!r}")
+
+    def _field(self):
+        kind, name = self._next()
+        if kind != "name" or name not in COLUMNS:
+            raise self._error(f"unknown field {name!r}")
+        if name != "metadata":
+            return name
+        # JSON 字段：metadata["key"]["sub"]
+        keys = []
+        while self._accept("["):
+            key = self._literal()
+            self._expect("]")
+            keys.append(f"[{key}]" if isinstance(key, int) else "." + json.dumps(str(key), ensure_ascii=False))
+        if not keys:
+            raise self._error("metadata must be accessed with a key, e.g. metadata[\"page\"]")
+        self.params.append("$" + "".join(keys))
+        return "json_extract(metadata, ?)"
+
+    def _literal(self):
+        kind, value = self._next()
+        if kind in ("num", "str"):
+            return ast.literal_eval(value)
+        if kind == "name" and value.lower() in ("true", "false"):
+            return int(value.lower() == "true")
+        raise self._error(f"expected a literal, got {value!r}")
+
+    def _list(self):
+        self._expect("[")
+        values = []
+        if self._accept("]"):
+            return values
+        while True:
+            values.append(self._literal())
+            if self._accept("]"):
+                return values
+            self._expect(",")
+
+
+def translate_expr(expr):
+    """Milvus 表达式 -> (SQL 条件, 参数)"""
+    return _ExprTranslator(expr).translate()
+
+
+class LocalBackend:
+    """进程内向量存储：memmap 向量矩阵 + SQLite 标量字段，接口与 MilvusBackend 相同"""
+
+    name = "local"
+    rescore = False
+
+    def __init__(self, path="data/local_store", index_profile=DEFAULT_INDEX_PROFILE, reset_on_schema_mismatch=False):
+        profile = get_index_profile(index_profile)
+        if is_binary_profile(profile):
+            raise ValueError(f"The local backend does not support binary index profile {index_profile}")
+        self.path = path
+        self.index_profile = profile
+        self.metric_type = profile["metric_type"]
+        # IVF_* 配置使用倒排索引，其他配置（FLAT、HNSW、DISKANN）都做精确检索
+        self.nlist = profile["params"].get("nlist") if profile["index_type"].startswith("IVF") else None
+        if profile["index_type"] not in ("FLAT",) and self.nlist is None:
+            print(f"Local backend has no {profile['index_type']} index, using exact search")
+        self._lock = threading.RLock()
+        self._vectors = None
+        self._capacity = 0
+        self._rows = 0  # 矩阵文件中已使用的行数（包括已删除的行），也是下一个主键
+        self._alive = np.zeros(0, dtype=bool)
+        self._norms = np.zeros(0, dtype=np.float32)
+        self._centroids = None
+        self._assign = np.zeros(0, dtype=np.int32)
+        self._trained_rows = 0
+        self.dim = None
+
+        os.makedirs(path, exist_ok=True)
+        self._conn = self._connect()
+        meta = self._read_meta()
+        if meta and (meta.get("schema_version") != SCHEMA_VERSION or meta.get("fields") != list(COLUMNS)):
+            if not reset_on_schema_mismatch:
+                raise Exception(
+                    f"Local store {path} has an outdated schema. Delete it manually "
+                    f"or start with reset_on_schema_mismatch enabled."
+                )
+            self._conn.close()
+            shutil.rmtree(path)
+            os.makedirs(path, exist_ok=True)
+            self._conn = self._connect()
+            print(f"Dropped local store with outdated schema: {path}")
+            meta = {}
+        self._meta = meta
+
+    def _connect(self):
+        conn = sqlite3.connect(os.path.join(self.path, "chunks.sqlite3"), check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        columns = ", ".join(
+            f"{name} {'INTEGER' if SCALAR_FIELDS.get(name, (str,))[0] is int else 'TEXT'}"
+            for name in COLUMNS[1:]
+        )
+        conn.execute(f"CREATE TABLE IF NOT EXISTS chunks (id INTEGER PRIMARY KEY, {columns})")
+        for name in ("doc_id",) + tuple(SCALAR_FIELDS):
+            conn.execute(f"CREATE INDEX IF NOT EXISTS chunks_{name} ON chunks ({name})")
+        conn.commit()
+        return conn
+
+    def _read_meta(self):
+        return {key: json.loads(value) for key, value in self._conn.execute("SELECT key, value FROM meta")}
+
+    def _write_meta(self, **values):
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            [(key, json.dumps(value)) for key, value in values.items()],
+        )
+
+    @property
+    def _vector_path(self):
+        return os.path.join(self.path, "vectors.f32")
+
+    @property
+    def _ivf_path(self):
+        return os.path.join(self.path, "ivf.npz")
+
+    def existing_dim(self):
+        return self._meta.get("dim")
+
+    def prepare(self, dim, progress=None):
+        """打开（或创建）向量矩阵文件并加载行状态；progress(stage, percent) 报告计算向量范数的进度"""
+        progress = progress or (lambda stage, percent=None: None)
+        with self._lock:
+            self.dim = dim
+            if not self._meta:
+                self._write_meta(schema_version=SCHEMA_VERSION, fields=list(COLUMNS), dim=dim)
+                self._conn.commit()
+                self._meta = self._read_meta()
+                print(f"Created local store at {self.path} (dim={dim})")
+            ids = np.fromiter((row[0] for row in self._conn.execute("SELECT id FROM chunks")), dtype=np.int64)
+            # 主键与 Milvus 的 auto_id 一样只增不减：末尾的行删除后，重启也不会再分配它们的主键
+            # （next_id 之前的旧存储只能从现存的最大主键推算）
+            self._rows = max(self._meta.get("next_id", 0), int(ids.max()) + 1 if len(ids) else 0)
+            self._open_vectors(max(self._rows, MIN_CAPACITY))
+            self._alive = np.zeros(self._capacity, dtype=bool)
+            self._alive[ids] = True
+            self._norms = np.zeros(self._capacity, dtype=np.float32)
+            for start in range(0, self._rows, BLOCK_ROWS):
+                end = min(start + BLOCK_ROWS, self._rows)
+                self._norms[start:end] = np.linalg.norm(self._vectors[start:end], axis=1)
+                progress("load", 100 * end // self._rows)
+            self._assign = np.full(self._capacity, -1, dtype=np.int32)
+            progress("index")
+            self._load_ivf()
+            print(f"Opened local store at {self.path}: {len(ids)} chunks, metric {self.metric_type}")
+
+    def _open_vectors(self, capacity):
+        """按容量打开矩阵文件，容量不够时扩展文件（已有内容不变）"""
+        size = capacity * self.dim * 4
+        mode = "r+b" if os.path.exists(self._vector_path) else "w+b"
+        with open(self._vector_path, mode) as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() < size:
+                f.truncate(size)
+            else:
+                capacity = f.tell() // (self.dim * 4)
+        if self._vectors is not None:
+            self._vectors.flush()
+        self._vectors = np.memmap(self._vector_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        self._capacity = capacity
+
+    def _grow(self, rows):
+        if rows <= self._capacity:
+            return
+        capacity = max(rows, self._capacity * 2)
+        old = self._capacity
+        self._open_vectors(capacity)
+        self._alive = np.concatenate([self._alive, np.zeros(self._capacity - old, dtype=bool)])
+        self._norms = np.concatenate([self._norms, np.zeros(self._capacity - old, dtype=np.float32)])
+        self._assign = np.concatenate([self._assign, np.full(self._capacity - old, -1, dtype=np.int32)])
+
+    def check_search_params(self, search_params):
+        build_search_params(self.index_profile, search_params)
+
+    def insert(self, columns):
+        """按列写入，columns 为 {字段名: 列}，embedding 列是 (n, dim) 的 float32 矩阵；返回主键列表"""
+        embeddings = np.asarray(columns["embedding"], dtype=np.float32)
+        n = len(embeddings)
+        if n == 0:
+            return []
+        if embeddings.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-dim vectors, got {embeddings.shape[1]}")
+        with self._lock:
+            start = self._rows
+            ids = list(range(start, start + n))
+            self._grow(start + n)
+            self._vectors[start:start + n] = embeddings
+            rows = zip(
+                ids,
+                *(
+                    [json.dumps(m, ensure_ascii=False) for m in columns[name]] if name == "metadata" else columns[name]
+                    for name in COLUMNS[1:]
+                ),
+            )
+            self._conn.executemany(
+                f"INSERT INTO chunks ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})", rows
+            )
+            self._write_meta(next_id=start + n)
+            self._conn.commit()
+            self._norms[start:start + n] = np.linalg.norm(embeddings, axis=1)
+            if self._centroids is not None:
+                self._assign[start:start + n] = self._nearest_centroid(embeddings)
+            self._rows = start + n
+            self._alive[start:start + n] = True
+            self._maybe_train()
+        return ids
+
+    def delete(self, ids):
+        ids = [int(i) for i in ids]
+        with self._lock:
+            for start in range(0, len(ids), QUERY_BATCH_SIZE):
+                batch = ids[start:start + QUERY_BATCH_SIZE]
+                self._conn.execute(f"DELETE FROM chunks WHERE id IN ({', '.join('?' * len(batch))})", batch)
+            self._conn.commit()
+            ids = np.asarray([i for i in ids if 0 <= i < self._rows], dtype=np.int64)
+            self._alive[ids] = False
+
+    def query(self, expr, output_fields):
+        """按主键顺序分页读取满足条件的全部行，每行包含 id"""
+        where, params = translate_expr(expr) if expr else ("1", [])
+        fields = ["id"] + [name for name in output_fields if name != "id"]
+        for name in fields:
+            if name not in COLUMNS:
+                raise ValueError(f"Unknown output field: {name}")
+        last = -1
+        while True:
+            with self._lock:
+                page = self._conn.execute(
+                    f"SELECT {', '.join(fields)} FROM chunks WHERE ({where}) AND id > ? ORDER BY id LIMIT ?",
+                    params + [last, QUERY_BATCH_SIZE],
+                ).fetchall()
+            for values in page:
+                row = dict(zip(fields, values))
+                if "metadata" in row:
+                    row["metadata"] = json.loads(row["metadata"])
+                yield row
+            if len(page) < QUERY_BATCH_SIZE:
+                return
+            last = page[-1][0]
+
+    def search(self, query_embeddings, limit, expr=None, search_params=None):
+        """多向量检索，返回每个查询的 [{"id", "text", "metadata", "score"}]"""
+        params = build_search_params(self.index_profile, search_params, limit)["params"]
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        with self._lock:
+            vectors, rows = self._vectors, self._rows
+            mask = self._alive[:rows].copy()
+            norms = self._norms[:rows]
+            centroids, assign = self._centroids, self._assign[:rows]
+            if expr:
+                where, expr_params = translate_expr(expr)
+                matched = np.fromiter(
+                    (row[0] for row in self._conn.execute(f"SELECT id FROM chunks WHERE {where}", expr_params)),
+                    dtype=np.int64,
+                )
+                allowed = np.zeros(rows, dtype=bool)
+                allowed[matched[matched < rows]] = True
+                mask &= allowed
+        if self.metric_type == "COSINE":
+            queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+        if centroids is None:
+            top = self._scan(queries, vectors, norms, mask, limit)
+        else:
+            # 倒排索引：每个查询只扫描最近的 nprobe 个聚类（尚未分配聚类的行总是参与检索）
+            nprobe = min(params.get("nprobe", 1), len(centroids))
+            probes = np.argsort(-(queries @ centroids.T), axis=1)[:, :nprobe]
+            top = []
+            for query, lists in zip(queries, probes):
+                query_mask = mask & (np.isin(assign, lists) | (assign < 0))
+                top.extend(self._scan(query[None, :], vectors, norms, query_mask, limit))
+        return self._hydrate(top)
+
+    def _scan(self, queries, vectors, norms, mask, k):
+        """分块计算候选行的分数并保留每个查询的前 k 条，返回 [[(id, score), ...]]（按相关度排序）"""
+        m = len(queries)
+        best_scores = np.empty((m, 0), dtype=np.float32)
+        best_ids = np.empty((m, 0), dtype=np.int64)
+        for start in range(0, len(mask), BLOCK_ROWS):
+            block_mask = mask[start:start + BLOCK_ROWS]
+            selected = np.flatnonzero(block_mask)
+            if not len(selected):
+                continue
+            if len(selected) == len(block_mask):
+                block = vectors[start:start + len(block_mask)]
+            else:
+                block = vectors[selected + start]
+            selected += start
+            scores = self._similarity(queries, np.asarray(block), norms[selected])
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            best_ids = np.concatenate([best_ids, np.broadcast_to(selected, scores.shape)], axis=1)
+            if best_scores.shape[1] > k:
+                keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                best_ids = np.take_along_axis(best_ids, keep, axis=1)
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_ids = np.take_along_axis(best_ids, order, axis=1)
+        if self.metric_type == "L2":
+            # 内部用负距离排序，对外与 Milvus 一样给出 L2 距离的平方
+            best_scores = -best_scores
+        return [
+            [(int(pk), float(score)) for pk, score in zip(ids, scores)]
+            for ids, scores in zip(best_ids, best_scores)
+        ]
+
+    def _similarity(self, queries, block, norms):
+        """越大越相关的分数矩阵 (m, b)"""
+        dots = queries @ block.T
+        if self.metric_type == "COSINE":
+            return dots / np.maximum(norms, 1e-12)
+        if self.metric_type == "L2":
+            return 2 * dots - (queries * queries).sum(axis=1, keepdims=True) - norms * norms
+        return dots
+
+    def _hydrate(self, top):
+        ids = sorted({pk for hits in top for pk, _ in hits})
+        rows = {}
+        with self._lock:
+            for start in range(0, len(ids), QUERY_BATCH_SIZE):
+                batch = ids[start:start + QUERY_BATCH_SIZE]
+                for pk, text, metadata in self._conn.execute(
+                    f"SELECT id, text, metadata FROM chunks WHERE id IN ({', '.join('?' * len(batch))})", batch
+                ):
+                    rows[pk] = (text, json.loads(metadata))
+        return [
+            [
+                {"id": pk, "text": rows[pk][0], "metadata": rows[pk][1], "score": score}
+                for pk, score in hits
+                if pk in rows
+            ]
+            for hits in top
+        ]
+
+    def _nearest_centroid(self, embeddings):
+        if self.metric_type == "COSINE":
+            embeddings = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return np.argmax(embeddings @ self._centroids.T, axis=1).astype(np.int32)
+
+    def _maybe_train(self):
+        """数据量足够时训练倒排索引，数据量翻倍后重新训练（调用方持有锁）"""
+        if self.nlist is None:
+            return
+        live = int(self._alive[:self._rows].sum())
+        nlist = min(self.nlist, live // IVF_MIN_POINTS_PER_LIST)
+        if nlist < 2 or (self._centroids is not None and live < 2 * self._trained_rows):
+            return
+        rows = np.flatnonzero(self._alive[:self._rows])
+        rng = np.random.default_rng(0)
+        sample = np.sort(rng.choice(rows, size=min(len(rows), IVF_TRAIN_SAMPLE), replace=False))
+        data = np.asarray(self._vectors[sample])
+        # 聚类在单位球面上进行（球面 k-means），内积度量下也能得到均衡的划分
+        data = data / np.maximum(np.linalg.norm(data, axis=1, keepdims=True), 1e-12)
+        centroids = data[rng.choice(len(data), size=nlist, replace=False)]
+        for _ in range(IVF_TRAIN_ITERATIONS):
+            labels = np.argmax(data @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, data)
+            counts = np.bincount(labels, minlength=nlist)
+            empty = counts == 0
+            sums[empty] = centroids[empty]
+            centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+        self._centroids = centroids.astype(np.float32)
+        for start in range(0, self._rows, BLOCK_ROWS):
+            end = min(start + BLOCK_ROWS, self._rows)
+            self._assign[start:end] = self._nearest_centroid(np.asarray(self._vectors[start:end]))
+        self._trained_rows = live
+        print(f"Trained local IVF index: {nlist} lists over {live} chunks")
+
+    def _load_ivf(self):
+        if self.nlist is None or not os.path.exists(self._ivf_path):
+            self._maybe_train()
+            return
+        data = np.load(self._ivf_path)
+        if data["centroids"].shape[1] != self.dim:
+            self._maybe_train()
+            return
+        self._centroids = data["centroids"]
+        self._trained_rows = int(data["trained_rows"])
+        assign = data["assign"][:self._rows]
+        self._assign[:len(assign)] = assign
+        if len(assign) < self._rows:
+            # 上次保存之后写入的行
+            self._assign[len(assign):self._rows] = self._nearest_centroid(
+                np.asarray(self._vectors[len(assign):self._rows])
+            )
+
+    def count(self):
+        with self._lock:
+            return int(self._alive[:self._rows].sum())
+
+    def flush(self):
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+            if self._centroids is not None:
+                tmp_path = self._ivf_path + ".tmp.npz"
+                np.savez(
+                    tmp_path,
+                    centroids=self._centroids,
+                    assign=self._assign[:self._rows],
+                    trained_rows=self._trained_rows,
+                )
+                os.replace(tmp_path, self._ivf_path)
+            self._conn.commit()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._conn.close()
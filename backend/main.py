@@ -1,27 +1,44 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Request
+from fastapi import Depends, FastAPI, UploadFile, File, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
-import fitz  # PyMuPDF
-import pandas as pd
-import docx
-import markdown
-import xml.etree.ElementTree as ET
-from PIL import Image
-import pytesseract
-import io
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Literal, Optional
+import json
 import logging
+import os
+import threading
+import time
 import uvicorn
 from vector_store import VectorStore
-from pdf_processor import process_pdf
-from xml_processor import process_xml
+from answer_generator import AnswerGenerator, GenerationError, OllamaLLM, format_sse
+from chunker import TextChunker
+from config import load_settings
+from concurrency import BlockingExecutor, ConcurrencyLimiter, OverloadedError
+from filters import build_filter_expr, combine_exprs
+from ingest_jobs import IngestPipeline
+from metrics import HTTP_SECONDS, REGISTRY, Gauge, span, start_trace
+from parsers import STREAMING_EXTENSIONS, SUPPORTED_EXTENSIONS, loaded_parsers, preload_parsers
+from parsing_executor import ParsingExecutor
+from query_cache import QueryCache
+from reranker import CrossEncoderReranker
+from shared_state import JobStore
+from tenants import TenantRegistry, TooManyTenantsError, UnknownTenantError
+from upload_spool import IngestBudgetExceeded, UploadSpool
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 全部配置来自环境变量或 RAG_CONFIG_FILE，见 config.py
+settings = load_settings()
+STARTED_AT = time.monotonic()
+
 app = FastAPI(title="知识库 API")
 
+# 单条查询最多返回的结果数，以及批量检索一次最多的查询数
+MAX_TOP_K = 1000
+MAX_BATCH_QUERIES = 4096
+
 # 配置CORS
 origins = [
     "http://10.101.105.43:8501",
@@ -41,45 +58,208 @@ app.add_middleware(
 # 定义请求模型
 class SearchQuery(BaseModel):
     query: str
+    k: int = Field(5, ge=1, le=MAX_TOP_K)
+    filter: Optional[str] = None  # Milvus 布尔表达式，例如 doc_id == "a.pdf"
+    # 结构化过滤条件，与 filter 同时给出时取交集，例如 {"doc_type": ["pdf", "docx"], "page": {"lte": 10}}
+    filters: Optional[Dict[str, Any]] = None
+    search_params: Optional[Dict[str, Any]] = None  # 覆盖默认检索参数，例如 {"ef": 128}
+    mode: Literal["dense", "hybrid"] = "dense"  # hybrid: 向量 + 关键词检索，RRF 融合
+    rerank: bool = False  # 多召回一些候选，用交叉编码器重排后取前 k 条
+
+class AskQuery(BaseModel):
+    question: str
+    k: int = Field(8, ge=1, le=100)  # 检索的候选块数，打包上下文时去重并受 token 预算限制
+    filter: Optional[str] = None
+    filters: Optional[Dict[str, Any]] = None
+    mode: Literal["dense", "hybrid"] = "dense"
+    rerank: bool = False
+    max_context_tokens: Optional[int] = Field(None, ge=100, le=32000)  # 默认 RAG_ASK_CONTEXT_TOKENS
+    stream: bool = True  # 以 Server-Sent Events 逐段返回生成的文本
+
+class BatchSearchQuery(BaseModel):
+    queries: List[SearchQuery]
+    search_params: Optional[Dict[str, Any]] = None
+    mode: Literal["dense", "hybrid"] = "dense"
+    rerank: bool = False
+
+# 每攒够这么多文本块送去嵌入并写入一次向量库
+INGEST_BATCH_SIZE = 64
+
+chunker = TextChunker(chunk_size=500, chunk_overlap=50)
+
+# 检索结果缓存：TTL（秒）和语义近似命中的余弦相似度阈值（0 表示只做精确匹配）
+query_cache = QueryCache(
+    max_entries=settings.query_cache_size,
+    ttl=settings.query_cache_ttl,
+    similarity_threshold=settings.semantic_cache_threshold,
+)
+
+# 答案生成：Ollama 生成模型（RAG_LLM_URL 可以指向任何兼容 /api/generate 的服务，例如测试用的桩服务）、
+# 上下文的 token 预算，以及按 (问题, 资料) 缓存的完整答案
+answer_generator = AnswerGenerator(
+    OllamaLLM(
+        url=settings.llm_url,
+        model_name=settings.llm_model,
+        keep_alive=settings.llm_keep_alive,
+    ),
+    max_context_tokens=settings.ask_context_tokens,
+    cache_size=settings.answer_cache_size,
+    cache_ttl=settings.answer_cache_ttl,
+)
+
+# 阻塞调用（pymilvus、重排、入库提交）的线程数；同时处理的检索请求数和允许排队的请求数（每个 worker 进程）
+blocking_executor = BlockingExecutor(max_workers=settings.blocking_workers)
+search_limiter = ConcurrencyLimiter(settings.max_concurrent_searches, settings.max_queued_searches)
+
+# 各租户的 VectorStore 在第一次使用时创建，这里不连接任何外部服务
+tenants = TenantRegistry(settings)
+parsing_executor = None
+ingest_pipeline = None
+job_store = None
+reranker = None
+upload_spool = None
+# 关闭服务时通知后台初始化线程停止重试
+shutting_down = threading.Event()
+
+# 队列深度和并发数在抓取 /metrics 时读取
+REGISTRY.register(Gauge(
+    "rag_ingest_queue_depth",
+    "Items waiting in each ingest pipeline stage",
+    lambda: ingest_pipeline.queue_depths() if ingest_pipeline is not None else {},
+    ["stage"],
+))
+REGISTRY.register(Gauge(
+    "rag_search_active", "Searches being processed", lambda: search_limiter.active
+))
+REGISTRY.register(Gauge(
+    "rag_search_waiting", "Searches waiting for a slot", lambda: search_limiter.waiting
+))
+REGISTRY.register(Gauge(
+    "rag_insert_buffer_rows",
+    "Rows waiting in the insert buffer",
+    lambda: sum(store.writer.pending_rows() for store in tenants.stores().values()),
+))
+REGISTRY.register(Gauge(
+    "rag_upload_spool_bytes",
+    "Bytes of spooled uploads not yet parsed",
+    lambda: upload_spool.used if upload_spool is not None else 0,
+))
+
+def init_default_tenant(retry_delay: float = 5.0):
+    """后台初始化默认租户（连接向量库、建集合和索引），失败时重试；完成前 /ready 返回 503"""
+    while not shutting_down.is_set():
+        try:
+            tenants.get(settings.default_tenant)
+            break
+        except Exception as e:
+            logger.error(f"Failed to initialize vector store, retrying in {retry_delay}s: {e}")
+            shutting_down.wait(retry_delay)
+    else:
+        return
+    # 流式解析器在本进程中运行，就绪后再预先导入（pandas、openpyxl、lxml），不拖慢启动；
+    # 其他类型在解析子进程中按需导入
+    try:
+        preload_parsers(STREAMING_EXTENSIONS)
+    except Exception as e:
+        logger.warning(f"Failed to preload parsers: {e}")
 
-# 初始化向量存储
-try:
-    vector_store = VectorStore()
-    logger.info("Vector store initialized successfully")
-except Exception as e:
-    logger.error(f"Failed to initialize vector store: {e}")
-    vector_store = None
-
-def process_excel(content: bytes) -> str:
-    """处理Excel文件"""
-    df = pd.read_excel(io.BytesIO(content))
-    return df.to_string()
-
-def process_word(content: bytes) -> str:
-    """处理Word文档"""
-    doc = docx.Document(io.BytesIO(content))
-    return "\n".join([paragraph.text for paragraph in doc.paragraphs])
-
-def process_markdown(content: bytes) -> str:
-    """处理Markdown文件"""
-    return markdown.markdown(content.decode('utf-8'))
-
-def process_image(content: bytes) -> str:
-    """处理图片文件"""
-    image = Image.open(io.BytesIO(content))
-    return pytesseract.image_to_string(image)
-
-def process_csv(content: bytes) -> str:
-    """处理CSV文件"""
-    df = pd.read_csv(io.BytesIO(content))
-    return df.to_string()
+@app.on_event("startup")
+def init_services():
+    """启动解析进程池和后台入库流水线，并在后台初始化默认租户的向量存储
+
+    每个 worker 进程各自执行一次。解析子进程以 spawn 方式启动并会重新导入主模块，
+    所以这些初始化不放在模块导入时执行。
+    """
+    global parsing_executor, ingest_pipeline, job_store, reranker, upload_spool
+    # 入库任务状态写入各进程共用的 SQLite，任务在哪个进程执行都能查到
+    job_store = JobStore(os.path.join(settings.state_dir, "jobs.sqlite3"))
+    upload_spool = UploadSpool(settings.upload_spool_dir, settings.max_ingest_mb * 1024 * 1024)
+    parsing_executor = ParsingExecutor(
+        max_workers=settings.parse_workers or None,
+        task_timeout=settings.parse_task_timeout,
+        memory_limit_mb=settings.parse_memory_limit_mb or None,
+        pages_per_task=settings.parse_pages_per_task,
+    )
+    ingest_pipeline = IngestPipeline(
+        None,
+        parsing_executor.extract_sections,
+        chunker,
+        parse_workers=settings.ingest_parse_workers,
+        batch_size=INGEST_BATCH_SIZE,
+        job_store=job_store,
+    )
+    if settings.rerank_model:
+        reranker = CrossEncoderReranker(
+            model_name=settings.rerank_model,
+            budget_ms=settings.rerank_budget_ms,
+            max_candidates=settings.rerank_candidates,
+        )
+        # 后台预加载模型，不阻塞启动
+        threading.Thread(target=reranker.load, daemon=True).start()
+    threading.Thread(target=init_default_tenant, name="init-vector-store", daemon=True).start()
+
+@app.on_event("shutdown")
+async def shutdown_services():
+    shutting_down.set()
+    if ingest_pipeline is not None:
+        ingest_pipeline.close()
+    if job_store is not None:
+        job_store.close()
+    if parsing_executor is not None:
+        parsing_executor.shutdown()
+    if reranker is not None:
+        reranker.close()
+    await answer_generator.aclose()
+    await tenants.aclose()
+    blocking_executor.shutdown()
+
+def current_tenant(request: Request) -> str:
+    """请求头（默认 X-Tenant-ID）中的租户，未启用多租户时总是默认租户"""
+    try:
+        return tenants.resolve(request.headers.get(settings.tenant_header))
+    except UnknownTenantError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+
+async def tenant_store(tenant: str = Depends(current_tenant)) -> VectorStore:
+    """当前租户的 VectorStore；租户第一次被访问时在线程池中初始化"""
+    store = tenants.peek(tenant)
+    if store is not None:
+        return store
+    if tenant == settings.default_tenant:
+        # 默认租户由启动时的后台线程初始化，未完成时不在请求里重复等待
+        raise HTTPException(status_code=503, detail="Vector store not initialized", headers={"Retry-After": "5"})
+    try:
+        return await blocking_executor.run(tenants.get, tenant)
+    except TooManyTenantsError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except Exception as e:
+        logger.error(f"Failed to initialize vector store for tenant {tenant}: {e}")
+        raise HTTPException(status_code=503, detail=f"Vector store for tenant {tenant} not initialized")
+
+def score_type(store: VectorStore, mode: str, rerank: bool = False) -> str:
+    """结果中 score 的含义：重排分数、混合检索的 RRF 融合分数或索引的距离度量"""
+    if rerank:
+        return "RERANK"
+    return "RRF" if mode == "hybrid" else store.metric_type
+
+def retrieval_k(k: int, rerank: bool) -> int:
+    """需要重排时多召回一些候选"""
+    if not rerank:
+        return k
+    if reranker is None:
+        raise ValueError("Reranking is disabled: set RAG_RERANK_MODEL to enable it")
+    return max(k, settings.rerank_candidates)
 
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
     logger.info(f"Incoming request: {request.method} {request.url}")
+    # 请求内各阶段（嵌入、Milvus 检索、重排等）的耗时记入 trace，请求结束时一并输出
+    trace = start_trace(f"{request.method} {request.url.path}")
+    status = 500
     try:
         response = await call_next(request)
-        logger.info(f"Response status: {response.status_code}")
+        status = response.status_code
+        logger.info(f"Response status: {status} in {trace.elapsed() * 1000:.1f}ms {trace.breakdown()}")
         return response
     except Exception as e:
         logger.error(f"Request failed: {str(e)}")
@@ -87,80 +267,324 @@ async def log_requests(request: Request, call_next):
             status_code=500,
             content={"detail": str(e)}
         )
+    finally:
+        # 按路由模板统计，避免 /jobs/{job_id} 这类路径产生无限多的标签
+        route = request.scope.get("route")
+        HTTP_SECONDS.observe(
+            trace.elapsed(),
+            method=request.method,
+            route=route.path if route is not None else "unmatched",
+            status=status,
+        )
 
 @app.get("/")
 async def root():
     return {"message": "Knowledge Base API is running"}
 
+@app.get("/live")
+async def liveness():
+    """进程存活即返回 200，不依赖向量库"""
+    return {"status": "ok", "pid": os.getpid()}
+
+@app.get("/ready")
+async def readiness():
+    """默认租户的向量存储初始化完成后返回 200，否则 503（负载均衡据此决定是否转发请求）"""
+    store = tenants.peek(settings.default_tenant)
+    body = {
+        "status": "ok" if store is not None else "starting",
+        "pid": os.getpid(),
+        "uptime_seconds": round(time.monotonic() - STARTED_AT, 1),
+        "tenant_isolation": settings.tenant_isolation,
+        "tenants": sorted(tenants.stores()),
+        # 正在初始化的租户及所处阶段，例如 {"default": {"stage": "load", "percent": 40, "seconds": 12.5}}
+        "initializing": tenants.progress(),
+        "errors": tenants.errors(),
+        "parsers_loaded": loaded_parsers(),
+    }
+    if store is None:
+        return JSONResponse(status_code=503, content=body)
+    return body
+
 @app.get("/health")
 async def health_check():
-    if vector_store is None:
-        raise HTTPException(status_code=503, detail="Vector store not initialized")
-    return {"status": "ok"}
+    return await readiness()
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus 文本格式的指标"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/stats/cache")
+async def cache_stats(tenant: str = Depends(current_tenant), vector_store: VectorStore = Depends(tenant_store)):
+    """本进程的缓存统计；写入缓冲和关键词索引为当前租户的"""
+    stats = {
+        "tenant": tenant,
+        "embedding": vector_store.embedding_cache.stats(),
+        "insert_buffer": vector_store.writer.stats(),
+    }
+    if vector_store.lexical_index is not None:
+        stats["lexical_index"] = vector_store.lexical_index.stats()
+    if reranker is not None:
+        stats["rerank"] = reranker.stats()
+    stats["query"] = query_cache.stats()
+    stats["answer"] = answer_generator.stats()
+    stats["search_limiter"] = search_limiter.stats()
+    stats["tenant_search_limiter"] = tenants.limiter(tenant).stats()
+    if upload_spool is not None:
+        stats["upload_spool"] = upload_spool.stats()
+    return stats
 
 @app.post("/upload/")
-async def upload_files(files: list[UploadFile] = File(...)):
-    if vector_store is None:
-        raise HTTPException(status_code=503, detail="Vector store not initialized")
-    
+async def upload_files(
+    files: list[UploadFile] = File(...),
+    tenant: str = Depends(current_tenant),
+    vector_store: VectorStore = Depends(tenant_store),
+):
     try:
-        texts = []
         for file in files:
-            content = await file.read()
             file_extension = file.filename.split('.')[-1].lower()
-            
-            # 根据文件类型选择处理方式
-            if file_extension == 'pdf':
-                text = process_pdf(content)
-            elif file_extension in ['xlsx', 'xls']:
-                text = process_excel(content)
-            elif file_extension in ['docx', 'doc']:
-                text = process_word(content)
-            elif file_extension == 'md':
-                text = process_markdown(content)
-            elif file_extension in ['xml']:
-                text = process_xml(content)
-            elif file_extension in ['jpg', 'jpeg', 'png', 'bmp']:
-                text = process_image(content)
-            elif file_extension == 'csv':
-                text = process_csv(content)
-            else:
+            if file_extension not in SUPPORTED_EXTENSIONS:
                 raise HTTPException(status_code=400, detail=f"Unsupported file type: {file_extension}")
-            
-            if text.strip():
-                texts.append(text)
-        
-        if not texts:
-            raise HTTPException(status_code=400, detail="No text content found in files")
-        
-        vector_store.add_documents(texts)
-        return {"message": f"Successfully processed {len(texts)} text chunks"}
+
+        # 分块写入磁盘，解析器按路径打开文件，不把整个文件读入内存
+        uploads = []
+        handed_over = threading.Event()
+
+        def submit():
+            # 进入 submit 之后由流水线负责（通过 on_done）删除这些文件
+            handed_over.set()
+            return ingest_pipeline.submit(uploads, on_done=upload_spool.discard, store=vector_store, tenant=tenant)
+
+        try:
+            for file in files:
+                file_extension = file.filename.split('.')[-1].lower()
+                # 先登记路径再写入，写入过程中出错或请求被取消时也能删除
+                path = upload_spool.new_path(file_extension)
+                uploads.append((file.filename, file_extension, path))
+                await blocking_executor.run(upload_spool.spool, file.file, file_extension, path)
+
+            # 解析 -> 分块 -> 嵌入 -> 写入 全部在后台流水线中完成，这里立即返回任务 ID
+            # （流水线队列满时 submit 会阻塞，放到线程池中等待）
+            job = await blocking_executor.run(submit)
+        except BaseException as e:
+            # 还没有交给流水线的文件不会再被处理，删除并归还额度
+            if not handed_over.is_set():
+                for _, _, path in uploads:
+                    upload_spool.discard(path)
+            if isinstance(e, IngestBudgetExceeded):
+                if e.too_large:
+                    raise HTTPException(status_code=413, detail=str(e))
+                raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+            raise
+        logger.info(f"Submitted ingest job {job.id} with {len(uploads)} files for tenant {tenant}")
+        return {"job_id": job.id, "status": job.status}
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing files: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/search/")
-async def search(query: SearchQuery):
-    if vector_store is None:
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, tenant: str = Depends(current_tenant)):
+    if ingest_pipeline is None:
         raise HTTPException(status_code=503, detail="Vector store not initialized")
     
+    # 任务可能由其他 worker 进程执行，此时从 JobStore 读取；其他租户的任务视为不存在
+    job = await blocking_executor.run(ingest_pipeline.get, job_id)
+    if job is None or job.get("tenant", "") != tenant:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job
+
+@app.post("/flush")
+async def flush(vector_store: VectorStore = Depends(tenant_store)):
+    """把本进程写入缓冲中当前租户的块写入向量库并封存 segment，之后的检索一定能读到此前完成的入库"""
+    rows = await blocking_executor.run(vector_store.flush)
+    return {"status": "ok", "rows": rows}
+
+@app.delete("/documents/{doc_id}")
+async def delete_document(doc_id: str, vector_store: VectorStore = Depends(tenant_store)):
+    deleted = await blocking_executor.run(vector_store.delete_document, doc_id)
+    return {"doc_id": doc_id, "deleted": deleted}
+
+def query_expr(query: SearchQuery) -> Optional[str]:
+    """结构化过滤条件和原始表达式合并为下推到检索中的 expr"""
+    return combine_exprs(build_filter_expr(query.filters), query.filter)
+
+def run_search(vector_store: VectorStore, query: SearchQuery, embedding):
+    """检索（和重排），在线程池中执行"""
+    results = vector_store.search(
+        query.query,
+        k=retrieval_k(query.k, query.rerank),
+        expr=query_expr(query),
+        search_params=query.search_params,
+        mode=query.mode,
+        query_embedding=embedding,
+    )
+    if query.rerank:
+        with span("rerank"):
+            results = reranker.rerank(query.query, results, k=query.k)
+    return results
+
+async def cached_search(vector_store: VectorStore, tenant: str, query: SearchQuery):
+    """先查结果缓存（精确匹配，其次语义近似匹配），未命中再检索并写入缓存"""
+    params_key = json.dumps(
+        {
+            "tenant": tenant,
+            "k": query.k,
+            "filter": query_expr(query),
+            "search_params": query.search_params,
+            "mode": query.mode,
+            "rerank": query.rerank,
+        },
+        sort_keys=True,
+    )
+    # 在检索之前读取 generation：检索期间有新写入时，这次的结果下次就会被视为过期
+    generation = vector_store.generation
+    results = query_cache.get(query.query, params_key, generation)
+    if results is not None:
+        return results
+    
+    # 查询嵌入通过异步 HTTP 客户端获取，等待 Ollama 时不占用线程
+    embedding = (await vector_store.aget_embeddings([query.query]))[0]
+    # 关键词检索依赖精确词（型号只差一位时向量几乎相同），混合检索不做语义近似匹配
+    semantic = query.mode == "dense"
+    if semantic:
+        results = query_cache.get_similar(embedding, params_key, generation)
+        if results is not None:
+            return results
+    
+    start = time.perf_counter()
+    results = await blocking_executor.run(run_search, vector_store, query, embedding)
+    query_cache.put(
+        query.query,
+        params_key,
+        generation,
+        results,
+        embedding if semantic else None,
+        time.perf_counter() - start,
+    )
+    return results
+
+def run_batch_search(vector_store: VectorStore, batch: BatchSearchQuery, embeddings):
+    results = vector_store.search_batch(
+        [q.query for q in batch.queries],
+        ks=[retrieval_k(q.k, batch.rerank) for q in batch.queries],
+        exprs=[query_expr(q) for q in batch.queries],
+        search_params=batch.search_params,
+        mode=batch.mode,
+        query_embeddings=embeddings,
+    )
+    if batch.rerank:
+        with span("rerank"):
+            results = [
+                reranker.rerank(q.query, hits, k=q.k) for q, hits in zip(batch.queries, results)
+            ]
+    return results
+
+@app.post("/search/")
+async def search(
+    query: SearchQuery,
+    tenant: str = Depends(current_tenant),
+    vector_store: VectorStore = Depends(tenant_store),
+):
     try:
         logger.info(f"Searching for query: {query.query}")
-        results = vector_store.search(query.query)
-        return {"results": results}
+        # 全局限制之外每个租户还有自己的并发上限，一个租户的突发请求不会占满全部检索槽位
+        async with search_limiter, tenants.limiter(tenant):
+            results = await cached_search(vector_store, tenant, query)
+        return {"results": results, "metric_type": score_type(vector_store, query.mode, query.rerank)}
+    except OverloadedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error searching: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/search/batch")
+async def search_batch(
+    batch: BatchSearchQuery,
+    tenant: str = Depends(current_tenant),
+    vector_store: VectorStore = Depends(tenant_store),
+):
+    if len(batch.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many queries: {len(batch.queries)} > {MAX_BATCH_QUERIES}"
+        )
+    
+    try:
+        logger.info(f"Batch searching {len(batch.queries)} queries")
+        async with search_limiter, tenants.limiter(tenant):
+            embeddings = await vector_store.aget_embeddings([q.query for q in batch.queries])
+            results = await blocking_executor.run(run_batch_search, vector_store, batch, embeddings)
+        return {"results": results, "metric_type": score_type(vector_store, batch.mode, batch.rerank)}
+    except OverloadedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error batch searching: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/ask")
+async def ask(
+    query: AskQuery,
+    tenant: str = Depends(current_tenant),
+    vector_store: VectorStore = Depends(tenant_store),
+):
+    """检索 -> 打包上下文 -> 调用生成模型；默认以 SSE 流式返回
+
+    事件依次为 sources（使用的资料）、若干 token（生成的文本片段）、done（统计信息），出错时为 error。
+    """
+    search_query = SearchQuery(
+        query=query.question,
+        k=query.k,
+        filter=query.filter,
+        filters=query.filters,
+        mode=query.mode,
+        rerank=query.rerank,
+    )
+    try:
+        logger.info(f"Answering question: {query.question}")
+        async with search_limiter, tenants.limiter(tenant):
+            hits = await cached_search(vector_store, tenant, search_query)
+    except OverloadedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error searching: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    
+    if not query.stream:
+        try:
+            return await answer_generator.answer(query.question, hits, query.max_context_tokens)
+        except GenerationError as e:
+            raise HTTPException(status_code=502, detail=str(e))
+    
+    async def events():
+        async for event, data in answer_generator.stream(query.question, hits, query.max_context_tokens):
+            yield format_sse(event, data)
+    
+    # 检索在返回响应头之前完成（检索失败时仍能返回正常的错误状态码），生成的文本边产生边发送
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 if __name__ == "__main__":
-    host = "10.101.105.43"
-    port = 9081
-    logger.info(f"Starting server on {host}:{port}")
+    # 多个 worker 或自动重启时 uvicorn 需要以导入字符串的方式加载应用（每个 worker 进程各自执行 startup）；
+    # 单进程时直接传入 app，省去再导入一遍本模块
+    logger.info(f"Starting server on {settings.host}:{settings.port} with {settings.workers} worker(s)")
     uvicorn.run(
-        "main:app", 
-        host=host, 
-        port=port, 
-        reload=True,
-        access_log=True
-    ) 
\ No newline at end of file
+        "main:app" if settings.workers > 1 or settings.reload else app,
+        host=settings.host,
+        port=settings.port,
+        workers=settings.workers,
+        reload=settings.reload,
+        log_level=settings.log_level,
+        access_log=settings.access_log,
+    )
@@ -0,0 +1,225 @@
+"""进程内指标（Prometheus 文本格式）和按请求的分阶段耗时追踪
+
+    with span("vector_search"):
+        ...
+
+span 把耗时记入 rag_stage_duration_seconds 直方图；在 start_trace() 开启的请求上下文中
+（包括通过 contextvars 传递上下文的线程池任务）还会记入该请求的 Trace，用于输出耗时分解。
+"""
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Sequence
+
+# 默认直方图分桶（秒），覆盖 1ms 到 1 分钟
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None) -> str:
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value) -> str:
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+    def _samples(self):
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Gauge(_Metric):
+    """取值时调用 function()；带标签时 function 返回 {标签值元组: 数值}"""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, function: Callable, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+
+    def _samples(self):
+        values = self.function()
+        if not self.labelnames:
+            values = {(): values}
+        for key, value in sorted(values.items()):
+            key = key if isinstance(key, tuple) else (key,)
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # 标签值 -> [各桶计数（非累计）..., 总数, 总和]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0, 0.0]
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def _samples(self):
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for key, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key, ("le", "+Inf"))
+            yield f"{self.name}_bucket{labels} {values[-2]}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_count{labels} {values[-2]}"
+            yield f"{self.name}_sum{labels} {_format_value(values[-1])}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            # 重复注册（例如服务重启初始化）时以新的为准
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "rag_stage_duration_seconds",
+    "Duration of pipeline stages (embed, vector_insert, vector_flush, vector_search, hydrate, rerank, ...)",
+    ["stage"],
+))
+PARSE_SECONDS = REGISTRY.register(Histogram(
+    "rag_parse_duration_seconds",
+    "Time spent parsing one document, by file type",
+    ["file_type"],
+))
+INGESTED_CHUNKS = REGISTRY.register(Counter(
+    "rag_ingested_chunks_total", "Chunks written to the vector store"
+))
+INGESTED_TOKENS = REGISTRY.register(Counter(
+    "rag_ingested_tokens_total", "Approximate tokens of the chunks written to the vector store"
+))
+INGESTED_BYTES = REGISTRY.register(Counter(
+    "rag_ingested_bytes_total", "Size of the parsed source files, by file type", ["file_type"]
+))
+HTTP_SECONDS = REGISTRY.register(Histogram(
+    "rag_http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"]
+))
+
+
+class Trace:
+    """一个请求内各阶段的耗时（同名阶段累加）"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = time.perf_counter()
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def breakdown(self) -> str:
+        with self._lock:
+            stages = dict(self.stages)
+        return " ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in stages.items())
+
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("rag_trace", default=None)
+
+
+def start_trace(name: str) -> Trace:
+    """在当前上下文中开启一个请求追踪"""
+    trace = Trace(name)
+    _current_trace.set(trace)
+    return trace
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def span(stage: str):
+    """记录一个阶段的耗时（异常退出时同样记录）"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        STAGE_SECONDS.observe(seconds, stage=stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(stage, seconds)
@@ -0,0 +1,329 @@
+"""Milvus 向量存储后端"""
+import json
+import time
+
+import numpy as np
+from pymilvus import connections, Collection, FieldSchema, CollectionSchema, DataType, utility
+
+from filters import SCALAR_FIELDS
+from index_profiles import (
+    DEFAULT_BINARY_INDEX_PROFILE,
+    DEFAULT_INDEX_PROFILE,
+    build_search_params,
+    get_index_profile,
+    index_matches,
+    is_binary_profile,
+)
+from vector_codec import VectorCodec
+
+# 当前 schema 必须包含的字段
+REQUIRED_FIELDS = {"id", "doc_id", "chunk_hash", "text", "embedding", "metadata"} | set(SCALAR_FIELDS)
+# 写入时的列顺序（id 自动生成）
+INSERT_FIELDS = ("doc_id", "chunk_hash", "text", "embedding", "metadata") + tuple(SCALAR_FIELDS)
+QUERY_BATCH_SIZE = 1000
+DELETE_BATCH_SIZE = 1000
+SEARCH_BATCH_SIZE = 1024  # 单次多向量检索的最大查询数
+MAX_SEARCH_LIMIT = 16384  # Milvus 单次检索的 topk 上限
+CONSISTENCY_LEVELS = ("Strong", "Session", "Bounded", "Eventually")
+
+
+def _quote(value):
+    """把字符串转成 Milvus 表达式中的字符串字面量"""
+    return json.dumps(value, ensure_ascii=False)
+
+
+class MilvusBackend:
+    """把块存储在 Milvus 集合中；过滤条件是 Milvus 布尔表达式"""
+
+    name = "milvus"
+
+    def __init__(
+        self,
+        collection_name="documents",
+        host="localhost",
+        port="19530",
+        max_retries=3,
+        reset_on_schema_mismatch=False,
+        index_profile=DEFAULT_INDEX_PROFILE,
+        vector_type="float32",
+        partition_key=None,
+        partition=None,
+        search_consistency="Strong",
+    ):
+        # 尝试连接 Milvus
+        retry_count = 0
+        while retry_count < max_retries:
+            try:
+                # 连接到 Milvus
+                connections.connect(host=host, port=port)
+                print("Successfully connected to Milvus")
+                break
+            except Exception as e:
+                retry_count += 1
+                if retry_count == max_retries:
+                    raise Exception(f"Failed to connect to Milvus after {max_retries} attempts: {str(e)}")
+                print(f"Failed to connect to Milvus (attempt {retry_count}/{max_retries}). Retrying in 5 seconds...")
+                time.sleep(5)
+
+        # 检索的一致性级别：写入后 generation 立即递增，检索结果缓存在新 generation 下，
+        # 默认的 Bounded 一致性可能读不到刚写入的行，缓存的旧结果会一直用到下次写入或过期
+        if search_consistency not in CONSISTENCY_LEVELS:
+            raise ValueError(f"Unknown consistency level: {search_consistency}, expected one of {CONSISTENCY_LEVELS}")
+        self.search_consistency = search_consistency
+
+        # 向量在 Milvus 中的存储格式
+        self.codec = VectorCodec(vector_type)
+        # 二值向量检索后需要用全精度向量重新打分
+        self.rescore = self.codec.rescore
+
+        # 按配置选择索引；二值向量只能使用二值索引
+        profile = get_index_profile(index_profile)
+        if self.codec.vector_type == "binary" and not is_binary_profile(profile):
+            print(
+                f"Binary vectors need a binary index, "
+                f"using {DEFAULT_BINARY_INDEX_PROFILE} instead of {index_profile}"
+            )
+            index_profile = DEFAULT_BINARY_INDEX_PROFILE
+            profile = get_index_profile(index_profile)
+        elif self.codec.vector_type != "binary" and is_binary_profile(profile):
+            raise ValueError(f"Index profile {index_profile} requires vector_type=binary")
+        self.index_profile_name = index_profile
+        self.index_profile = profile
+        # 二值向量检索后用全精度向量重新打分，对外给出的是余弦相似度
+        self.metric_type = "COSINE" if self.codec.rescore else profile["metric_type"]
+
+        # 分区键字段（只在创建集合时生效）：按该字段过滤的检索只扫描对应的分区
+        if partition_key is not None and partition_key not in SCALAR_FIELDS:
+            raise ValueError(f"Unsupported partition key: {partition_key}, expected one of {sorted(SCALAR_FIELDS)}")
+        self.partition_key = partition_key
+        # 只读写集合中的一个分区（多租户按分区隔离时每个租户一个分区），与分区键互斥
+        if partition is not None and partition_key is not None:
+            raise ValueError("A partition cannot be selected on a collection that uses a partition key")
+        self.partition = partition
+
+        # 打开已有集合；只有在集合不存在时才在 prepare 中创建 schema 和索引
+        self.collection_name = collection_name
+        self.collection = None
+        if utility.has_collection(self.collection_name):
+            collection = Collection(name=self.collection_name)
+            existing_fields = {field.name for field in collection.schema.fields}
+            missing_fields = REQUIRED_FIELDS - existing_fields
+            if missing_fields:
+                if not reset_on_schema_mismatch:
+                    raise Exception(
+                        f"Collection {self.collection_name} has an outdated schema "
+                        f"(missing fields: {sorted(missing_fields)}). Drop it manually "
+                        f"or start with reset_on_schema_mismatch enabled."
+                    )
+                utility.drop_collection(self.collection_name)
+                print(f"Dropped collection with outdated schema: {self.collection_name}")
+            else:
+                self.collection = collection
+
+    def existing_dim(self):
+        """已有集合的向量维度，集合不存在时返回 None"""
+        if self.collection is None:
+            return None
+        return int(self._vector_field(self.collection).params["dim"])
+
+    def prepare(self, dim, progress=None):
+        """创建或校验集合，按配置创建索引并加载集合
+
+        progress(stage, percent) 报告进度：index（建索引）、load（集合加载到查询节点的百分比）。
+        """
+        progress = progress or (lambda stage, percent=None: None)
+        self.codec.check_dim(dim)
+        if self.collection is None:
+            self.collection = self._create_collection(dim)
+        else:
+            self._check_vector_field(self.collection)
+            self._check_partition_key(self.collection)
+            print(f"Opened existing collection: {self.collection_name}")
+
+        # 按配置创建索引；配置变化时重建索引
+        profile = self.index_profile
+        index_params = {
+            "metric_type": profile["metric_type"],
+            "index_type": profile["index_type"],
+            "params": profile["params"]
+        }
+        index = self._field_index("embedding")
+        if index is not None:
+            if not index_matches(index.params, profile):
+                print(f"Index profile changed to {self.index_profile_name}, rebuilding index on {self.collection_name}")
+                progress("index")
+                self.collection.release()
+                self.collection.drop_index(index_name=index.index_name)
+                self.collection.create_index(field_name="embedding", index_params=index_params)
+        else:
+            progress("index")
+            self.collection.create_index(field_name="embedding", index_params=index_params)
+            print(f"Created {self.index_profile_name} index on collection: {self.collection_name}")
+        self._create_scalar_indexes()
+        if self.partition is not None and not self.collection.has_partition(self.partition):
+            self.collection.create_partition(self.partition)
+            print(f"Created partition {self.partition} in collection: {self.collection_name}")
+        self._load(progress)
+
+    def _load(self, progress, poll_interval=0.5):
+        """异步加载集合并轮询加载进度（大集合加载可能需要几十秒）"""
+        progress("load", 0)
+        self.collection.load(_async=True)
+        while True:
+            value = utility.loading_progress(self.collection_name).get("loading_progress", "0%")
+            percent = int(str(value).rstrip("%") or 0)
+            progress("load", percent)
+            if percent >= 100:
+                break
+            time.sleep(poll_interval)
+        print(f"Loaded collection: {self.collection_name}")
+
+    def _field_index(self, field_name):
+        """集合上建在指定字段的索引（集合有多个索引时 Collection.index() 需要给出索引名）"""
+        return next((index for index in self.collection.indexes if index.field_name == field_name), None)
+
+    def _create_scalar_indexes(self):
+        """给标量字段建索引：字符串用 Trie，整数用 STL_SORT"""
+        for name, (kind, _) in SCALAR_FIELDS.items():
+            if self._field_index(name) is not None:
+                continue
+            self.collection.create_index(
+                field_name=name,
+                index_name=f"{name}_idx",
+                index_params={"index_type": "Trie" if kind is str else "STL_SORT"},
+            )
+            print(f"Created scalar index on {self.collection_name}.{name}")
+
+    def _check_partition_key(self, collection):
+        existing = next((field.name for field in collection.schema.fields if field.is_partition_key), None)
+        if existing != self.partition_key:
+            # 分区键只能在创建集合时指定
+            print(
+                f"Collection {self.collection_name} uses partition key {existing}, "
+                f"ignoring configured partition key {self.partition_key}"
+            )
+            self.partition_key = existing
+
+    @staticmethod
+    def _vector_field(collection):
+        return next(field for field in collection.schema.fields if field.name == "embedding")
+
+    def _check_vector_field(self, collection):
+        dtype = self._vector_field(collection).dtype
+        if dtype != self.codec.data_type:
+            raise Exception(
+                f"Collection {self.collection_name} stores {dtype.name} vectors, but "
+                f"vector_type={self.codec.vector_type} was configured"
+            )
+
+    def _create_collection(self, dim):
+        fields = [
+            FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
+            FieldSchema(name="doc_id", dtype=DataType.VARCHAR, max_length=1024),
+            FieldSchema(name="chunk_hash", dtype=DataType.VARCHAR, max_length=64),
+            FieldSchema(name="text", dtype=DataType.VARCHAR, max_length=65535),
+            FieldSchema(name="embedding", dtype=self.codec.data_type, dim=dim),
+            FieldSchema(name="metadata", dtype=DataType.JSON)
+        ]
+        for name, (kind, max_length) in SCALAR_FIELDS.items():
+            if kind is str:
+                field = FieldSchema(
+                    name=name,
+                    dtype=DataType.VARCHAR,
+                    max_length=max_length,
+                    is_partition_key=name == self.partition_key,
+                )
+            else:
+                field = FieldSchema(name=name, dtype=DataType.INT64, is_partition_key=name == self.partition_key)
+            fields.append(field)
+        schema = CollectionSchema(fields=fields, description="document collection")
+        collection = Collection(name=self.collection_name, schema=schema)
+        print(
+            f"Created new collection: {self.collection_name} "
+            f"({self.codec.vector_type}, dim={dim}, {self.codec.bytes_per_vector(dim)} bytes/vector, "
+            f"partition key: {self.partition_key})"
+        )
+        return collection
+
+    def check_search_params(self, search_params):
+        build_search_params(self.index_profile, search_params)
+
+    def insert(self, columns):
+        """按列写入，columns 为 {字段名: 列}，embedding 列是 (n, dim) 的 float32 矩阵；返回主键列表"""
+        entities = [
+            self.codec.encode_batch(columns[name]) if name == "embedding" else columns[name]
+            for name in INSERT_FIELDS
+        ]
+        result = self.collection.insert(entities, partition_name=self.partition)
+        return list(result.primary_keys)
+
+    def delete(self, ids):
+        for start in range(0, len(ids), DELETE_BATCH_SIZE):
+            batch = ids[start:start + DELETE_BATCH_SIZE]
+            self.collection.delete(f"id in [{', '.join(str(i) for i in batch)}]", partition_name=self.partition)
+
+    def query(self, expr, output_fields):
+        """分页读取满足条件的全部行（强一致性，能读到刚写入的数据），每行包含 id"""
+        partition_names = [self.partition] if self.partition is not None else None
+        if hasattr(self.collection, "query_iterator"):
+            iterator = self.collection.query_iterator(
+                batch_size=QUERY_BATCH_SIZE,
+                expr=expr,
+                output_fields=output_fields,
+                partition_names=partition_names,
+                consistency_level="Strong",
+            )
+            try:
+                while True:
+                    page = iterator.next()
+                    if not page:
+                        break
+                    yield from page
+            finally:
+                iterator.close()
+        else:
+            yield from self.collection.query(
+                expr=expr,
+                output_fields=output_fields,
+                partition_names=partition_names,
+                consistency_level="Strong",
+            )
+
+    def search(self, query_embeddings, limit, expr=None, search_params=None):
+        """多向量检索，返回每个查询的 [{"id", "text", "metadata", "score"}]"""
+        query_embeddings = np.asarray(query_embeddings, dtype=np.float32)
+        limit = min(limit, MAX_SEARCH_LIMIT)
+        search_results = []
+        for start in range(0, len(query_embeddings), SEARCH_BATCH_SIZE):
+            results = self.collection.search(
+                data=self.codec.encode(query_embeddings[start:start + SEARCH_BATCH_SIZE]),
+                anns_field="embedding",
+                param=build_search_params(self.index_profile, search_params, limit),
+                limit=limit,
+                expr=expr or None,
+                partition_names=[self.partition] if self.partition is not None else None,
+                output_fields=["text", "metadata"],
+                consistency_level=self.search_consistency,
+            )
+            for hits in results:
+                search_results.append([
+                    {
+                        "id": hit.id,
+                        "text": hit.entity.get('text'),
+                        "metadata": hit.entity.get('metadata'),
+                        "score": hit.distance
+                    }
+                    for hit in hits
+                ])
+        return search_results
+
+    def count(self):
+        if self.partition is not None:
+            return self.collection.partition(self.partition).num_entities
+        return self.collection.num_entities
+
+    def flush(self):
+        self.collection.flush()
+
+    def close(self):
+        pass
@@ -0,0 +1,157 @@
+"""按文件类型注册的解析器
+
+解析库（fitz、pandas、openpyxl、lxml、docx、markdown、PIL、pytesseract）都很重，导入本模块时不加载任何一个：
+解析器以 "模块:函数" 的形式注册，第一次解析该类型的文件时才导入对应模块。
+新的文件类型可以在启动前调用 register_parser 注册。
+"""
+import importlib
+import io
+import threading
+
+# 文件类型 -> 解析函数或 "模块:函数"；解析函数的签名为 parse(content, file_extension) -> 段落 {"text", "metadata"} 的可迭代对象
+_registry = {}
+_loaded = {}
+_load_lock = threading.Lock()
+
+# 支持的文件类型
+SUPPORTED_EXTENSIONS = set()
+
+# 这些类型的解析器本身是流式的（内存占用与文件大小无关），在入库线程中直接逐段读取，
+# 不交给解析子进程（子进程只能整体返回结果）
+STREAMING_EXTENSIONS = set()
+
+
+def register_parser(extensions, parser, streaming: bool = False):
+    """注册（或替换）一组文件类型的解析器，parser 为解析函数或 "模块:函数" 路径"""
+    for extension in extensions:
+        extension = extension.lower()
+        _registry[extension] = parser
+        _loaded.pop(extension, None)
+        SUPPORTED_EXTENSIONS.add(extension)
+        if streaming:
+            STREAMING_EXTENSIONS.add(extension)
+        else:
+            STREAMING_EXTENSIONS.discard(extension)
+
+
+def get_parser(file_extension: str):
+    """文件类型对应的解析函数，第一次使用时导入所在模块"""
+    parser = _loaded.get(file_extension)
+    if parser is not None:
+        return parser
+    spec = _registry.get(file_extension)
+    if spec is None:
+        raise ValueError(f"Unsupported file type: {file_extension}")
+    with _load_lock:
+        if isinstance(spec, str):
+            module_name, function_name = spec.split(":")
+            parser = getattr(importlib.import_module(module_name), function_name)
+        else:
+            parser = spec
+        _loaded[file_extension] = parser
+    return parser
+
+
+def preload_parsers(extensions):
+    """预先导入一组文件类型的解析器（例如在后台线程中），第一次上传时不必再等待导入"""
+    for extension in sorted(extensions):
+        get_parser(extension)
+
+
+def loaded_parsers() -> list:
+    """已经导入的解析器对应的文件类型"""
+    return sorted(_loaded)
+
+
+# 以下解析函数的 content 既可以是文件内容（bytes），也可以是文件路径（上传文件落盘后按路径解析）
+
+def _open_source(content):
+    """bytes 包装成文件对象，路径原样返回（各解析库都可以直接打开路径）"""
+    if isinstance(content, (bytes, bytearray)):
+        return io.BytesIO(content)
+    return content
+
+def process_word(content) -> str:
+    """处理Word文档"""
+    import docx
+
+    doc = docx.Document(_open_source(content))
+    return "\n".join([paragraph.text for paragraph in doc.paragraphs])
+
+def process_markdown(content) -> str:
+    """处理Markdown文件"""
+    import markdown
+
+    if not isinstance(content, (bytes, bytearray)):
+        with open(content, "rb") as f:
+            content = f.read()
+    return markdown.markdown(content.decode('utf-8'))
+
+def process_image(content) -> str:
+    """处理图片文件"""
+    from PIL import Image
+    import pytesseract
+
+    image = Image.open(_open_source(content))
+    return pytesseract.image_to_string(image)
+
+def parse_word(content, file_extension: str):
+    return [{"text": process_word(content), "metadata": {}}]
+
+def parse_markdown(content, file_extension: str):
+    return [{"text": process_markdown(content), "metadata": {}}]
+
+def parse_image(content, file_extension: str):
+    return [{"text": process_image(content), "metadata": {}}]
+
+# 按字号识别章节，无文字层的页面才做 OCR
+register_parser(['pdf'], "pdf_processor:parse_pdf")
+# iterparse 流式解析，保留章节/标签路径
+register_parser(['xml'], "xml_processor:parse_xml", streaming=True)
+# 每行转成 "列名: 值" 记录，保留工作表和行号（xls 由 pandas + xlrd 整表读入，同样在入库线程中逐段生成）
+register_parser(['xlsx', 'xls'], "tabular_processor:parse_excel", streaming=True)
+register_parser(['csv'], "tabular_processor:parse_csv", streaming=True)
+register_parser(['docx', 'doc'], parse_word)
+register_parser(['md'], parse_markdown)
+register_parser(['jpg', 'jpeg', 'png', 'bmp'], parse_image)
+
+def parse_pdf_pages(content, start: int = 0, end: int = None):
+    """解析PDF的 [start, end) 页，返回 (带章节和页码的段落, 最后一个标题)
+
+    第一个标题之前的段落 path 为 None，用前一个页段的最后一个标题补上（见 carry_pdf_sections）。
+    """
+    from pdf_processor import parse_pdf_range
+
+    return parse_pdf_range(content, start, end)
+
+def carry_pdf_sections(page_ranges):
+    """按顺序拼接各页段的解析结果，把上一页段的章节带到下一页段开头的段落上"""
+    title = "Untitled"
+    for sections, last_title in page_ranges:
+        for section in sections:
+            if section["metadata"]["path"] is None:
+                section["metadata"]["path"] = title
+            yield section
+        if last_title is not None:
+            title = last_title
+
+def parse_sections(file_extension: str, content):
+    """把整个文件解析为段落 {"text", "metadata"}（不含文件级元数据），PDF 按页流式生成"""
+    return get_parser(file_extension)(content, file_extension)
+
+def parse_sections_list(file_extension: str, content) -> list:
+    """解析子进程的任务：生成器不能序列化，整体返回段落列表"""
+    return list(parse_sections(file_extension, content))
+
+def with_file_metadata(file_name: str, file_extension: str, sections):
+    """过滤空段落，并给每个段落加上文件级元数据"""
+    for section in sections:
+        if not section["text"].strip():
+            continue
+        metadata = {"source": file_name, "file_type": file_extension}
+        metadata.update(section["metadata"])
+        yield {"text": section["text"], "metadata": metadata}
+
+def extract_sections(file_name: str, file_extension: str, content):
+    """在当前进程内把文件解析为带元数据的段落流"""
+    return with_file_metadata(file_name, file_extension, parse_sections(file_extension, content))
@@ -0,0 +1,215 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from itertools import chain, count
+from queue import Empty
+from concurrent.futures import CancelledError, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from parsers import (
+    STREAMING_EXTENSIONS,
+    carry_pdf_sections,
+    extract_sections,
+    parse_pdf_pages,
+    parse_sections_list,
+    with_file_metadata,
+)
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，不限制内存
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+
+class ParsingError(Exception):
+    """解析子进程超时、超出内存限制或崩溃"""
+
+
+_started = None
+
+
+def _init_worker(max_bytes, started):
+    """子进程初始化：限制地址空间大小，异常文档只会让子进程失败；保存上报任务开始时间的队列"""
+    global _started
+    _started = started
+    if max_bytes and resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (max_bytes, max_bytes))
+
+
+def _run_task(task_id, fn, *args):
+    """子进程开始执行任务时上报 (任务号, pid, 开始时间)，超时从这里算起，不含在队列中等待的时间"""
+    _started.put((task_id, os.getpid(), time.monotonic()))
+    return fn(*args)
+
+
+class ParsingExecutor:
+    """基于进程池的文档解析：按文件分发，PDF 再按页段拆分
+
+    task_timeout 从子进程开始执行任务时计时，超时只终止执行该任务的进程。
+    """
+
+    def __init__(
+        self,
+        max_workers: int = None,
+        task_timeout: float = 300.0,
+        memory_limit_mb: int = 2048,
+        pages_per_task: int = 16,
+    ):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.task_timeout = task_timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.pages_per_task = pages_per_task
+        self._lock = threading.Lock()
+        self._task_ids = count()
+        self._started = {}  # 未完成的任务号 -> (pid, 开始时间)，子进程上报前为 None
+        self._pool, self._started_queue = self._create_pool()
+
+    def extract_sections(self, file_name: str, file_extension: str, content):
+        """与 parsers.extract_sections 接口相同，按文档顺序生成段落
+
+        content 为文件路径时子进程直接打开文件，避免把文件内容序列化后传给子进程。
+        """
+        if file_extension in STREAMING_EXTENSIONS:
+            # 子进程只能一次性返回全部段落，流式解析器直接在调用线程中逐段读取
+            return extract_sections(file_name, file_extension, content)
+        if file_extension == 'pdf':
+            import fitz  # PyMuPDF，只在第一次解析 PDF 时导入
+
+            if isinstance(content, (bytes, bytearray)):
+                doc = fitz.open(stream=content, filetype="pdf")
+            else:
+                doc = fitz.open(content)
+            with doc:
+                page_count = doc.page_count
+            tasks = (
+                (parse_pdf_pages, content, start, min(start + self.pages_per_task, page_count))
+                for start in range(0, page_count, self.pages_per_task)
+            )
+            # 各页段并行解析，按顺序取回时把章节从上一页段带过来
+            sections = carry_pdf_sections(self._run_ordered(file_name, tasks))
+        else:
+            tasks = iter([(parse_sections_list, file_extension, content)])
+            sections = chain.from_iterable(self._run_ordered(file_name, tasks))
+        return with_file_metadata(file_name, file_extension, sections)
+
+    def shutdown(self):
+        with self._lock:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _create_pool(self):
+        # spawn：不继承父进程中的线程和锁状态
+        context = multiprocessing.get_context("spawn")
+        # 每个进程池一个队列：崩溃的子进程可能留下被占用的队列锁，不能沿用到新进程池
+        started = context.Queue()
+        pool = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(self.memory_limit_mb * 1024 * 1024 if self.memory_limit_mb else None, started),
+        )
+        return pool, started
+
+    def _run_ordered(self, file_name, tasks):
+        """同一文件最多同时提交 max_workers 个任务，按提交顺序逐个生成任务结果"""
+        window = deque()
+        for task in tasks:
+            window.append(self._submit(*task))
+            if len(window) >= self.max_workers:
+                yield self._result(file_name, window.popleft())
+        while window:
+            yield self._result(file_name, window.popleft())
+
+    def _submit(self, fn, *args):
+        task_id = next(self._task_ids)
+        with self._lock:
+            pool = self._pool
+            self._started[task_id] = None
+        try:
+            future = pool.submit(_run_task, task_id, fn, *args)
+        except BrokenProcessPool:
+            self._restart_pool(pool)
+            with self._lock:
+                pool = self._pool
+            future = pool.submit(_run_task, task_id, fn, *args)
+        return pool, future, task_id, (fn,) + args
+
+    def _result(self, file_name, submitted, retries=2):
+        pool, future, task_id, task = submitted
+        try:
+            return self._wait(pool, future, task_id)
+        except FutureTimeoutError:
+            self._restart_pool(pool)
+            raise ParsingError(f"Parsing {file_name} timed out after {self.task_timeout}s")
+        except MemoryError:
+            raise ParsingError(
+                f"Parsing {file_name} exceeded the memory limit of {self.memory_limit_mb} MB"
+            )
+        except (BrokenProcessPool, CancelledError):
+            self._restart_pool(pool)
+            # 池中任一进程退出（超时被终止或崩溃）都会让池中其他任务一起失败，这些任务重新提交；
+            # 导致崩溃的任务重试时会再次失败
+            if retries:
+                logger.warning("Resubmitting a parsing task of %s after the process pool broke", file_name)
+                return self._result(file_name, self._submit(*task), retries - 1)
+            raise ParsingError(f"Parser process crashed while parsing {file_name}")
+        finally:
+            self._pop_started(task_id)
+
+    def _wait(self, pool, future, task_id):
+        """等待任务结果；任务开始执行超过 task_timeout 时终止执行它的子进程并抛出 FutureTimeoutError"""
+        poll = min(1.0, self.task_timeout)
+        while True:
+            if future.done():
+                return future.result()
+            started = self._get_started(task_id)
+            if started is None:
+                # 还在排队：其他文件的任务占满了子进程，不计入超时
+                timeout = poll
+            else:
+                pid, start = started
+                timeout = start + self.task_timeout - time.monotonic()
+                if timeout <= 0:
+                    self._terminate(pool, pid)
+                    raise FutureTimeoutError()
+                timeout = min(timeout, poll)
+            try:
+                return future.result(timeout=timeout)
+            except FutureTimeoutError:
+                continue
+
+    def _get_started(self, task_id):
+        with self._lock:
+            while True:
+                try:
+                    started_id, pid, start = self._started_queue.get_nowait()
+                except Empty:
+                    break
+                # 已经取回结果的任务不再记录
+                if started_id in self._started:
+                    self._started[started_id] = (pid, start)
+            return self._started.get(task_id)
+
+    def _pop_started(self, task_id):
+        with self._lock:
+            return self._started.pop(task_id, None)
+
+    def _terminate(self, pool, pid):
+        logger.warning("Terminating parser process %s after %ss", pid, self.task_timeout)
+        # ProcessPoolExecutor 没有公开的强制终止接口；按 pid 只终止超时的进程
+        process = (pool._processes or {}).get(pid)
+        if process is not None:
+            process.terminate()
+
+    def _restart_pool(self, broken_pool):
+        """重建进程池；旧进程池中正在执行的任务由进程池自身终止"""
+        with self._lock:
+            if self._pool is not broken_pool:
+                return
+            logger.warning("Restarting parsing process pool")
+            broken_pool.shutdown(wait=False, cancel_futures=True)
+            self._pool, self._started_queue = self._create_pool()
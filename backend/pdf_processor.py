@@ -2,52 +2,153 @@ import fitz  # PyMuPDF
 from lxml import etree
 import io
 
+def _open_pdf(pdf):
+    """打开PDF：既可以是文件路径，也可以是文件内容"""
+    if isinstance(pdf, (bytes, bytearray)):
+        return fitz.open(stream=pdf, filetype="pdf")
+    return fitz.open(pdf)
+
 class PDFProcessor:
-    def __init__(self):
+    def __init__(self, ocr_dpi=300, ocr_lang=None):
         self.title_threshold = 20  # 字体大小阈值，用于判断标题
+        self.ocr_dpi = ocr_dpi  # 无文字层页面渲染成图片做 OCR 时的分辨率
+        self.ocr_lang = ocr_lang  # Tesseract 语言，例如 "chi_sim+eng"
+
+    def iter_pages(self, pdf, page_range=None):
+        """逐页生成 (page_no, blocks)，任意时刻只持有一页的内容
+
+        blocks 为 [{"type": "heading" | "text", "text", "size"}]，
+        没有文字层的页面（扫描件）渲染后做 OCR。
+        """
+        doc = _open_pdf(pdf)
+        try:
+            start, end = page_range or (0, None)
+            end = doc.page_count if end is None else min(end, doc.page_count)
+            for page_number in range(start, end):
+                page = doc.load_page(page_number)
+                blocks = self._text_blocks(page)
+                if not blocks and page.get_images():
+                    blocks = self._ocr_blocks(page)
+                yield page_number + 1, blocks
+        finally:
+            doc.close()
+
+    def iter_sections(self, pdf, page_range=None):
+        """按页流式生成段落 {"text", "metadata": {"path", "level", "page"}}"""
+        return self._iter_sections(pdf, page_range, {"title": "Untitled"})
+
+    def sections_in_range(self, pdf, start, end):
+        """解析 [start, end) 页，返回 (段落列表, 最后一个标题)，供解析子进程按页段并行解析
+
+        这些页中第一个标题之前的段落 path 为 None：它们属于前面页段的最后一个章节，由调用方补上；
+        没有标题时最后一个标题也为 None。
+        """
+        state = {"title": None}
+        sections = list(self._iter_sections(pdf, (start, end), state))
+        return sections, state["title"]
+
+    def _iter_sections(self, pdf, page_range, state):
+        # state["title"] 为当前章节，遍历结束后是最后一个标题
+        for page_no, blocks in self.iter_pages(pdf, page_range):
+            texts = []
+            for block in blocks:
+                if block["type"] == "heading":
+                    if texts:
+                        yield self._section(texts, state["title"], page_no)
+                        texts = []
+                    state["title"] = block["text"]
+                else:
+                    texts.append(block["text"])
+            if texts:
+                yield self._section(texts, state["title"], page_no)
 
-    def process_pdf(self, pdf_path):
-        """处理PDF文件，提取文本和结构"""
-        doc = fitz.open(pdf_path)
+    def process_pdf(self, pdf_path, page_range=None):
+        """处理PDF文件，提取文本和结构（pdf_path 也可以是PDF文件内容，page_range 为 (start, end) 页）"""
         root = etree.Element("document")
         current_section = root
 
-        for page in doc:
-            blocks = page.get_text("dict")["blocks"]
+        for page_no, blocks in self.iter_pages(pdf_path, page_range):
             for block in blocks:
-                if "lines" in block:
-                    for line in block["lines"]:
-                        for span in line["spans"]:
-                            text = span["text"].strip()
-                            if not text:
-                                continue
-
-                            # 根据字体大小判断是否为标题
-                            if span["size"] > self.title_threshold:
-                                current_section = etree.SubElement(
-                                    root, 
-                                    "section",
-                                    title=text,
-                                    level="1"
-                                )
-                            else:
-                                if current_section is root:
-                                    # 如果没有标题，创建默认section
-                                    current_section = etree.SubElement(
-                                        root,
-                                        "section",
-                                        title="Untitled",
-                                        level="0"
-                                    )
-                                etree.SubElement(current_section, "content").text = text
+                if block["type"] == "heading":
+                    current_section = etree.SubElement(
+                        root, 
+                        "section",
+                        title=block["text"],
+                        level="1"
+                    )
+                else:
+                    if current_section is root:
+                        # 如果没有标题，创建默认section
+                        current_section = etree.SubElement(
+                            root,
+                            "section",
+                            title="Untitled",
+                            level="0"
+                        )
+                    etree.SubElement(
+                        current_section,
+                        "content",
+                        page=str(page_no)
+                    ).text = block["text"]
 
         return etree.tostring(root, pretty_print=True, encoding="unicode")
 
+    def _text_blocks(self, page):
+        """从文字层提取行；根据字体大小判断是否为标题"""
+        blocks = []
+        for block in page.get_text("dict")["blocks"]:
+            for line in block.get("lines", []):
+                spans = [span for span in line["spans"] if span["text"].strip()]
+                if not spans:
+                    continue
+                text = "".join(span["text"] for span in spans).strip()
+                size = max(span["size"] for span in spans)
+                blocks.append({
+                    "type": "heading" if size > self.title_threshold else "text",
+                    "text": text,
+                    "size": size,
+                })
+        return blocks
+
+    def _ocr_blocks(self, page):
+        """把页面渲染成图片做 OCR，OCR 结果都视为正文"""
+        # OCR 依赖（pytesseract 会连带导入 pandas）只在遇到扫描页时才导入
+        from PIL import Image
+        import pytesseract
+
+        pixmap = page.get_pixmap(dpi=self.ocr_dpi)
+        image = Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+        if self.ocr_lang:
+            text = pytesseract.image_to_string(image, lang=self.ocr_lang)
+        else:
+            text = pytesseract.image_to_string(image)
+        return [
+            {"type": "text", "text": line.strip(), "size": 0}
+            for line in text.splitlines() if line.strip()
+        ]
+
+    @staticmethod
+    def _section(texts, title, page_no):
+        return {
+            "text": "\n".join(texts),
+            "metadata": {"path": title, "level": 1, "page": page_no},
+        }
+
     def save_xml(self, xml_content, output_path):
         """保存XML内容到文件"""
         with open(output_path, "w", encoding="utf-8") as f:
             f.write(xml_content)
 
+_default_processor = PDFProcessor()
+
+def parse_pdf(content, file_extension: str = "pdf", page_range=None):
+    """parsers 注册的解析函数：按页流式生成段落"""
+    return _default_processor.iter_sections(content, page_range=page_range)
+
+def parse_pdf_range(content, start: int, end: int):
+    """解析子进程的任务：[start, end) 页的段落和最后一个标题"""
+    return _default_processor.sections_in_range(content, start, end)
+
 def process_pdf(content: bytes) -> str:
     """处理PDF文件并提取文本"""
     try:
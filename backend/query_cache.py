@@ -0,0 +1,133 @@
+import threading
+import time
+
+import numpy as np
+
+from embedding_cache import normalize_text
+from lru_cache import LRUCache
+
+
+class QueryCache:
+    """检索结果缓存：精确匹配 + 语义近似匹配两级
+
+    每条结果记录写入时向量库的 generation，向量库有写入或删除后 generation 变化，旧结果视为未命中。
+    语义层保存查询向量（归一化后）的矩阵，新查询与检索参数相同、余弦相似度不低于阈值的旧查询时复用结果。
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        ttl: float = 300.0,
+        similarity_threshold: float = 0.97,
+        max_semantic_entries: int = 2000,
+    ):
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.max_semantic_entries = max_semantic_entries
+        self.exact = LRUCache(max_entries=max_entries, ttl=ttl)
+        self._lock = threading.Lock()
+        self._vectors = None  # (max_semantic_entries, dim)，按需分配
+        self._slots = [None] * max_semantic_entries  # (params_key, generation, results, expires_at, seconds)
+        self._last_used = np.zeros(max_semantic_entries, dtype=np.float64)
+        self.lookups = 0
+        self.hits = 0
+        self.semantic_hits = 0
+        self.semantic_misses = 0
+        self.stale = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def _key(query, params_key):
+        return normalize_text(query).lower(), params_key
+
+    def get(self, query: str, params_key: str, generation: int):
+        """精确匹配：归一化后的查询文本 + 检索参数"""
+        key = self._key(query, params_key)
+        item = self.exact.get(key)
+        with self._lock:
+            self.lookups += 1
+            if item is None:
+                return None
+            item_generation, results, seconds = item
+            if item_generation != generation:
+                self.exact.pop(key)
+                self.stale += 1
+                return None
+            self.hits += 1
+            self.saved_seconds += seconds
+            return results
+
+    def get_similar(self, embedding, params_key: str, generation: int):
+        """语义匹配：检索参数相同且查询向量足够接近的缓存结果"""
+        if not self.similarity_threshold:
+            return None
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        now = time.monotonic()
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != len(query):
+                self.semantic_misses += 1
+                return None
+            similarities = self._vectors @ query
+            for slot in np.argsort(-similarities):
+                if similarities[slot] < self.similarity_threshold:
+                    break
+                entry = self._slots[slot]
+                if entry is None or entry[0] != params_key:
+                    continue
+                _, entry_generation, results, expires_at, seconds = entry
+                if entry_generation != generation or (expires_at is not None and expires_at < now):
+                    self._slots[slot] = None
+                    self._vectors[slot] = 0
+                    self.stale += 1
+                    continue
+                self._last_used[slot] = now
+                self.hits += 1
+                self.semantic_hits += 1
+                self.saved_seconds += seconds
+                return results
+            self.semantic_misses += 1
+            return None
+
+    def put(self, query: str, params_key: str, generation: int, results, embedding=None, seconds: float = 0.0):
+        """写入结果；seconds 为实际检索耗时，用于统计命中节省的时间"""
+        self.exact.put(self._key(query, params_key), (generation, results, seconds))
+        if embedding is None or not self.similarity_threshold:
+            return
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector = vector / max(float(np.linalg.norm(vector)), 1e-12)
+        now = time.monotonic()
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != len(vector):
+                self._vectors = np.zeros((self.max_semantic_entries, len(vector)), dtype=np.float32)
+                self._slots = [None] * self.max_semantic_entries
+            # 优先用空位，否则淘汰最久未使用的
+            free = next((i for i, entry in enumerate(self._slots) if entry is None), None)
+            slot = free if free is not None else int(np.argmin(self._last_used))
+            self._vectors[slot] = vector
+            self._slots[slot] = (params_key, generation, results, now + self.ttl if self.ttl else None, seconds)
+            self._last_used[slot] = now
+
+    def clear(self):
+        self.exact.clear()
+        with self._lock:
+            self._slots = [None] * self.max_semantic_entries
+            if self._vectors is not None:
+                self._vectors[:] = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_ratio": self.hits / self.lookups if self.lookups else 0.0,
+                "saved_seconds": round(self.saved_seconds, 3),
+                "stale": self.stale,
+                "exact": self.exact.stats(),
+                "semantic": {
+                    "entries": sum(entry is not None for entry in self._slots),
+                    "hits": self.semantic_hits,
+                    "misses": self.semantic_misses,
+                    "threshold": self.similarity_threshold,
+                },
+            }
@@ -0,0 +1,137 @@
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from embedding_cache import cache_key
+from lru_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+class CrossEncoderReranker:
+    """交叉编码器重排：对召回的候选逐对打分 (query, chunk)，在延迟预算内尽量多打分
+
+    候选按召回顺序分批交给线程池，预算用完时不再等待：已经开始的批次在后台算完后仍写入缓存，
+    还没开始的批次直接取消。未打分（超出预算或打分出错）的候选排在已打分的候选之后，保持召回顺序。
+    """
+
+    def __init__(
+        self,
+        model_name: str = "BAAI/bge-reranker-base",
+        batch_size: int = 16,
+        max_workers: int = 2,
+        budget_ms: float = 300.0,
+        max_candidates: int = 50,
+        cache_size: int = 100000,
+        device: str = "cpu",
+    ):
+        self.model_name = model_name
+        self.batch_size = max(1, batch_size)
+        self.budget_ms = budget_ms
+        self.max_candidates = max_candidates
+        self.device = device
+        self.cache = LRUCache(max_entries=cache_size)
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="rerank")
+        self.scored = 0
+        self.over_budget = 0
+        self.errors = 0
+
+    def load(self):
+        self._get_model()
+
+    def _get_model(self):
+        # 模型较大，第一次重排时才加载
+        with self._model_lock:
+            if self._model is None:
+                from sentence_transformers import CrossEncoder
+
+                logger.info(f"Loading cross-encoder {self.model_name} on {self.device}")
+                self._model = CrossEncoder(self.model_name, device=self.device)
+            return self._model
+
+    def rerank(self, query: str, hits, k: int = None, budget_ms: float = None):
+        """对检索结果重排，返回前 k 条；score 为交叉编码器分数，原分数保留在 retrieval_score"""
+        limit = max(self.max_candidates, k or 0)
+        candidates = [dict(hit, retrieval_score=hit.get("score")) for hit in hits[:limit]]
+        k = k or len(candidates)
+        if not candidates:
+            return candidates
+        budget = (self.budget_ms if budget_ms is None else budget_ms) / 1000
+
+        keys = [cache_key(self.model_name, query + "\0" + hit["text"]) for hit in candidates]
+        scores = {}
+        pending = []
+        for i, key in enumerate(keys):
+            score = self.cache.get(key)
+            if score is None:
+                pending.append(i)
+            else:
+                scores[i] = score
+
+        futures = {}
+        model = None
+        if pending:
+            try:
+                model = self._get_model()
+            except Exception as e:
+                # 模型不可用时直接按召回顺序返回，不让检索请求失败
+                self._failed(e)
+                pending = []
+        # 模型加载时间不计入预算（启动时已通过 load() 预加载）
+        deadline = time.monotonic() + budget
+        if pending:
+            for start in range(0, len(pending), self.batch_size):
+                batch = pending[start:start + self.batch_size]
+                pairs = [(query, candidates[i]["text"]) for i in batch]
+                futures[self._executor.submit(self._score, model, pairs, [keys[i] for i in batch])] = batch
+        not_done = set(futures)
+        while not_done:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, not_done = wait(not_done, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    scores.update(zip(futures[future], future.result()))
+                except Exception as e:
+                    self._failed(e)
+        if not_done:
+            self.over_budget += 1
+            for future in not_done:
+                future.cancel()
+
+        for i, hit in enumerate(candidates):
+            hit["score"] = scores.get(i)
+        # 已打分的按分数降序，未打分的按召回顺序排在后面
+        order = sorted(
+            range(len(candidates)),
+            key=lambda i: (scores.get(i) is None, -(scores.get(i) or 0.0), i),
+        )
+        return [candidates[i] for i in order[:k]]
+
+    def _failed(self, error):
+        self.errors += 1
+        logger.warning(f"Rerank failed, keeping retrieval order for the affected candidates: {error}")
+
+    def _score(self, model, pairs, keys):
+        scores = [float(score) for score in model.predict(pairs, batch_size=len(pairs))]
+        for key, score in zip(keys, scores):
+            self.cache.put(key, score)
+        self.scored += len(scores)
+        return scores
+
+    def stats(self) -> dict:
+        return {
+            "model": self.model_name,
+            "loaded": self._model is not None,
+            "scored_pairs": self.scored,
+            "over_budget": self.over_budget,
+            "errors": self.errors,
+            "cache": self.cache.stats(),
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,59 @@
+"""二值向量检索后重新打分用的全精度向量：写入时按主键保存在 SQLite 中，与嵌入服务和嵌入缓存无关"""
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+# SQLite 单条语句的参数个数有上限，批量读写时分段
+_SQLITE_BATCH = 500
+
+
+class RescoreVectors:
+    """主键 -> float32 原始向量
+
+    Milvus 中只保存二值化后的向量，检索的候选需要用原始向量重新计算余弦相似度；
+    多个 worker 进程可以同时打开同一个文件（WAL 模式）。
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS vectors (id INTEGER PRIMARY KEY, vector BLOB NOT NULL)")
+        self._db.commit()
+
+    def put(self, ids, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        rows = [(int(pk), vector.tobytes()) for pk, vector in zip(ids, vectors)]
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO vectors (id, vector) VALUES (?, ?)", rows)
+            self._db.commit()
+
+    def get(self, ids) -> dict:
+        """{主键: 向量}，没有保存的主键（例如在启用之前写入的块）不在结果中"""
+        ids = [int(pk) for pk in ids]
+        found = {}
+        with self._lock:
+            for start in range(0, len(ids), _SQLITE_BATCH):
+                batch = ids[start:start + _SQLITE_BATCH]
+                rows = self._db.execute(
+                    f"SELECT id, vector FROM vectors WHERE id IN ({','.join('?' * len(batch))})", batch
+                )
+                for pk, blob in rows:
+                    found[pk] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def delete(self, ids):
+        ids = [int(pk) for pk in ids]
+        with self._lock:
+            for start in range(0, len(ids), _SQLITE_BATCH):
+                batch = ids[start:start + _SQLITE_BATCH]
+                self._db.execute(f"DELETE FROM vectors WHERE id IN ({','.join('?' * len(batch))})", batch)
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,104 @@
+"""多个服务进程（uvicorn workers）之间共享的状态，都放在同一台机器的状态目录中
+
+- file_lock：跨进程互斥，例如同一时刻只有一个进程创建集合、建索引；
+- SharedCounter：写入代数计数，任一进程写入或删除后递增，其他进程据此判断缓存是否过期；
+- JobStore：入库任务状态，任务在哪个进程中执行都可以从任意进程查询。
+"""
+import json
+import logging
+import os
+import sqlite3
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows：只支持单进程部署，锁退化为空操作
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_COUNTER = struct.Struct("<q")
+
+
+@contextmanager
+def file_lock(path: str):
+    """基于 flock 的跨进程互斥锁（进程退出时自动释放）"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "a+") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class SharedCounter:
+    """保存在文件中的 64 位计数器：读取不加锁（8 字节对齐写入是原子的），递增时持有文件锁"""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._lock = threading.Lock()
+
+    def value(self) -> int:
+        data = os.pread(self._fd, _COUNTER.size, 0)
+        return _COUNTER.unpack(data)[0] if len(data) == _COUNTER.size else 0
+
+    def increment(self) -> int:
+        with self._lock:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                value = self.value() + 1
+                os.pwrite(self._fd, _COUNTER.pack(value), 0)
+                return value
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def close(self):
+        os.close(self._fd)
+
+
+class JobStore:
+    """入库任务状态快照（IngestJob.to_dict()）的 SQLite 存储，多个进程共用一个文件"""
+
+    def __init__(self, path: str, max_age: float = 7 * 24 * 3600):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        # WAL 模式允许多个进程同时读写
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, tenant TEXT NOT NULL, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def save_many(self, snapshots):
+        """写入一组任务快照 [dict]，同时清理过期的任务"""
+        now = time.time()
+        rows = [(s["job_id"], s.get("tenant", ""), json.dumps(s, ensure_ascii=False), now) for s in snapshots]
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO jobs (id, tenant, data, updated_at) VALUES (?, ?, ?, ?)", rows
+            )
+            self._db.execute("DELETE FROM jobs WHERE updated_at < ?", (now - self.max_age,))
+            self._db.commit()
+
+    def get(self, job_id: str):
+        with self._lock:
+            row = self._db.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def close(self):
+        with self._lock:
+            self._db.close()
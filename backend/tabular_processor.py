@@ -0,0 +1,147 @@
+"""表格文件（CSV / Excel）流式解析：逐块读取，每行转成 "列名: 值" 记录，若干行合并为一个段落"""
+import io
+from itertools import chain
+from typing import Dict, Iterable, Iterator
+
+from openpyxl import load_workbook
+
+
+def _is_path(source) -> bool:
+    return not isinstance(source, (bytes, bytearray))
+
+
+def _detect_encoding(source, sample_size: int = 64 * 1024) -> str:
+    """根据文件开头判断编码：UTF-8（含 BOM）解码失败时按 GB18030 处理（常见的中文 Excel 导出）"""
+    if _is_path(source):
+        with open(source, "rb") as f:
+            sample = f.read(sample_size)
+    else:
+        sample = bytes(source[:sample_size])
+    # 截掉最后一行，避免把被截断的多字节字符误判为编码错误
+    if len(sample) == sample_size and b"\n" in sample:
+        sample = sample[:sample.rindex(b"\n")]
+    try:
+        sample.decode("utf-8")
+        return "utf-8-sig"
+    except UnicodeDecodeError:
+        return "gb18030"
+
+
+def _format_value(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+class TabularProcessor:
+    def __init__(self, rows_per_section: int = 20, csv_chunk_rows: int = 10000):
+        self.rows_per_section = rows_per_section  # 每个段落包含的行数，段落内再由分块器按行装箱
+        self.csv_chunk_rows = csv_chunk_rows  # pandas 每次读入的行数
+
+    def iter_csv_sections(self, source) -> Iterator[Dict]:
+        """流式读取 CSV，内存占用与文件大小无关"""
+        # pandas 导入较慢，只在解析 CSV 和 xls 时才导入
+        import pandas as pd
+
+        reader = pd.read_csv(
+            source if _is_path(source) else io.BytesIO(source),
+            chunksize=self.csv_chunk_rows,
+            dtype=str,
+            keep_default_na=False,
+            encoding=_detect_encoding(source),
+        )
+
+        with reader:
+            frames = iter(reader)
+            first = next(frames, None)
+            if first is None:
+                return
+            rows = (
+                values
+                for frame in chain([first], frames)
+                for values in frame.itertuples(index=False, name=None)
+            )
+            # 表头是第 1 行，数据从第 2 行开始
+            yield from self._sections(list(first.columns), rows, first_row=2, sheet=None)
+
+    def iter_excel_sections(self, source, file_extension: str = "xlsx") -> Iterator[Dict]:
+        """逐个工作表流式读取；xlsx 用 openpyxl 只读模式，旧的 xls 格式只能整表读入"""
+        if file_extension == "xls":
+            import pandas as pd
+
+            sheets = pd.read_excel(
+                source if _is_path(source) else io.BytesIO(source), sheet_name=None, header=None, dtype=str
+            )
+            for sheet, frame in sheets.items():
+                yield from self._sheet_sections(
+                    sheet, frame.where(frame.notna(), None).itertuples(index=False, name=None)
+                )
+            return
+
+        workbook = load_workbook(
+            source if _is_path(source) else io.BytesIO(source), read_only=True, data_only=True
+        )
+        try:
+            for worksheet in workbook.worksheets:
+                yield from self._sheet_sections(worksheet.title, worksheet.iter_rows(values_only=True))
+        finally:
+            workbook.close()
+
+    def _sheet_sections(self, sheet, rows: Iterable) -> Iterator[Dict]:
+        # 第一个非空行作为表头
+        row_number = 0
+        header = None
+        rows = iter(rows)
+        for values in rows:
+            row_number += 1
+            if any(_format_value(v) for v in values):
+                header = values
+                break
+        if header is None:
+            return
+        yield from self._sections(header, rows, first_row=row_number + 1, sheet=sheet)
+
+    def _sections(self, header, rows: Iterable, first_row: int, sheet) -> Iterator[Dict]:
+        names = [
+            _format_value(name) or f"column_{i + 1}" for i, name in enumerate(header)
+        ]
+        records = []
+        start = first_row
+        row_number = first_row - 1
+        for values in rows:
+            row_number += 1
+            record = "; ".join(
+                f"{name}: {value}"
+                for name, value in zip(names, map(_format_value, values))
+                if value
+            )
+            if record:
+                records.append(record)
+            if len(records) >= self.rows_per_section:
+                yield self._section(records, sheet, start, row_number)
+                records = []
+                start = row_number + 1
+        if records:
+            yield self._section(records, sheet, start, row_number)
+
+    @staticmethod
+    def _section(records, sheet, row_start, row_end) -> Dict:
+        metadata = {"row_start": row_start, "row_end": row_end}
+        if sheet is not None:
+            metadata["sheet"] = sheet
+        return {"text": "\n".join(records), "metadata": metadata}
+
+
+_default_processor = TabularProcessor()
+
+
+def parse_csv(source, file_extension: str = "csv") -> Iterator[Dict]:
+    """parsers 注册的解析函数"""
+    return _default_processor.iter_csv_sections(source)
+
+
+def parse_excel(source, file_extension: str = "xlsx") -> Iterator[Dict]:
+    """parsers 注册的解析函数"""
+    return _default_processor.iter_excel_sections(source, file_extension)
@@ -0,0 +1,207 @@
+"""多租户：每个租户一个 VectorStore（独立的集合、分区或本地目录），进程内共用嵌入客户端和嵌入缓存"""
+import logging
+import os
+import threading
+import time
+
+from concurrency import ConcurrencyLimiter
+from config import TENANT_NAME_RE
+from embedding_cache import EmbeddingCache
+from embedding_client import AsyncEmbeddingClient, EmbeddingClient
+from shared_state import file_lock
+from vector_store import VectorStore
+
+logger = logging.getLogger(__name__)
+
+# Milvus 集合默认分区的名称：默认租户的数据就放在这里
+DEFAULT_PARTITION = "_default"
+
+
+class UnknownTenantError(ValueError):
+    """请求头中的租户不合法或不在允许列表中"""
+
+
+class TooManyTenantsError(Exception):
+    """本进程打开的租户数已达上限"""
+
+
+class TenantRegistry:
+    """按需创建并缓存各租户的 VectorStore 和检索并发限制
+
+    - none：忽略租户请求头，所有请求使用默认租户；
+    - collection：每个租户一个 Milvus 集合（本地后端为一个存储目录），默认租户使用 RAG_COLLECTION 本身；
+    - partition：所有租户共用一个集合，每个租户一个分区，默认租户使用集合的默认分区。
+
+    多个 worker 进程同时初始化同一个租户时，用状态目录中的文件锁串行化建集合、建索引。
+    stores 可以传入已经创建好的 {租户: VectorStore}（例如基准测试中替换成本地存储）。
+    """
+
+    def __init__(self, settings, stores=None):
+        self.settings = settings
+        self._stores = dict(stores or {})
+        self._limiters = {}
+        self._lock = threading.Lock()
+        self._init_locks = {}
+        self._errors = {}
+        self._progress = {}  # 租户 -> 正在进行的初始化阶段
+        # 进程内所有租户共用的嵌入客户端（连接池）和嵌入缓存；第一次创建 VectorStore 时创建
+        self.embedder = None
+        self.async_embedder = None
+        self.embedding_cache = None
+
+    @property
+    def isolated(self) -> bool:
+        return self.settings.tenant_isolation != "none"
+
+    def resolve(self, header: str = None) -> str:
+        """请求头中的租户名；未给出时为默认租户"""
+        if not self.isolated or not header:
+            return self.settings.default_tenant
+        if not TENANT_NAME_RE.match(header):
+            raise UnknownTenantError(f"Invalid tenant: {header!r}")
+        if self.settings.tenants and header not in self.settings.tenants and header != self.settings.default_tenant:
+            raise UnknownTenantError(f"Unknown tenant: {header}")
+        return header
+
+    def peek(self, tenant: str):
+        """已经初始化好的 VectorStore，尚未初始化时返回 None（不触发初始化）"""
+        return self._stores.get(tenant)
+
+    def stores(self) -> dict:
+        return dict(self._stores)
+
+    def errors(self) -> dict:
+        """最近一次初始化失败的租户及原因"""
+        return dict(self._errors)
+
+    def progress(self) -> dict:
+        """正在初始化的租户：当前阶段、阶段进度（百分比，可能为 None）和已用时间"""
+        now = time.monotonic()
+        return {
+            tenant: {"stage": state["stage"], "percent": state["percent"], "seconds": round(now - state["started_at"], 1)}
+            for tenant, state in list(self._progress.items())
+        }
+
+    def _reporter(self, tenant: str):
+        started_at = time.monotonic()
+
+        def report(stage, percent=None):
+            self._progress[tenant] = {"stage": stage, "percent": percent, "started_at": started_at}
+
+        report("waiting")
+        return report
+
+    def get(self, tenant: str) -> VectorStore:
+        """租户的 VectorStore，第一次使用时创建（阻塞：连接向量库、建集合和索引）"""
+        store = self._stores.get(tenant)
+        if store is not None:
+            return store
+        with self._lock:
+            init_lock = self._init_locks.setdefault(tenant, threading.Lock())
+        # 同一租户只初始化一次；不同租户的初始化互不阻塞
+        with init_lock:
+            store = self._stores.get(tenant)
+            if store is not None:
+                return store
+            if len(self._stores) >= self.settings.max_tenants:
+                raise TooManyTenantsError(
+                    f"Too many tenants open in this process ({len(self._stores)} >= {self.settings.max_tenants})"
+                )
+            # 等待文件锁时阶段为 waiting（另一个 worker 正在建集合或索引）
+            report = self._reporter(tenant)
+            try:
+                with file_lock(os.path.join(self.settings.state_dir, f"init-{tenant}.lock")):
+                    store = self._create_store(tenant, report)
+            except Exception as e:
+                self._errors[tenant] = str(e)
+                raise
+            finally:
+                self._progress.pop(tenant, None)
+            self._errors.pop(tenant, None)
+            self._stores[tenant] = store
+            logger.info(f"Vector store for tenant {tenant} initialized")
+            return store
+
+    def limiter(self, tenant: str) -> ConcurrencyLimiter:
+        """租户自己的检索并发限制，在全局限制之内再限制单个租户（未启用多租户时不额外限制）"""
+        with self._lock:
+            limiter = self._limiters.get(tenant)
+            if limiter is None:
+                max_concurrent = self.settings.max_concurrent_searches
+                if self.isolated and self.settings.max_tenant_searches:
+                    max_concurrent = self.settings.max_tenant_searches
+                limiter = ConcurrencyLimiter(max_concurrent, self.settings.max_queued_searches)
+                self._limiters[tenant] = limiter
+            return limiter
+
+    def _suffixed(self, name: str, tenant: str) -> str:
+        if not self.isolated or tenant == self.settings.default_tenant:
+            return name
+        return f"{name}_{tenant}"
+
+    def _create_store(self, tenant: str, progress=None) -> VectorStore:
+        settings = self.settings
+        root, extension = os.path.splitext(settings.lexical_index_path)
+        rescore_root, rescore_extension = os.path.splitext(settings.rescore_vectors_path)
+        collection_name = settings.collection
+        partition = None
+        if settings.tenant_isolation == "collection":
+            collection_name = self._suffixed(settings.collection, tenant)
+        elif settings.tenant_isolation == "partition":
+            partition = DEFAULT_PARTITION if tenant == settings.default_tenant else tenant
+
+        self._create_embedding_clients()
+        return VectorStore(
+            backend=settings.vector_backend,
+            milvus_host=settings.milvus_host,
+            milvus_port=settings.milvus_port,
+            collection_name=collection_name,
+            partition=partition,
+            search_consistency=settings.search_consistency,
+            local_store_path=self._suffixed(settings.local_store_path, tenant),
+            reset_on_schema_mismatch=settings.reset_on_schema_mismatch,
+            index_profile=settings.index_profile,
+            vector_type=settings.vector_type,
+            partition_key=settings.partition_key,
+            lexical_index_path=self._suffixed(root, tenant) + extension,
+            rescore_vectors_path=self._suffixed(rescore_root, tenant) + rescore_extension,
+            insert_buffer_rows=settings.insert_buffer_rows,
+            insert_buffer_delay=settings.insert_buffer_delay_ms / 1000,
+            embedder=self.embedder,
+            async_embedder=self.async_embedder,
+            embedding_cache=self.embedding_cache,
+            # 写入代数按租户（集合或分区）记录，一个租户的写入不会让其他租户的检索缓存失效
+            generation_path=os.path.join(settings.state_dir, f"generation-{tenant}"),
+            progress=progress,
+        )
+
+    def _create_embedding_clients(self):
+        with self._lock:
+            if self.embedder is not None:
+                return
+            settings = self.settings
+            self.embedder = EmbeddingClient(
+                url=settings.ollama_url,
+                model_name=settings.embedding_model,
+                dim=settings.embedding_dim,
+            )
+            self.async_embedder = AsyncEmbeddingClient(
+                url=settings.ollama_url,
+                model_name=settings.embedding_model,
+                dim=settings.embedding_dim,
+            )
+            # SQLite 嵌入缓存可以被多个 worker 进程同时打开，同一段文本在任一进程算过一次即可
+            self.embedding_cache = EmbeddingCache(path=settings.embedding_cache_path)
+
+    def close(self):
+        for store in self._stores.values():
+            store.close()
+        self._stores.clear()
+        if self.embedder is not None:
+            self.embedder.close()
+            self.embedding_cache.close()
+
+    async def aclose(self):
+        if self.async_embedder is not None:
+            await self.async_embedder.aclose()
+        self.close()
@@ -0,0 +1,94 @@
+import logging
+import os
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# 每次从上传流中读取并写入磁盘的字节数
+SPOOL_CHUNK_SIZE = 1024 * 1024
+
+
+class IngestBudgetExceeded(Exception):
+    """正在入库的文件总字节数超过上限；too_large 表示单个文件本身就超过上限"""
+
+    def __init__(self, message, too_large=False):
+        super().__init__(message)
+        self.too_large = too_large
+
+
+class UploadSpool:
+    """把上传文件分块写入磁盘临时文件，并限制已落盘、尚未入库完成的文件总字节数
+
+    解析器直接按路径打开临时文件（fitz.open、pandas 等），文件内容不会整体读入内存；
+    入库结束后调用 discard 删除文件并归还额度。
+    """
+
+    def __init__(self, directory: str = "data/uploads", max_bytes: int = 2 * 1024 ** 3):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._sizes = {}  # path -> 已占用的字节数
+        self.used = 0
+        self.rejected = 0
+
+    def new_path(self, file_extension: str) -> str:
+        """登记一个临时文件路径；调用方在写入前就拿到路径，中途取消时也能 discard"""
+        path = os.path.join(self.directory, f"{uuid.uuid4().hex}.{file_extension}")
+        with self._lock:
+            self._sizes[path] = 0
+        return path
+
+    def spool(self, fileobj, file_extension: str, path: str = None) -> str:
+        """把文件对象分块复制到临时文件，返回路径；超出额度时删除已写部分并抛出 IngestBudgetExceeded"""
+        path = path or self.new_path(file_extension)
+        try:
+            with open(path, "wb") as out:
+                while True:
+                    chunk = fileobj.read(SPOOL_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    self._reserve(path, len(chunk))
+                    out.write(chunk)
+        except BaseException:
+            self.discard(path)
+            raise
+        return path
+
+    def _reserve(self, path, size):
+        with self._lock:
+            if path not in self._sizes:
+                # 写入过程中已被 discard（例如请求被取消）
+                raise IngestBudgetExceeded(f"Spooled upload {path} was discarded")
+            if self.used + size > self.max_bytes:
+                self.rejected += 1
+                too_large = self._sizes[path] + size > self.max_bytes
+                raise IngestBudgetExceeded(
+                    f"File exceeds the ingest limit of {self.max_bytes} bytes"
+                    if too_large
+                    else f"Too many bytes being ingested ({self.used}/{self.max_bytes}), retry later",
+                    too_large=too_large,
+                )
+            self._sizes[path] += size
+            self.used += size
+
+    def discard(self, path: str):
+        """删除临时文件并归还额度（可重复调用）"""
+        with self._lock:
+            self.used -= self._sizes.pop(path, 0)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Failed to remove spooled upload {path}: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "files": len(self._sizes),
+                "bytes": self.used,
+                "max_bytes": self.max_bytes,
+                "rejected": self.rejected,
+            }
@@ -0,0 +1,61 @@
+"""向量存储格式：float32 原始向量，或 float16 / bfloat16 / 二值化的紧凑向量"""
+import numpy as np
+from pymilvus import DataType
+
+VECTOR_TYPES = ("float32", "float16", "bfloat16", "binary")
+
+
+class VectorCodec:
+    """把 float32 嵌入矩阵编码成 Milvus 对应向量字段可以接受的格式"""
+
+    def __init__(self, vector_type: str = "float32"):
+        if vector_type not in VECTOR_TYPES:
+            raise ValueError(
+                f"Unknown vector type: {vector_type} (available: {', '.join(VECTOR_TYPES)})"
+            )
+        self.vector_type = vector_type
+        self.data_type = self._data_type(vector_type)
+        # 二值向量只用于粗召回，最终排序用全精度向量重新打分
+        self.rescore = vector_type == "binary"
+
+    @staticmethod
+    def _data_type(vector_type):
+        if vector_type == "float32":
+            return DataType.FLOAT_VECTOR
+        if vector_type == "binary":
+            return DataType.BINARY_VECTOR
+        name = "FLOAT16_VECTOR" if vector_type == "float16" else "BFLOAT16_VECTOR"
+        data_type = getattr(DataType, name, None)
+        if data_type is None:
+            raise ValueError(f"{vector_type} vectors require Milvus and pymilvus 2.4 or later")
+        return data_type
+
+    def check_dim(self, dim: int):
+        if self.vector_type == "binary" and dim % 8:
+            raise ValueError(f"Binary vectors need a dimension divisible by 8, got {dim}")
+
+    def bytes_per_vector(self, dim: int) -> int:
+        return {"float32": 4 * dim, "float16": 2 * dim, "bfloat16": 2 * dim, "binary": dim // 8}[
+            self.vector_type
+        ]
+
+    def encode(self, embeddings: np.ndarray):
+        """编码 (n, dim) 的 float32 矩阵，返回每行一个向量的列表"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if self.vector_type == "float32":
+            return embeddings.tolist()
+        if self.vector_type == "float16":
+            return list(embeddings.astype(np.float16))
+        if self.vector_type == "bfloat16":
+            # 取 float32 的高 16 位（就近舍入到偶数）
+            bits = embeddings.view(np.uint32)
+            rounded = (bits + 0x7FFF + ((bits >> 16) & 1)) >> 16
+            return [row.tobytes() for row in rounded.astype(np.uint16)]
+        # binary：按符号位量化，每 8 维打包成一个字节
+        return [row.tobytes() for row in np.packbits(embeddings > 0, axis=1)]
+
+    def encode_batch(self, embeddings: np.ndarray):
+        """写入用的编码：float32 直接返回 (n, dim) 数组，不转换成 Python 列表"""
+        if self.vector_type == "float32":
+            return np.ascontiguousarray(embeddings, dtype=np.float32)
+        return self.encode(embeddings)
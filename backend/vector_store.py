@@ -1,134 +1,628 @@
-import os
-import requests
+import contextvars
+import hashlib
 import json
-from pymilvus import connections, Collection, FieldSchema, CollectionSchema, DataType, utility
 import numpy as np
+import threading
 import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from bulk_writer import BulkWriter
+from embedding_cache import EmbeddingCache
+from embedding_client import AsyncEmbeddingClient, EmbeddingClient
+from filters import SCALAR_FIELDS, scalar_values
+from index_profiles import DEFAULT_INDEX_PROFILE
+from lexical_index import LexicalIndex, reciprocal_rank_fusion
+from metrics import span
+from rescore_vectors import RescoreVectors
+from shared_state import SharedCounter
+
+BACKENDS = ("milvus", "local")
+QUERY_BATCH_SIZE = 1000
+RESCORE_CANDIDATES = 4  # 二值向量重新打分时的候选倍数
+HYBRID_CANDIDATES = 100  # 混合检索时稠密检索和关键词检索各取的候选数
+RRF_K = 60  # 倒数排名融合的平滑常数
+SEARCH_MODES = ("dense", "hybrid")
+
+
+def _quote(value):
+    """把字符串转成过滤表达式中的字符串字面量"""
+    return json.dumps(value, ensure_ascii=False)
+
+
+def create_backend(
+    backend="milvus",
+    reset_on_schema_mismatch=False,
+    index_profile=DEFAULT_INDEX_PROFILE,
+    vector_type="float32",
+    partition_key=None,
+    local_store_path="data/local_store",
+    max_retries=3,
+    collection_name="documents",
+    host="localhost",
+    port="19530",
+    partition=None,
+    search_consistency="Strong",
+):
+    """按名称创建向量存储后端：milvus（默认）或 local（进程内 NumPy 存储，不依赖外部服务）"""
+    if backend == "milvus":
+        # 只有使用 Milvus 时才导入 pymilvus
+        from milvus_store import MilvusBackend
+        return MilvusBackend(
+            collection_name=collection_name,
+            host=host,
+            port=port,
+            partition=partition,
+            max_retries=max_retries,
+            reset_on_schema_mismatch=reset_on_schema_mismatch,
+            index_profile=index_profile,
+            vector_type=vector_type,
+            partition_key=partition_key,
+            search_consistency=search_consistency,
+        )
+    if backend == "local":
+        from local_store import LocalBackend
+        if vector_type != "float32":
+            raise ValueError(f"The local backend only stores float32 vectors, got vector_type={vector_type}")
+        if partition is not None:
+            raise ValueError("The local backend has no partitions, use one store path per tenant instead")
+        return LocalBackend(
+            local_store_path,
+            index_profile=index_profile,
+            reset_on_schema_mismatch=reset_on_schema_mismatch,
+        )
+    raise ValueError(f"Unknown vector backend: {backend}, expected one of {BACKENDS}")
 
-# 设置代理
-os.environ['HTTP_PROXY'] = 'http://127.0.0.1:7890'
-os.environ['HTTPS_PROXY'] = 'http://127.0.0.1:7890'
 
 class VectorStore:
-    def __init__(self, max_retries=3):
-        # 尝试连接 Milvus
-        retry_count = 0
-        while retry_count < max_retries:
-            try:
-                # 连接到 Milvus
-                connections.connect(host='localhost', port='19530')
-                print("Successfully connected to Milvus")
-                break
-            except Exception as e:
-                retry_count += 1
-                if retry_count == max_retries:
-                    raise Exception(f"Failed to connect to Milvus after {max_retries} attempts: {str(e)}")
-                print(f"Failed to connect to Milvus (attempt {retry_count}/{max_retries}). Retrying in 5 seconds...")
-                time.sleep(5)
+    """文本块的嵌入、写入与检索；向量和标量字段存储在可替换的后端中（Milvus 或进程内的本地存储）"""
+
+    def __init__(
+        self,
+        max_retries=3,
+        embedding_batch_size=16,
+        embedding_workers=4,
+        embedding_cache_path="data/embedding_cache.sqlite3",
+        embedding_cache_size=100000,
+        embedding_cache_ttl=None,
+        reset_on_schema_mismatch=False,
+        index_profile=DEFAULT_INDEX_PROFILE,
+        embedding_dim=None,
+        vector_type="float32",
+        lexical_index_path="data/lexical_index.npz",
+        rescore_vectors_path="data/rescore_vectors.sqlite3",
+        partition_key=None,
+        insert_buffer_rows=2048,
+        insert_buffer_delay=0.5,
+        backend="milvus",
+        local_store_path="data/local_store",
+        collection_name="documents",
+        milvus_host="localhost",
+        milvus_port="19530",
+        partition=None,
+        search_consistency="Strong",
+        ollama_url="http://localhost:11434/api/embeddings",
+        model_name="bge-m3",
+        embedder=None,
+        async_embedder=None,
+        embedding_cache=None,
+        generation_path=None,
+        lexical_refresh_interval=30.0,
+        progress=None,
+    ):
+        # 初始化进度回调 progress(stage, percent)：connect -> embedding_dim -> index/load -> lexical_index
+        progress = progress or (lambda stage, percent=None: None)
+        # 向量存储后端（也可以直接传入后端实例）
+        if isinstance(backend, str):
+            progress("connect")
+            backend = create_backend(
+                backend,
+                reset_on_schema_mismatch=reset_on_schema_mismatch,
+                index_profile=index_profile,
+                vector_type=vector_type,
+                partition_key=partition_key,
+                local_store_path=local_store_path,
+                max_retries=max_retries,
+                collection_name=collection_name,
+                host=milvus_host,
+                port=milvus_port,
+                partition=partition,
+                search_consistency=search_consistency,
+            )
+        self.backend = backend
         
-        # 设置 Ollama API 地址
-        self.ollama_url = "http://localhost:11434/api/embeddings"
-        self.model_name = "bge-m3"  # 使用 bge-m3 模型
+        # Ollama 嵌入客户端和嵌入缓存；多个 VectorStore（例如每个租户一个）可以共用同一组，
+        # 此时由创建者负责关闭
+        self._owns_embedding = embedder is None
+        self.ollama_url = ollama_url
+        self.model_name = model_name
+        self.embedder = embedder or EmbeddingClient(
+            url=self.ollama_url,
+            model_name=self.model_name,
+            dim=embedding_dim,
+            batch_size=embedding_batch_size,
+            max_workers=embedding_workers,
+        )
+        self.model_name = self.embedder.model_name
+        # 嵌入缓存：相同模型 + 相同文本只计算一次
+        self.embedding_cache = embedding_cache or EmbeddingCache(
+            path=embedding_cache_path,
+            max_entries=embedding_cache_size,
+            ttl=embedding_cache_ttl,
+        )
+        # 每次写入或删除后递增，检索结果缓存据此判断是否过期；
+        # 给出 generation_path 时计数保存在文件中，多个进程写入同一集合时都能看到彼此的写入
+        self._generation = 0
+        self._shared_generation = SharedCounter(generation_path) if generation_path else None
         
-        # 删除现有集合（如果存在）
-        self.collection_name = "documents"
-        if utility.has_collection(self.collection_name):
-            utility.drop_collection(self.collection_name)
-            print(f"Dropped existing collection: {self.collection_name}")
+        # 向量维度从模型探测得到，并与已有集合的 schema 校验
+        progress("embedding_dim")
+        self.dim = self._resolve_dim(self.backend.existing_dim())
+        # 查询路径使用的异步客户端（在 FastAPI 的事件循环中调用）
+        self.async_embedder = async_embedder or AsyncEmbeddingClient(
+            url=self.ollama_url,
+            model_name=self.model_name,
+            dim=self.dim,
+            batch_size=embedding_batch_size,
+            max_connections=embedding_workers * 4,
+        )
+        if self.async_embedder.dim is None:
+            self.async_embedder.dim = self.dim
+        self.backend.prepare(self.dim, progress=progress)
+        self.metric_type = self.backend.metric_type
+        # 二值向量后端：写入时按主键保存全精度向量，检索时据此重新打分
+        self.rescore_vectors = None
+        if self.backend.rescore and rescore_vectors_path:
+            self.rescore_vectors = RescoreVectors(rescore_vectors_path)
         
-        # 创建新集合
-        fields = [
-            FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
-            FieldSchema(name="text", dtype=DataType.VARCHAR, max_length=65535),
-            FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=768),  # bge-m3 的维度是768
-            FieldSchema(name="metadata", dtype=DataType.JSON)
-        ]
-        schema = CollectionSchema(fields=fields, description="document collection")
-        self.collection = Collection(name=self.collection_name, schema=schema)
+        # 入库流水线的写入先进入缓冲，合并成大批次写入；不主动 flush，由后端自行封存 segment
+        self._pending_docs = Counter()  # doc_id -> 缓冲中尚未写入的批次数
+        self._pending_lock = threading.Lock()
+        self.writer = BulkWriter(
+            self._write_buffered, max_rows=insert_buffer_rows, max_delay=insert_buffer_delay
+        )
         
-        # 创建索引
-        index_params = {
-            "metric_type": "L2",
-            "index_type": "IVF_FLAT",
-            "params": {"nlist": 1024}
+        # 关键词倒排索引（lexical_index_path 为 None 时不启用混合检索）
+        self.lexical_index = None
+        self._search_executor = None
+        self.lexical_index_path = lexical_index_path
+        self.lexical_refresh_interval = lexical_refresh_interval
+        # 关键词索引已包含的写入代数；其他进程写入后两者不一致，需要从向量库刷新
+        self._lexical_generation = self.generation
+        self._lexical_refreshing = False
+        self._lexical_refreshed_at = 0.0
+        self._lexical_lock = threading.Lock()
+        if lexical_index_path:
+            progress("lexical_index")
+            self.lexical_index = LexicalIndex(path=lexical_index_path)
+            self._search_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="lexical")
+            if not len(self.lexical_index) and self.backend.count():
+                # 索引文件不存在（首次启用或被删除）时在后台从向量库重建
+                threading.Thread(target=self._rebuild_lexical_index, daemon=True).start()
+
+    @property
+    def generation(self):
+        if self._shared_generation is not None:
+            return self._shared_generation.value()
+        return self._generation
+
+    def _bump_generation(self):
+        """写入或删除之后调用"""
+        self._generation += 1
+        if self._shared_generation is None:
+            self._lexical_generation = self._generation
+            return
+        previous = self._lexical_generation
+        value = self._shared_generation.increment()
+        with self._lexical_lock:
+            # 期间没有其他进程写入时，本进程的关键词索引仍然是完整的
+            if previous == value - 1 and self._lexical_generation == previous:
+                self._lexical_generation = value
+
+    def _rebuild_lexical_index(self, index=None):
+        print(f"Rebuilding lexical index from the {self.backend.name} backend")
+        index = index if index is not None else self.lexical_index
+        batch_ids, batch_texts = [], []
+        for row in self.backend.query("id >= 0", ["text"]):
+            batch_ids.append(row["id"])
+            batch_texts.append(row["text"])
+            if len(batch_ids) >= QUERY_BATCH_SIZE:
+                index.add(batch_ids, batch_texts)
+                batch_ids, batch_texts = [], []
+        if batch_ids:
+            index.add(batch_ids, batch_texts)
+        index.save(self.lexical_index_path)
+        print(f"Lexical index rebuilt: {len(index)} chunks")
+        return index
+
+    def _maybe_refresh_lexical_index(self):
+        """其他进程写入过同一集合时，在后台从向量库重建关键词索引（最多每 lexical_refresh_interval 秒一次）"""
+        if self._shared_generation is None:
+            return
+        with self._lexical_lock:
+            generation = self.generation
+            if (
+                generation == self._lexical_generation
+                or self._lexical_refreshing
+                or time.monotonic() - self._lexical_refreshed_at < self.lexical_refresh_interval
+            ):
+                return
+            self._lexical_refreshing = True
+
+        def refresh():
+            try:
+                # 重建期间继续使用旧索引；重建期间再有写入时代数会变化，下次检索会再次刷新
+                index = self._rebuild_lexical_index(LexicalIndex())
+                with self._lexical_lock:
+                    self.lexical_index = index
+                    self._lexical_generation = generation
+            except Exception as e:
+                print(f"Failed to refresh lexical index: {e}")
+            finally:
+                with self._lexical_lock:
+                    self._lexical_refreshing = False
+                    self._lexical_refreshed_at = time.monotonic()
+
+        threading.Thread(target=refresh, name="lexical-refresh", daemon=True).start()
+
+    async def aclose(self):
+        if self._owns_embedding:
+            await self.async_embedder.aclose()
+        self.close()
+
+    def close(self):
+        self.writer.close()
+        if self.lexical_index is not None:
+            self._search_executor.shutdown(wait=False)
+            self.lexical_index.save(self.lexical_index_path)
+        if self._owns_embedding:
+            self.embedder.close()
+            self.embedding_cache.close()
+        if self._shared_generation is not None:
+            self._shared_generation.close()
+        if self.rescore_vectors is not None:
+            self.rescore_vectors.close()
+        self.backend.close()
+
+    def _resolve_dim(self, existing_dim):
+        """确定向量维度：优先以模型实际输出为准，模型暂时不可用时沿用已有集合的维度"""
+        try:
+            dim = self.embedder.dim or self.embedder.discover_dim()
+        except Exception as e:
+            if existing_dim is None:
+                raise Exception(f"Failed to determine embedding dimension of {self.model_name}: {e}")
+            print(f"Could not probe {self.model_name} ({e}), using collection dimension {existing_dim}")
+            self.embedder.dim = existing_dim
+            return existing_dim
+        if existing_dim is not None and existing_dim != dim:
+            raise Exception(
+                f"Embedding model {self.model_name} produces {dim}-dim vectors, but the "
+                f"{self.backend.name} store holds {existing_dim}-dim vectors. Re-ingest into a new "
+                f"collection or drop the old one."
+            )
+        print(f"Embedding dimension: {dim}")
+        return dim
+
+    def get_embeddings(self, texts):
+        """使用 Ollama API 获取文本的嵌入向量（优先读取缓存）"""
+        with span("embed"):
+            return self.embedding_cache.get_or_compute(
+                self.model_name, texts, self.embedder.embed, dim=self.embedder.dim
+            )
+
+    async def aget_embeddings(self, texts):
+        """get_embeddings 的异步版本，缓存未命中时通过异步 HTTP 客户端请求 Ollama"""
+        with span("embed"):
+            return await self.embedding_cache.aget_or_compute(
+                self.model_name, texts, self.async_embedder.embed, dim=self.embedder.dim
+            )
+
+    @staticmethod
+    def chunk_hash(text, metadata=None):
+        """块的内容哈希：文本 + 除 chunk_index 以外的元数据"""
+        metadata = {k: v for k, v in (metadata or {}).items() if k != "chunk_index"}
+        digest = hashlib.sha256(text.encode("utf-8"))
+        digest.update(json.dumps(metadata, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get_document_hashes(self, doc_id):
+        """返回文档已入库的块：{chunk_hash: [id, ...]}"""
+        with self._pending_lock:
+            pending = self._pending_docs[doc_id] > 0
+        if pending:
+            # 该文档还有缓冲中的块，先写入，保证读到自己的写入
+            self.writer.flush()
+        hashes = {}
+        for row in self.backend.query(f"doc_id == {_quote(doc_id)}", ["chunk_hash"]):
+            hashes.setdefault(row["chunk_hash"], []).append(row["id"])
+        return hashes
+
+    def insert_embeddings(self, texts, embeddings, metadatas, doc_id="", chunk_hashes=None):
+        """立即写入已经计算好嵌入的块，返回主键列表"""
+        if chunk_hashes is None:
+            chunk_hashes = [self.chunk_hash(t, m) for t, m in zip(texts, metadatas)]
+        return self._write_batches([(list(texts), embeddings, list(metadatas), doc_id, list(chunk_hashes))])[0]
+
+    def write_embeddings(self, texts, embeddings, metadatas, doc_id, chunk_hashes, callback=None):
+        """经写入缓冲写入块；实际写入后调用 callback(primary_keys, error)"""
+        texts = list(texts)
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        with self._pending_lock:
+            self._pending_docs[doc_id] += 1
+        # UTF-8 文本按每字符最多 3 字节估计
+        nbytes = embeddings.nbytes + sum(len(text) for text in texts) * 3
+        self.writer.add(
+            (texts, embeddings, list(metadatas), doc_id, list(chunk_hashes)),
+            len(texts),
+            nbytes,
+            callback,
+        )
+
+    def flush(self):
+        """写入缓冲中的数据并让后端持久化（Milvus 封存 segment），需要立即读到写入结果时调用，返回从缓冲写入的行数"""
+        rows = self.writer.flush()
+        with span("vector_flush"):
+            self.backend.flush()
+        return rows
+
+    def _write_buffered(self, batches):
+        try:
+            return self._write_batches(batches)
+        finally:
+            with self._pending_lock:
+                for batch in batches:
+                    doc_id = batch[3]
+                    self._pending_docs[doc_id] -= 1
+                    if self._pending_docs[doc_id] <= 0:
+                        del self._pending_docs[doc_id]
+
+    def _write_batches(self, batches):
+        """把多批块合并成一次按列写入，返回每批的主键列表
+
+        标量字段从元数据中提取；upload_time 是块首次写入的时间（未变化的块重新上传时不会重写）。
+        """
+        upload_time = int(time.time())
+        doc_ids, hashes, texts, metadatas, sizes = [], [], [], [], []
+        for batch_texts, _, batch_metadatas, doc_id, batch_hashes in batches:
+            doc_ids.extend([doc_id] * len(batch_texts))
+            hashes.extend(batch_hashes)
+            texts.extend(batch_texts)
+            metadatas.extend(batch_metadatas)
+            sizes.append(len(batch_texts))
+        embeddings = np.concatenate([np.asarray(batch[1], dtype=np.float32) for batch in batches])
+        columns = {
+            "doc_id": doc_ids,
+            "chunk_hash": hashes,
+            "text": texts,
+            "embedding": embeddings,
+            "metadata": metadatas,
         }
-        self.collection.create_index(field_name="embedding", index_params=index_params)
-        self.collection.load()
-        print(f"Created new collection: {self.collection_name}")
-
-    def _get_embeddings(self, texts):
-        """使用 Ollama API 获取文本的嵌入向量"""
-        embeddings = []
-        for text in texts:
+        scalars = [scalar_values(metadata, upload_time) for metadata in metadatas]
+        for name in SCALAR_FIELDS:
+            columns[name] = [values[name] for values in scalars]
+        
+        with span("vector_insert"):
+            primary_keys = self.backend.insert(columns)
+        self._bump_generation()
+        if self.rescore_vectors is not None:
             try:
-                response = requests.post(
-                    self.ollama_url,
-                    json={
-                        "model": self.model_name,
-                        "prompt": text
-                    }
-                )
-                response.raise_for_status()
-                embedding = response.json()["embedding"]
-                # 确保向量维度正确
-                if len(embedding) != 768:
-                    print(f"Warning: Expected embedding dimension 768, but got {len(embedding)}")
-                    # 如果维度不正确，可以选择填充或截断
-                    if len(embedding) > 768:
-                        embedding = embedding[:768]
-                    else:
-                        embedding = embedding + [0] * (768 - len(embedding))
-                embeddings.append(embedding)
+                self.rescore_vectors.put(primary_keys, embeddings)
             except Exception as e:
-                print(f"获取嵌入向量失败: {e}")
-                raise
-        return np.array(embeddings)
+                # 保存失败的块检索时退回到嵌入缓存或汉明距离估计，不影响写入
+                print(f"Failed to store full-precision vectors for rescoring: {e}")
+        if self.lexical_index is not None:
+            self.lexical_index.add(primary_keys, texts)
+            self.lexical_index.maybe_save()
+        
+        results = []
+        start = 0
+        for size in sizes:
+            results.append(primary_keys[start:start + size])
+            start += size
+        return results
 
-    def add_documents(self, texts, metadatas=None):
+    def add_documents(self, texts, metadatas=None, doc_id=""):
+        """写入文本块，同一文档内已存在的块直接跳过，返回新写入的主键"""
         if metadatas is None:
             metadatas = [{}] * len(texts)
         
+        existing = self.get_document_hashes(doc_id)
+        new_texts, new_metadatas, new_hashes = [], [], []
+        for text, metadata in zip(texts, metadatas):
+            digest = self.chunk_hash(text, metadata)
+            if digest in existing:
+                continue
+            existing[digest] = []
+            new_texts.append(text)
+            new_metadatas.append(metadata)
+            new_hashes.append(digest)
+        if not new_texts:
+            return []
+        
         # 生成嵌入
-        embeddings = self._get_embeddings(texts)
+        embeddings = self.get_embeddings(new_texts)
+        return self.insert_embeddings(new_texts, embeddings, new_metadatas, doc_id, new_hashes)
+
+    def delete_document(self, doc_id, keep_hashes=None):
+        """删除文档的块；给出 keep_hashes 时只删除不在其中的块，返回删除的条数"""
+        stale_ids = self._stale_ids(self.get_document_hashes(doc_id), keep_hashes or set())
+        self._delete_ids(stale_ids)
+        return len(stale_ids)
+
+    def upsert_document(self, doc_id, chunks, batch_size=256):
+        """增量写入一个文档的块流：未变化的块跳过，新块嵌入写入，消失的块删除"""
+        existing = self.get_document_hashes(doc_id)
+        seen = set()
+        inserted = skipped = 0
+        batch = []
         
-        # 准备数据
-        entities = [
-            texts,
-            embeddings.tolist(),
-            metadatas
-        ]
+        def write(batch):
+            texts = [chunk["text"] for chunk, _ in batch]
+            metadatas = [chunk["metadata"] for chunk, _ in batch]
+            embeddings = self.get_embeddings(texts)
+            self.insert_embeddings(texts, embeddings, metadatas, doc_id, [h for _, h in batch])
+        
+        for chunk in chunks:
+            digest = self.chunk_hash(chunk["text"], chunk["metadata"])
+            if digest in seen or digest in existing:
+                seen.add(digest)
+                skipped += 1
+                continue
+            seen.add(digest)
+            batch.append((chunk, digest))
+            if len(batch) >= batch_size:
+                write(batch)
+                inserted += len(batch)
+                batch = []
+        if batch:
+            write(batch)
+            inserted += len(batch)
         
-        # 插入数据
-        self.collection.insert(entities)
-        self.collection.flush()
+        stale_ids = self._stale_ids(existing, seen)
+        self._delete_ids(stale_ids)
+        return {"inserted": inserted, "skipped": skipped, "deleted": len(stale_ids)}
 
-    def search(self, query, k=5):
-        # 生成查询嵌入
-        query_embedding = self._get_embeddings([query])[0]
+    @staticmethod
+    def _stale_ids(existing, keep_hashes):
+        stale_ids = []
+        for digest, ids in existing.items():
+            # 历史上重复写入的块只保留一条
+            stale_ids.extend(ids[1:] if digest in keep_hashes else ids)
+        return stale_ids
+
+    def _delete_ids(self, ids):
+        if not ids:
+            return
+        self.backend.delete(ids)
+        self._bump_generation()
+        if self.rescore_vectors is not None:
+            self.rescore_vectors.delete(ids)
+        if self.lexical_index is not None:
+            self.lexical_index.delete(ids)
+            self.lexical_index.maybe_save()
+
+    def search(self, query, k=5, expr=None, search_params=None, mode="dense", query_embedding=None):
+        return self.search_batch(
+            [query],
+            ks=[k],
+            exprs=[expr],
+            search_params=search_params,
+            mode=mode,
+            query_embeddings=None if query_embedding is None else [query_embedding],
+        )[0]
+
+    def search_batch(
+        self, queries, ks=None, exprs=None, search_params=None, mode="dense", query_embeddings=None
+    ):
+        """批量检索：一次嵌入所有查询，过滤条件相同的查询合并为一次多向量检索
+
+        search_params 覆盖索引配置中的默认检索参数（如 ef、nprobe），用于按请求权衡召回率与延迟。
+        mode="hybrid" 时同时查询关键词倒排索引，两路结果按倒数排名融合（RRF），score 为融合分数。
+        已经算好查询嵌入（例如通过 aget_embeddings）时可以用 query_embeddings 传入。
+        """
+        ks = ks or [5] * len(queries)
+        exprs = exprs or [None] * len(queries)
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unsupported search mode: {mode}, expected one of {SEARCH_MODES}")
+        if mode == "hybrid" and self.lexical_index is None:
+            raise ValueError("Hybrid search is disabled: no lexical index configured")
+        if mode == "hybrid":
+            self._maybe_refresh_lexical_index()
+        # 先校验参数，避免无效请求也去调用嵌入服务
+        self.backend.check_search_params(search_params)
+        if mode == "dense":
+            return self._dense_search(queries, ks, exprs, search_params, query_embeddings)
         
-        # 搜索参数
-        search_params = {
-            "metric_type": "L2",
-            "params": {"nprobe": 10}
+        # 关键词检索与查询嵌入 + 稠密检索并行执行
+        candidates = [max(k, HYBRID_CANDIDATES) for k in ks]
+        lexical_future = self._search_executor.submit(
+            contextvars.copy_context().run, self._lexical_search, queries, max(candidates)
+        )
+        dense_results = self._dense_search(queries, candidates, exprs, search_params, query_embeddings)
+        lexical_results = lexical_future.result()
+        return [
+            self._fuse(dense, lexical, expr, k)
+            for dense, lexical, expr, k in zip(dense_results, lexical_results, exprs, ks)
+        ]
+
+    def _lexical_search(self, queries, k):
+        with span("lexical_search"):
+            return self.lexical_index.search_batch(queries, k)
+
+    def _fuse(self, dense_hits, lexical_hits, expr, k):
+        """RRF 融合；只在关键词结果中出现的块按主键从向量库取回（同时应用过滤条件）"""
+        hits = {hit["id"]: hit for hit in dense_hits}
+        hits.update(self._fetch_hits([pk for pk, _ in lexical_hits if pk not in hits], expr))
+        fused = reciprocal_rank_fusion(
+            [
+                [hit["id"] for hit in dense_hits],
+                # 不满足过滤条件或已删除的块不参与排名
+                [pk for pk, _ in lexical_hits if pk in hits],
+            ],
+            k=RRF_K,
+        )
+        return [dict(hits[pk], score=score) for pk, score in fused[:k]]
+
+    def _fetch_hits(self, ids, expr=None):
+        if not ids:
+            return {}
+        id_expr = f"id in [{', '.join(str(i) for i in ids)}]"
+        with span("hydrate"):
+            rows = list(self.backend.query(
+                f"({expr}) and {id_expr}" if expr else id_expr,
+                ["text", "metadata"],
+            ))
+        return {
+            row["id"]: {"id": row["id"], "text": row["text"], "metadata": row["metadata"], "score": None}
+            for row in rows
         }
+
+    def _dense_search(self, queries, ks, exprs, search_params, query_embeddings=None):
+        # 生成查询嵌入
+        if query_embeddings is None:
+            query_embeddings = self.get_embeddings(queries)
+        query_embeddings = np.asarray(query_embeddings, dtype=np.float32)
         
-        # 执行搜索
-        results = self.collection.search(
-            data=[query_embedding.tolist()],
-            anns_field="embedding",
-            param=search_params,
-            limit=k,
-            output_fields=["text", "metadata"]
-        )
+        # 按过滤表达式分组（一次检索只能带一个表达式）
+        groups = {}
+        for i, expr in enumerate(exprs):
+            groups.setdefault(expr or "", []).append(i)
         
-        # 处理结果
-        search_results = []
-        for hits in results:
-            for hit in hits:
-                search_results.append({
-                    "text": hit.entity.get('text'),
-                    "metadata": hit.entity.get('metadata'),
-                    "score": hit.distance
-                })
+        search_results = [None] * len(queries)
+        for expr, indices in groups.items():
+            limit = max(ks[i] for i in indices)
+            if self.backend.rescore:
+                # 二值向量粗召回时多取一些候选
+                limit *= RESCORE_CANDIDATES
+            # 执行搜索
+            with span("vector_search"):
+                results = self.backend.search(query_embeddings[indices], limit, expr or None, search_params)
+            
+            # 每个查询只保留自己的 k 条
+            for i, query_hits in zip(indices, results):
+                if self.backend.rescore:
+                    query_hits = self._rescore(query_embeddings[i], query_hits)
+                search_results[i] = query_hits[:ks[i]]
         
-        return search_results 
\ No newline at end of file
+        return search_results
+
+    def _rescore(self, query_embedding, hits):
+        """用全精度向量计算余弦相似度并重新排序，不调用嵌入服务
+
+        全精度向量按主键从写入时保存的 rescore_vectors 读取；没有保存的块（例如启用之前写入的）
+        只查嵌入缓存；缓存也未命中时用二值检索的汉明距离 d 估计余弦相似度 cos(π·d/dim)。
+        """
+        if not hits:
+            return hits
+        vectors = self.rescore_vectors.get([hit["id"] for hit in hits]) if self.rescore_vectors is not None else {}
+        missing = [hit for hit in hits if hit["id"] not in vectors]
+        if missing:
+            cached = self.embedding_cache.get_cached(self.model_name, [hit["text"] for hit in missing], dim=self.dim)
+            vectors.update((hit["id"], vector) for hit, vector in zip(missing, cached) if vector is not None)
+        query = query_embedding / max(np.linalg.norm(query_embedding), 1e-12)
+        for hit in hits:
+            vector = vectors.get(hit["id"])
+            if vector is None:
+                hit["score"] = float(np.cos(np.pi * hit["score"] / self.dim))
+            else:
+                hit["score"] = float(vector @ query / max(np.linalg.norm(vector), 1e-12))
+        return sorted(hits, key=lambda hit: hit["score"], reverse=True)
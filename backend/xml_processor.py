@@ -1,43 +1,155 @@
 from lxml import etree
-from typing import List, Dict
+from typing import List, Dict, Iterator
 import xml.etree.ElementTree as ET
 import io
 
+def _is_xml_text(xml_content) -> bool:
+    """bytes 或以 < 开头的字符串视为 XML 内容，其他字符串视为文件路径"""
+    if isinstance(xml_content, (bytes, bytearray)):
+        return True
+    return xml_content.lstrip().startswith("<")
+
+def _open_xml(xml_content):
+    """iterparse 的输入：XML 内容包装成文件对象，文件路径原样返回"""
+    if not _is_xml_text(xml_content):
+        return xml_content
+    if isinstance(xml_content, str):
+        xml_content = xml_content.encode("utf-8")
+    return io.BytesIO(xml_content)
+
+def _local_name(tag) -> str:
+    return etree.QName(tag).localname
+
+def _text(value) -> str:
+    return " ".join((value or "").split())
+
 class XMLProcessor:
-    def __init__(self, chunk_size: int = 1000):
+    """流式 XML 解析（lxml iterparse）：处理完的节点立即从树中删除，内存占用与文件大小无关
+
+    section/content 结构（PDF 转换得到的 XML）按章节路径生成文本块；
+    其他 XML 把只包含叶子节点的元素转成 "标签: 文本" 记录，路径为祖先标签。
+    """
+
+    def __init__(self, chunk_size: int = 1000, max_section_chars: int = 20000, max_pending_leaves: int = 50):
         self.chunk_size = chunk_size
+        self.max_section_chars = max_section_chars  # iter_sections 合并段落的最大长度
+        self.max_pending_leaves = max_pending_leaves  # 同一父节点下累计这么多叶子节点就先输出一条记录
 
     def process_xml(self, xml_content: str) -> List[Dict]:
         """处理XML内容，生成文本块"""
-        chunks = []
-        doc = etree.fromstring(xml_content)
-        
-        def traverse(node, current_path: List[str] = None):
-            if current_path is None:
-                current_path = []
-            
-            if node.tag == "section":
-                new_path = current_path + [node.get("title", "Untitled")]
-                for child in node:
-                    traverse(child, new_path)
-            elif node.tag == "content" and node.text:
-                chunk = {
-                    "text": node.text,
-                    "metadata": {
-                        "path": " > ".join(current_path),
-                        "level": len(current_path)
-                    }
-                }
-                chunks.append(chunk)
-        
-        traverse(doc)
-        return chunks 
+        return list(self.iter_chunks(xml_content))
+
+    def iter_chunks(self, xml_content) -> Iterator[Dict]:
+        """按文档顺序逐个生成文本块 {"text", "metadata": {"path", "level", ["page"]}}"""
+        sections = []  # 当前所在的 section 标题
+        tags = []  # 当前节点的祖先标签（不含 section/content）
+        context = etree.iterparse(
+            _open_xml(xml_content), events=("start", "end"), resolve_entities=False, huge_tree=True
+        )
+        for event, elem in context:
+            tag = _local_name(elem.tag)
+            if event == "start":
+                if tag == "section":
+                    sections.append(elem.get("title", "Untitled"))
+                elif tag != "content":
+                    tags.append(tag)
+                continue
+
+            if tag == "section":
+                # section 下直接出现的非 content 叶子节点
+                yield from self._record(elem, sections, tags)
+                sections.pop()
+                self._discard(elem)
+            elif tag == "content":
+                if elem.text:
+                    metadata = {"path": " > ".join(sections), "level": len(sections)}
+                    if elem.get("page"):
+                        metadata["page"] = int(elem.get("page"))
+                    yield {"text": elem.text, "metadata": metadata}
+                self._discard(elem)
+            else:
+                tags.pop()
+                if len(elem) == 0 and elem.getparent() is not None:
+                    # 叶子节点留给父节点组成记录；积累太多时先输出，避免扁平的大文件占满内存。
+                    # iterparse 会预读，父节点中可能已经有尚未结束的后续子节点，只输出到当前节点为止
+                    parent = elem.getparent()
+                    closed = parent.index(elem) + 1
+                    if closed >= self.max_pending_leaves:
+                        yield from self._record(parent, sections, tags, closed)
+                    continue
+                yield from self._record(elem, sections, tags + [tag])
+                self._discard(elem)
+
+    def _record(self, elem, sections, tags, closed=None) -> Iterator[Dict]:
+        """把节点自身的混合文本或其叶子子节点输出为一条文本块，然后删除这些叶子节点
+
+        closed 为已经解析完的子节点数（节点本身尚未结束时只处理这些子节点），None 表示全部子节点。
+        """
+        metadata = {
+            "path": " > ".join(sections + tags),
+            "level": len(sections) + len(tags),
+        }
+        children = list(elem) if closed is None else list(elem)[:closed]
+        leaves = [child for child in children if isinstance(child.tag, str) and len(child) == 0]
+        if children and (_text(elem.text) or any(_text(child.tail) for child in children)):
+            # 混合内容（正文中夹着 <b>、<a> 等行内标签）按正文处理；与 itertext 一样跳过注释和处理指令的内容
+            parts = [elem.text or ""]
+            for child in children:
+                if isinstance(child.tag, str):
+                    parts.extend(child.itertext())
+                parts.append(child.tail or "")
+            text = _text("".join(parts))
+        elif len(elem) == 0:
+            text = _text(elem.text)
+        else:
+            text = "; ".join(
+                f"{_local_name(leaf.tag)}: {_text(leaf.text)}" for leaf in leaves if _text(leaf.text)
+            )
+        for leaf in leaves:
+            elem.remove(leaf)
+        if closed is not None:
+            # 节点自身的文本已经输出，节点结束时不再重复
+            elem.text = None
+        if text:
+            yield {"text": text, "metadata": metadata}
+
+    @staticmethod
+    def _discard(elem):
+        """清空已处理的节点并从父节点中删除"""
+        elem.clear()
+        parent = elem.getparent()
+        if parent is not None:
+            parent.remove(elem)
+
+    def iter_sections(self, xml_content) -> Iterator[Dict]:
+        """把元数据相同的连续文本块合并为一个段落（不超过 max_section_chars），供分块器使用"""
+        texts = []
+        length = 0
+        metadata = None
+        for chunk in self.iter_chunks(xml_content):
+            if metadata is not None and (
+                chunk["metadata"] != metadata or length + len(chunk["text"]) > self.max_section_chars
+            ):
+                yield {"text": "\n".join(texts), "metadata": metadata}
+                texts = []
+                length = 0
+            metadata = chunk["metadata"]
+            texts.append(chunk["text"])
+            length += len(chunk["text"])
+        if texts:
+            yield {"text": "\n".join(texts), "metadata": metadata}
+
+_default_processor = XMLProcessor()
+
+def parse_xml(content, file_extension: str = "xml"):
+    """parsers 注册的解析函数：iterparse 流式解析"""
+    return _default_processor.iter_sections(content)
 
 def process_xml(content: bytes) -> str:
     """处理XML文件并提取文本"""
     try:
-        # 解析XML内容
-        root = ET.fromstring(content)
+        # 解析XML内容（也可以是文件路径）
+        root = ET.fromstring(content) if _is_xml_text(content) else ET.parse(content).getroot()
         
         # 提取所有文本内容
         texts = []
@@ -0,0 +1,74 @@
+"""嵌入客户端基准测试：逐条 requests.post 与 EmbeddingClient 对比
+
+    python benchmarks/bench_embedding.py --texts 2000 --latency 0.02
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from embedding_client import EmbeddingClient  # noqa: E402
+from stub_ollama import start_stub_server  # noqa: E402
+
+
+def naive_embed(url, model_name, texts):
+    """旧实现：每条文本一个新连接，串行请求"""
+    embeddings = []
+    for text in texts:
+        response = requests.post(url, json={"model": model_name, "prompt": text})
+        response.raise_for_status()
+        embeddings.append(response.json()["embedding"])
+    return np.array(embeddings)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--latency", type=float, default=0.02, help="桩服务的单次请求延迟（秒）")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--skip-naive", action="store_true")
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(dim=args.dim, latency=args.latency)
+    texts = [f"benchmark chunk {i} " * 20 for i in range(args.texts)]
+    print(f"Stub server: {base_url}, texts={args.texts}, latency={args.latency}s")
+
+    baseline = None
+    if not args.skip_naive:
+        _, baseline = timed(lambda: naive_embed(f"{base_url}/api/embeddings", "bge-m3", texts))
+        print(f"{'naive requests.post':<40} {baseline:8.2f}s {args.texts / baseline:10.1f} texts/s")
+
+    for endpoint in ("/api/embeddings", "/api/embed"):
+        for workers in args.workers:
+            client = EmbeddingClient(
+                url=base_url + endpoint,
+                dim=args.dim,
+                batch_size=args.batch_size,
+                max_workers=workers,
+            )
+            matrix, elapsed = timed(lambda: client.embed(texts))
+            client.close()
+            assert matrix.shape == (args.texts, args.dim) and matrix.dtype == np.float32
+            label = f"EmbeddingClient {endpoint} workers={workers}"
+            speedup = f"x{baseline / elapsed:.1f}" if baseline else ""
+            print(f"{label:<40} {elapsed:8.2f}s {args.texts / elapsed:10.1f} texts/s {speedup}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""索引配置基准测试：在本地 Milvus 上对比各索引配置的召回率与延迟
+
+对每个索引配置建一个临时集合，写入带聚类结构的合成向量，
+扫描检索参数（ef / nprobe / search_list），以暴力检索结果为基准计算 recall@k。
+
+    python benchmarks/bench_index_profiles.py --vectors 100000 --dim 1024 --profiles hnsw ivf_sq8
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from pymilvus import Collection, CollectionSchema, DataType, FieldSchema, connections, utility
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from index_profiles import INDEX_PROFILES, build_search_params, is_binary_profile  # noqa: E402
+
+# 每种索引类型扫描的检索参数
+SWEEPS = {
+    "FLAT": [{}],
+    "IVF_FLAT": [{"nprobe": n} for n in (4, 8, 16, 32, 64, 128)],
+    "IVF_SQ8": [{"nprobe": n} for n in (4, 8, 16, 32, 64, 128)],
+    "IVF_PQ": [{"nprobe": n} for n in (4, 8, 16, 32, 64, 128)],
+    "HNSW": [{"ef": n} for n in (16, 32, 64, 128, 256, 512)],
+    "DISKANN": [{"search_list": n} for n in (16, 32, 64, 128, 256)],
+}
+
+
+def make_dataset(n, dim, n_queries, n_clusters=64, seed=0):
+    """带聚类结构的归一化向量，比均匀随机向量更接近真实嵌入分布"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, n_clusters, n + n_queries)
+    data = centers[labels] + 0.5 * rng.standard_normal((n + n_queries, dim)).astype(np.float32)
+    data /= np.linalg.norm(data, axis=1, keepdims=True)
+    return data[:n], data[n:]
+
+
+def ground_truth(vectors, queries, metric_type, k):
+    """暴力检索得到真实的 top-k"""
+    if metric_type == "L2":
+        scores = -(
+            (queries ** 2).sum(1, keepdims=True) - 2 * queries @ vectors.T + (vectors ** 2).sum(1)
+        )
+    else:
+        scores = queries @ vectors.T
+    top = np.argpartition(-scores, k, axis=1)[:, :k]
+    return [set(row) for row in top]
+
+
+def build_collection(name, profile, vectors, batch_size=10000):
+    if utility.has_collection(name):
+        utility.drop_collection(name)
+    fields = [
+        FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=False),
+        FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=vectors.shape[1]),
+    ]
+    collection = Collection(name=name, schema=CollectionSchema(fields=fields))
+    for start in range(0, len(vectors), batch_size):
+        end = min(start + batch_size, len(vectors))
+        collection.insert([list(range(start, end)), vectors[start:end]])
+    collection.flush()
+
+    start = time.perf_counter()
+    collection.create_index(
+        field_name="embedding",
+        index_params={
+            "metric_type": profile["metric_type"],
+            "index_type": profile["index_type"],
+            "params": profile["params"],
+        },
+    )
+    utility.wait_for_index_building_complete(name)
+    build_seconds = time.perf_counter() - start
+    collection.load()
+    return collection, build_seconds
+
+
+def run_sweep(collection, profile, queries, truth, k):
+    rows = []
+    for overrides in SWEEPS[profile["index_type"]]:
+        param = build_search_params(profile, overrides, k)
+        latencies = []
+        recalls = []
+        for query, expected in zip(queries, truth):
+            start = time.perf_counter()
+            hits = collection.search([query], "embedding", param, limit=k)[0]
+            latencies.append((time.perf_counter() - start) * 1000)
+            recalls.append(len(expected & set(hits.ids)) / k)
+        rows.append({
+            "search_params": overrides,
+            "recall_at_k": round(float(np.mean(recalls)), 4),
+            "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+            "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+            "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", default="19530")
+    parser.add_argument("--vectors", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument(
+        "--profiles",
+        nargs="+",
+        default=[name for name, p in sorted(INDEX_PROFILES.items()) if not is_binary_profile(p)],
+    )
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    connections.connect(host=args.host, port=args.port)
+    vectors, queries = make_dataset(args.vectors, args.dim, args.queries)
+    report = {"vectors": args.vectors, "dim": args.dim, "k": args.k, "profiles": {}}
+
+    for name in args.profiles:
+        profile = INDEX_PROFILES[name]
+        truth = ground_truth(vectors, queries, profile["metric_type"], args.k)
+        collection_name = f"bench_index_{name}"
+        try:
+            collection, build_seconds = build_collection(collection_name, profile, vectors)
+            rows = run_sweep(collection, profile, queries, truth, args.k)
+        except Exception as e:
+            print(f"{name}: failed ({e})")
+            continue
+        finally:
+            if utility.has_collection(collection_name):
+                utility.drop_collection(collection_name)
+
+        report["profiles"][name] = {"build_seconds": round(build_seconds, 2), "sweep": rows}
+        print(f"\n{name} ({profile['index_type']}, {profile['metric_type']}), build {build_seconds:.1f}s")
+        print(f"  {'search params':<24} {'recall@k':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for row in rows:
+            params = json.dumps(row["search_params"])
+            print(
+                f"  {params:<24} {row['recall_at_k']:>9.4f} {row['p50_ms']:>8.2f} "
+                f"{row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f}"
+            )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
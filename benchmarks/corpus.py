@@ -0,0 +1,182 @@
+"""基准测试语料：按固定随机种子生成的合成文档，或读取目录中的样例文档
+
+合成文档覆盖各解析器（md、csv、xml、docx、pdf、xlsx），文本由伪词表随机组成，
+同样的参数每次生成完全相同的文件。
+
+    python benchmarks/corpus.py --docs 100 --out /tmp/corpus
+"""
+import argparse
+import csv
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+SYNTHETIC_FORMATS = ("md", "csv", "xml", "docx", "pdf", "xlsx")
+# 需要 OCR 的图片不放进默认语料（依赖本机安装的 tesseract，耗时也不代表解析器本身）
+IMAGE_EXTENSIONS = {"jpg", "jpeg", "png", "bmp"}
+
+
+class TextGenerator:
+    """从伪词表中随机取词组成句子和段落"""
+
+    def __init__(self, seed=0, vocab_size=5000):
+        self.rng = np.random.default_rng(seed)
+        syllables = ["ka", "ro", "mi", "te", "su", "lan", "dor", "vi", "ne", "qua", "zel", "po", "rin", "ta", "mo"]
+        words = set()
+        while len(words) < vocab_size:
+            n = int(self.rng.integers(2, 5))
+            words.add("".join(self.rng.choice(syllables, n)))
+        self.vocab = np.array(sorted(words))
+        # 词频近似 Zipf 分布，让关键词检索的 IDF 更接近真实文本
+        weights = 1.0 / np.arange(1, vocab_size + 1)
+        self.weights = weights / weights.sum()
+
+    def words(self, n):
+        return list(self.rng.choice(self.vocab, n, p=self.weights))
+
+    def sentence(self, min_words=6, max_words=18):
+        words = self.words(int(self.rng.integers(min_words, max_words + 1)))
+        return " ".join(words).capitalize() + "."
+
+    def paragraph(self, n_words):
+        sentences = []
+        while n_words > 0:
+            sentence = self.sentence()
+            sentences.append(sentence)
+            n_words -= sentence.count(" ") + 1
+        return " ".join(sentences)
+
+    def title(self):
+        return " ".join(self.words(3)).title()
+
+
+def _sections(gen, doc_words, section_words=250):
+    """把一篇文档切成若干 (标题, 正文) 小节"""
+    n_sections = max(1, doc_words // section_words)
+    return [(gen.title(), gen.paragraph(section_words)) for _ in range(n_sections)]
+
+
+def write_md(path, gen, doc_words):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"# {gen.title()}\n\n")
+        for title, text in _sections(gen, doc_words):
+            f.write(f"## {title}\n\n{text}\n\n")
+
+
+def write_csv(path, gen, doc_words):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "name", "category", "price", "description"])
+        for i in range(max(1, doc_words // 20)):
+            writer.writerow([i, gen.title(), gen.words(1)[0], round(float(gen.rng.uniform(1, 500)), 2), gen.sentence()])
+
+
+def write_xml(path, gen, doc_words):
+    from xml.sax.saxutils import escape, quoteattr
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("<?xml version='1.0' encoding='utf-8'?>\n<document>\n")
+        for title, text in _sections(gen, doc_words):
+            f.write(f"  <section title={quoteattr(title)}>\n")
+            f.write(f"    <section title={quoteattr(gen.title())}><content>{escape(text)}</content></section>\n")
+            f.write("  </section>\n")
+        f.write("</document>\n")
+
+
+def write_docx(path, gen, doc_words):
+    import docx
+
+    document = docx.Document()
+    document.add_heading(gen.title(), level=1)
+    for title, text in _sections(gen, doc_words):
+        document.add_heading(title, level=2)
+        document.add_paragraph(text)
+    document.save(path)
+
+
+def write_pdf(path, gen, doc_words):
+    import fitz
+
+    document = fitz.open()
+    for title, text in _sections(gen, doc_words):
+        page = document.new_page()
+        page.insert_text((72, 72), title, fontsize=16)
+        page.insert_textbox(fitz.Rect(72, 100, 523, 770), text, fontsize=10)
+    document.save(path)
+    document.close()
+
+
+def write_xlsx(path, gen, doc_words):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("items")
+    sheet.append(["id", "name", "category", "description"])
+    for i in range(max(1, doc_words // 20)):
+        sheet.append([i, gen.title(), gen.words(1)[0], gen.sentence()])
+    workbook.save(path)
+
+
+WRITERS = {
+    "md": write_md,
+    "csv": write_csv,
+    "xml": write_xml,
+    "docx": write_docx,
+    "pdf": write_pdf,
+    "xlsx": write_xlsx,
+}
+
+
+def generate_synthetic(out_dir, docs, formats=SYNTHETIC_FORMATS, doc_words=1000, seed=0):
+    """在 out_dir 中生成 docs 篇文档（各格式轮流），返回文件路径列表"""
+    unknown = set(formats) - set(WRITERS)
+    if unknown:
+        raise ValueError(f"Unsupported synthetic formats: {sorted(unknown)}, expected {list(WRITERS)}")
+    os.makedirs(out_dir, exist_ok=True)
+    gen = TextGenerator(seed)
+    paths = []
+    for i in range(docs):
+        extension = formats[i % len(formats)]
+        path = os.path.join(out_dir, f"doc_{i:05d}.{extension}")
+        WRITERS[extension](path, gen, doc_words)
+        paths.append(path)
+    return paths
+
+
+def load_directory(path, include_images=False):
+    """样例语料：目录（递归）中所有支持的文件"""
+    from parsers import SUPPORTED_EXTENSIONS
+
+    paths = []
+    for root, _, files in os.walk(path):
+        for name in sorted(files):
+            extension = name.rsplit(".", 1)[-1].lower()
+            if extension not in SUPPORTED_EXTENSIONS:
+                continue
+            if extension in IMAGE_EXTENSIONS and not include_images:
+                continue
+            paths.append(os.path.join(root, name))
+    if not paths:
+        raise ValueError(f"No supported documents found in {path}")
+    return sorted(paths)
+
+
+def query_texts(prefix, n, seed=1):
+    """检索用的查询文本：各不相同，不会命中结果缓存"""
+    gen = TextGenerator(seed)
+    return [f"{prefix} {i} " + " ".join(gen.words(6)) for i in range(n)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic benchmark corpus")
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--docs", type=int, default=100)
+    parser.add_argument("--formats", nargs="+", default=list(SYNTHETIC_FORMATS))
+    parser.add_argument("--doc-words", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    files = generate_synthetic(args.out, args.docs, args.formats, args.doc_words, args.seed)
+    print(f"Wrote {len(files)} documents to {args.out}")
@@ -0,0 +1,152 @@
+"""检索接口压测：用桩 Ollama 和桩 Milvus 启动后端，测量高并发下 /search/ 的延迟分布
+
+桩 Milvus 的检索是带延迟的阻塞调用（与 pymilvus 的同步 gRPC 调用一样），
+查询嵌入走真实的 AsyncEmbeddingClient -> 桩 Ollama。
+
+    python benchmarks/load_test.py --concurrency 50 100 200 --requests 2000
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+
+import httpx
+import numpy as np
+import uvicorn
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import main  # noqa: E402
+
+# 本机环境可能配置了 HTTP(S)_PROXY，本地桩服务不走代理
+os.environ["NO_PROXY"] = "127.0.0.1,localhost"
+from embedding_cache import EmbeddingCache  # noqa: E402
+from embedding_client import AsyncEmbeddingClient, EmbeddingClient  # noqa: E402
+from stub_ollama import start_stub_server  # noqa: E402
+from tenants import TenantRegistry  # noqa: E402
+
+
+class StubMilvusStore:
+    """只实现检索接口所需的部分；search 阻塞 milvus_latency 秒后返回固定结果"""
+
+    def __init__(self, ollama_url, dim, milvus_latency):
+        self.model_name = "stub"
+        self.metric_type = "COSINE"
+        self.generation = 0
+        self.lexical_index = None
+        self.milvus_latency = milvus_latency
+        self.embedder = EmbeddingClient(url=ollama_url, model_name=self.model_name, dim=dim)
+        self.async_embedder = AsyncEmbeddingClient(
+            url=ollama_url, model_name=self.model_name, dim=dim, max_connections=64
+        )
+        self.embedding_cache = EmbeddingCache(path=None)
+
+    async def aget_embeddings(self, texts):
+        return await self.embedding_cache.aget_or_compute(
+            self.model_name, texts, self.async_embedder.embed, dim=self.embedder.dim
+        )
+
+    def get_embeddings(self, texts):
+        return self.embedding_cache.get_or_compute(
+            self.model_name, texts, self.embedder.embed, dim=self.embedder.dim
+        )
+
+    def search(self, query, k=5, expr=None, search_params=None, mode="dense", query_embedding=None):
+        if query_embedding is None:
+            query_embedding = self.get_embeddings([query])[0]
+        time.sleep(self.milvus_latency)
+        return [
+            {"id": i, "text": f"chunk {i}", "metadata": {}, "score": 1.0 - i / 100} for i in range(k)
+        ]
+
+    async def aclose(self):
+        await self.async_embedder.aclose()
+        self.embedder.close()
+
+
+def start_backend(port, store):
+    # 不执行正常的启动流程（会连接真实的 Milvus），直接注入桩向量库
+    main.app.router.on_startup.clear()
+    main.app.router.on_shutdown.clear()
+    main.tenants = TenantRegistry(main.settings, stores={main.settings.default_tenant: store})
+    config = uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+
+async def run_level(base_url, concurrency, total, offset):
+    """concurrency 个客户端协程共发送 total 个请求（查询各不相同，不命中结果缓存）"""
+    latencies = []
+    statuses = {}
+    counter = iter(range(offset, offset + total))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        async def worker():
+            for i in counter:
+                start = time.perf_counter()
+                response = await client.post("/search/", json={"query": f"load test query {i}", "k": 5})
+                latencies.append((time.perf_counter() - start) * 1000)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "throughput": total / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "statuses": statuses,
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 50, 100, 200])
+    parser.add_argument("--requests", type=int, default=2000, help="每个并发级别的请求数")
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--ollama-latency", type=float, default=0.02, help="桩 Ollama 每次请求的延迟（秒）")
+    parser.add_argument("--milvus-latency", type=float, default=0.01, help="桩 Milvus 每次检索的延迟（秒）")
+    parser.add_argument("--port", type=int, default=18081)
+    args = parser.parse_args()
+    # 逐请求的访问日志会明显影响压测结果
+    logging.disable(logging.INFO)
+
+    ollama, ollama_url = start_stub_server(dim=args.dim, latency=args.ollama_latency)
+    store = StubMilvusStore(f"{ollama_url}/api/embeddings", args.dim, args.milvus_latency)
+    server, thread = start_backend(args.port, store)
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    print(
+        f"ollama latency {args.ollama_latency * 1000:.0f}ms, milvus latency {args.milvus_latency * 1000:.0f}ms, "
+        f"{main.settings.blocking_workers} blocking workers, "
+        f"max {main.settings.max_concurrent_searches} concurrent searches"
+    )
+    print(f"{'concurrency':>11} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}  statuses")
+    offset = 0
+    for concurrency in args.concurrency:
+        row = asyncio.run(run_level(base_url, concurrency, args.requests, offset))
+        offset += args.requests
+        print(
+            f"{row['concurrency']:>11} {row['throughput']:>8.1f} {row['p50_ms']:>8.1f} "
+            f"{row['p99_ms']:>8.1f}  {row['statuses']}"
+        )
+
+    server.should_exit = True
+    thread.join()
+    ollama.shutdown()
+
+
+if __name__ == "__main__":
+    main_cli()
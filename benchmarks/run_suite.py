@@ -0,0 +1,566 @@
+"""端到端基准测试套件：入库吞吐、检索延迟分位数和 recall@k，结果输出为 JSON
+
+在子进程中启动桩 Ollama 和真实的后端服务（uvicorn main:app，数据目录在临时目录中，
+向量库可选本地后端或 Milvus），记录服务到 /live、/ready 返回 200 的冷启动耗时，然后：
+  1. 入库：通过 /upload/ 上传语料并等待全部任务完成，统计 docs/s、chunks/s 和服务进程（含解析子进程）的峰值 RSS；
+  2. 延迟：在固定并发下压测 /search/，统计吞吐和 p50/p90/p95/p99；
+  3. 召回：对一组查询调用 /search/，与对库中全部向量暴力检索得到的 top-k 比较，计算 recall@k
+     （桩 Ollama 的向量由文本哈希决定，库中每个块的向量可以在本地精确复现）。
+
+    python benchmarks/run_suite.py --docs 200 --backend local --index-profile ivf_flat --json results.json
+    python benchmarks/run_suite.py --corpus-dir ~/samples --concurrency 1 16 64 --json results.json
+    python benchmarks/run_suite.py --compare base.json results.json
+
+--compare 比较两次结果（例如两个提交各跑一次），任一指标退化超过 --tolerance 时退出码为 1。
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+BACKEND_DIR = os.path.join(ROOT_DIR, "backend")
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from corpus import SYNTHETIC_FORMATS, generate_synthetic, load_directory, query_texts  # noqa: E402
+from stub_ollama import fake_embedding  # noqa: E402
+
+SUITE_VERSION = 1
+BENCH_COLLECTION = "bench_suite"
+
+# --compare 比较的指标：(路径, 越大越好)
+COMPARED_METRICS = [
+    (("ingest", "docs_per_second"), True),
+    (("ingest", "chunks_per_second"), True),
+    (("ingest", "peak_rss_mb"), False),
+    (("recall", "recall_at_k"), True),
+    (("startup", "live_seconds"), False),
+    (("startup", "ready_seconds"), False),
+]
+COMPARED_SEARCH_METRICS = [("throughput", True), ("p50_ms", False), ("p95_ms", False), ("p99_ms", False)]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until(check, timeout, what, interval=0.2):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if check():
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(interval)
+    raise TimeoutError(f"{what} did not become ready within {timeout}s")
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = bool(subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT_DIR, capture_output=True, text=True
+        ).stdout.strip())
+        return {"commit": commit, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+def _rss_kb(pid, field="VmRSS"):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def process_tree(pid):
+    """pid 及其全部子孙进程（读取 /proc，只支持 Linux）"""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # 进程名可能包含空格，ppid 在最后一个 ')' 之后的第二个字段
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    tree, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        tree.append(current)
+        stack.extend(children.get(current, []))
+    return tree
+
+
+class RSSSampler:
+    """后台线程定期采样服务进程树的总 RSS，记录峰值"""
+
+    def __init__(self, pid, interval=0.1):
+        self.pid = pid
+        self.interval = interval
+        self.supported = os.path.isdir("/proc")
+        self.peak_kb = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def sample(self):
+        return sum(_rss_kb(pid) for pid in process_tree(self.pid))
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_kb = max(self.peak_kb, self.sample())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        if self.supported:
+            self.peak_kb = 0
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self.supported:
+            self._stop.set()
+            self._thread.join()
+
+    def peak_mb(self):
+        return round(self.peak_kb / 1024, 1) if self.supported else None
+
+    def server_hwm_mb(self):
+        """服务主进程自身的 RSS 高水位（VmHWM）"""
+        return round(_rss_kb(self.pid, "VmHWM") / 1024, 1) if self.supported else None
+
+
+class Services:
+    """桩 Ollama 和后端服务子进程"""
+
+    def __init__(self, args, work_dir):
+        self.args = args
+        self.work_dir = work_dir
+        self.port = args.port or free_port()
+        # 桩 Ollama 使用随机端口，不与本机真实的 Ollama 冲突
+        self.ollama_port = free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self.stub = None
+        self.server = None
+        self.server_log = None
+        self.startup = {}
+
+    def start(self):
+        env = dict(os.environ)
+        # 本机环境可能配置了 HTTP(S)_PROXY，本地桩服务不走代理
+        env["NO_PROXY"] = env["no_proxy"] = "127.0.0.1,localhost"
+        self.stub = subprocess.Popen(
+            [sys.executable, os.path.join(BENCH_DIR, "stub_ollama.py"), "--port", str(self.ollama_port),
+             "--dim", str(self.args.dim), "--latency", str(self.args.ollama_latency)],
+            stdout=subprocess.DEVNULL,
+        )
+        wait_until(
+            lambda: httpx.post(
+                f"http://127.0.0.1:{self.ollama_port}/api/embeddings", json={"prompt": "ping"}, trust_env=False
+            ).status_code == 200,
+            30,
+            "stub Ollama",
+        )
+
+        env.update({
+            "PYTHONPATH": BACKEND_DIR + os.pathsep + env.get("PYTHONPATH", ""),
+            "RAG_VECTOR_BACKEND": self.args.backend,
+            "RAG_LOCAL_STORE_PATH": os.path.join(self.work_dir, "data", "local_store"),
+            "RAG_COLLECTION": self.args.collection,
+            "RAG_INDEX_PROFILE": self.args.index_profile,
+            "RAG_UPLOAD_SPOOL_DIR": os.path.join(self.work_dir, "data", "uploads"),
+            "RAG_STATE_DIR": os.path.join(self.work_dir, "data", "state"),
+            "RAG_OLLAMA_URL": f"http://127.0.0.1:{self.ollama_port}/api/embeddings",
+            "RAG_LLM_URL": f"http://127.0.0.1:{self.ollama_port}/api/generate",
+        })
+        # 服务日志写入文件：逐请求的访问日志输出到终端会影响压测结果
+        self.server_log = open(os.path.join(self.work_dir, "server.log"), "wb")
+        start = time.perf_counter()
+        self.server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(self.port),
+             "--log-level", "warning", "--no-access-log"],
+            cwd=self.work_dir,  # 嵌入缓存、关键词索引等默认写到 data/ 下
+            env=env,
+            stdout=self.server_log,
+            stderr=subprocess.STDOUT,
+        )
+
+        def responds(path):
+            if self.server.poll() is not None:
+                raise RuntimeError(f"Backend exited with code {self.server.returncode}, see {self.server_log.name}")
+            return httpx.get(f"{self.base_url}{path}", trust_env=False).status_code == 200
+
+        # 冷启动耗时：进程启动到可以接收请求（/live）和向量库加载完成（/ready）
+        for name, path in (("live", "/live"), ("ready", "/ready")):
+            wait_until(lambda: responds(path), self.args.startup_timeout, f"Backend {path}", interval=0.01)
+            self.startup[f"{name}_seconds"] = round(time.perf_counter() - start, 3)
+
+    def stop(self):
+        for process in (self.server, self.stub):
+            if process is None or process.poll() is not None:
+                continue
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+        if self.server_log is not None:
+            self.server_log.close()
+
+
+def ingest(client, files, upload_batch, sampler):
+    """上传全部文件并等待入库完成（最后 /flush，保证之后的检索能读到全部数据）"""
+    job_ids = []
+    with sampler:
+        start = time.perf_counter()
+        for i in range(0, len(files), upload_batch):
+            batch = files[i:i + upload_batch]
+            handles = [open(path, "rb") for path in batch]
+            try:
+                response = client.post(
+                    "/upload/", files=[("files", (os.path.basename(p), h)) for p, h in zip(batch, handles)]
+                )
+            finally:
+                for handle in handles:
+                    handle.close()
+            response.raise_for_status()
+            job_ids.append(response.json()["job_id"])
+
+        jobs = {}
+        pending = list(job_ids)
+        while pending:
+            for job_id in list(pending):
+                job = client.get(f"/jobs/{job_id}").json()
+                if job["status"] in ("completed", "failed"):
+                    jobs[job_id] = job
+                    pending.remove(job_id)
+            if pending:
+                time.sleep(0.1)
+        client.post("/flush").raise_for_status()
+        elapsed = time.perf_counter() - start
+
+    chunks = sum(job["inserted"] for job in jobs.values())
+    errors = [error for job in jobs.values() for error in job["errors"]]
+    stages = {}
+    for job in jobs.values():
+        for stage, stats in job["stages"].items():
+            total = stages.setdefault(stage, {"items": 0, "seconds": 0.0})
+            total["items"] += stats["items"]
+            total["seconds"] += stats["seconds"]
+    return {
+        "docs": len(files),
+        "bytes": sum(os.path.getsize(path) for path in files),
+        "chunks": chunks,
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "seconds": round(elapsed, 3),
+        "docs_per_second": round(len(files) / elapsed, 2),
+        "chunks_per_second": round(chunks / elapsed, 2),
+        "peak_rss_mb": sampler.peak_mb(),
+        # 各阶段的累计忙碌时间（多个文件并行处理，总和可以超过墙钟时间）
+        "stages": {stage: {"items": s["items"], "seconds": round(s["seconds"], 3)} for stage, s in stages.items()},
+    }
+
+
+def percentiles(latencies):
+    values = np.asarray(latencies)
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p90_ms": round(float(np.percentile(values, 90)), 2),
+        "p95_ms": round(float(np.percentile(values, 95)), 2),
+        "p99_ms": round(float(np.percentile(values, 99)), 2),
+        "mean_ms": round(float(values.mean()), 2),
+        "max_ms": round(float(values.max()), 2),
+    }
+
+
+async def run_level(base_url, queries, concurrency, payload):
+    """concurrency 个客户端协程发送全部查询，返回每个请求的 (延迟毫秒, 状态码, 响应)"""
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    results = [None] * len(queries)
+    counter = iter(range(len(queries)))
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120, trust_env=False) as client:
+        async def worker():
+            for i in counter:
+                start = time.perf_counter()
+                response = await client.post("/search/", json={"query": queries[i], **payload})
+                latency = (time.perf_counter() - start) * 1000
+                body = response.json() if response.status_code == 200 else None
+                results[i] = (latency, response.status_code, body)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return results, elapsed
+
+
+def search_latency(base_url, args, sampler):
+    rows = []
+    offset = 0
+    for mode in args.modes:
+        for concurrency in args.concurrency:
+            # 每个级别使用不同的查询，不命中结果缓存和嵌入缓存
+            queries = query_texts(f"latency {mode} c{concurrency}", args.requests + args.warmup, seed=offset + 2)
+            offset += 1
+            payload = {"k": args.k, "mode": mode}
+            asyncio.run(run_level(base_url, queries[:args.warmup], concurrency, payload))
+            with sampler:
+                results, elapsed = asyncio.run(run_level(base_url, queries[args.warmup:], concurrency, payload))
+            ok = [latency for latency, status, _ in results if status == 200]
+            statuses = {}
+            for _, status, _ in results:
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+            rows.append({
+                "mode": mode,
+                "concurrency": concurrency,
+                "requests": len(results),
+                "errors": len(results) - len(ok),
+                "statuses": statuses,
+                "throughput": round(len(results) / elapsed, 2),
+                **(percentiles(ok) if ok else {}),
+                "peak_rss_mb": sampler.peak_mb(),
+            })
+            print(
+                f"  {mode:<7} c={concurrency:<4} {rows[-1]['throughput']:>8.1f} req/s "
+                f"p50 {rows[-1].get('p50_ms', float('nan')):>7.1f}ms p99 {rows[-1].get('p99_ms', float('nan')):>7.1f}ms "
+                f"errors {rows[-1]['errors']}"
+            )
+    return rows
+
+
+def recall_hits(base_url, args):
+    """召回测试的查询及服务返回的主键"""
+    queries = query_texts("recall", args.recall_queries, seed=1)
+    results, _ = asyncio.run(run_level(base_url, queries, 8, {"k": args.k, "mode": "dense"}))
+    hits = []
+    for latency, status, body in results:
+        if status != 200:
+            raise RuntimeError(f"Recall query failed with status {status}")
+        hits.append([hit["id"] for hit in body["results"]])
+    return queries, hits
+
+
+def stored_chunks(args, work_dir):
+    """服务停止后直接打开后端，读取库中全部块的主键和文本"""
+    if args.backend == "local":
+        from local_store import LocalBackend
+        backend = LocalBackend(os.path.join(work_dir, "data", "local_store"), index_profile=args.index_profile)
+    else:
+        from milvus_store import MilvusBackend
+        backend = MilvusBackend(collection_name=args.collection, index_profile=args.index_profile)
+        backend.prepare(backend.existing_dim())
+    try:
+        rows = list(backend.query("id >= 0", ["text"]))
+        return [row["id"] for row in rows], [row["text"] for row in rows], backend.metric_type
+    finally:
+        backend.close()
+
+
+def brute_force_recall(queries, hits, ids, texts, metric_type, dim, k):
+    """以暴力检索的真实 top-k 为基准计算 recall@k"""
+    vectors = np.array([fake_embedding(text, dim) for text in texts], dtype=np.float32)
+    query_vectors = np.array([fake_embedding(query, dim) for query in queries], dtype=np.float32)
+    if metric_type == "L2":
+        scores = -((query_vectors ** 2).sum(1, keepdims=True) - 2 * query_vectors @ vectors.T + (vectors ** 2).sum(1))
+    else:
+        # 桩向量已经归一化，COSINE 与 IP 等价
+        scores = query_vectors @ vectors.T
+    k = min(k, len(ids))
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    ids = np.asarray(ids)
+    recalls = [len(set(ids[row]) & set(found[:k])) / k for row, found in zip(top, hits)]
+    return {
+        "k": k,
+        "queries": len(queries),
+        "corpus_chunks": len(ids),
+        "metric_type": metric_type,
+        "recall_at_k": round(float(np.mean(recalls)), 4),
+        "min_recall": round(float(np.min(recalls)), 4),
+    }
+
+
+def run(args):
+    work_dir = tempfile.mkdtemp(prefix="rag_bench_")
+    report = {
+        "suite_version": SUITE_VERSION,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git": git_revision(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "config": {key: value for key, value in vars(args).items() if key not in ("compare", "json")},
+    }
+    services = Services(args, work_dir)
+    try:
+        if args.corpus_dir:
+            files = load_directory(args.corpus_dir)
+            report["corpus"] = {"kind": "directory", "path": os.path.abspath(args.corpus_dir)}
+        else:
+            files = generate_synthetic(
+                os.path.join(work_dir, "corpus"), args.docs, args.formats, args.doc_words, args.seed
+            )
+            report["corpus"] = {"kind": "synthetic", "formats": args.formats, "doc_words": args.doc_words}
+        report["corpus"]["files"] = len(files)
+        print(f"Corpus: {len(files)} files, work dir {work_dir}")
+
+        if args.backend == "milvus":
+            # 每次运行使用全新的集合
+            from pymilvus import connections, utility
+            connections.connect(host="localhost", port="19530")
+            if utility.has_collection(args.collection):
+                utility.drop_collection(args.collection)
+
+        services.start()
+        report["startup"] = services.startup
+        print(f"Startup: /live after {services.startup['live_seconds']}s, /ready after {services.startup['ready_seconds']}s")
+        sampler = RSSSampler(services.server.pid)
+        with httpx.Client(base_url=services.base_url, timeout=300, trust_env=False) as client:
+            print("Ingest ...")
+            report["ingest"] = ingest(client, files, args.upload_batch, sampler)
+            print(
+                f"  {report['ingest']['docs_per_second']} docs/s, {report['ingest']['chunks_per_second']} chunks/s, "
+                f"{report['ingest']['chunks']} chunks, peak RSS {report['ingest']['peak_rss_mb']} MB, "
+                f"errors {report['ingest']['errors']}"
+            )
+            print("Search latency ...")
+            report["search"] = search_latency(services.base_url, args, sampler)
+            print("Recall ...")
+            queries, hits = recall_hits(services.base_url, args)
+        report["server_peak_rss_mb"] = sampler.server_hwm_mb()
+        services.stop()
+
+        ids, texts, metric_type = stored_chunks(args, work_dir)
+        report["recall"] = brute_force_recall(queries, hits, ids, texts, metric_type, args.dim, args.k)
+        print(f"  recall@{report['recall']['k']} = {report['recall']['recall_at_k']} ({metric_type})")
+    finally:
+        services.stop()
+        if args.backend == "milvus" and not args.keep:
+            try:
+                from pymilvus import utility
+                if utility.has_collection(args.collection):
+                    utility.drop_collection(args.collection)
+            except Exception as e:
+                print(f"Failed to drop benchmark collection {args.collection}: {e}")
+        if args.keep:
+            print(f"Kept work dir {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return report
+
+
+def _get(report, path):
+    for key in path:
+        if not isinstance(report, dict) or key not in report:
+            return None
+        report = report[key]
+    return report
+
+
+def compare(base, new, tolerance):
+    """逐项比较两次结果，返回退化的指标列表"""
+    rows = [(".".join(path), _get(base, path), _get(new, path), higher) for path, higher in COMPARED_METRICS]
+    base_levels = {(row["mode"], row["concurrency"]): row for row in base.get("search", [])}
+    for row in new.get("search", []):
+        base_row = base_levels.get((row["mode"], row["concurrency"]))
+        if base_row is None:
+            continue
+        for name, higher in COMPARED_SEARCH_METRICS:
+            rows.append((f"search.{row['mode']}.c{row['concurrency']}.{name}", base_row.get(name), row.get(name), higher))
+
+    regressions = []
+    print(f"{'metric':<36} {'base':>10} {'new':>10} {'change':>8}")
+    for name, old, current, higher in rows:
+        if not old or current is None:
+            continue
+        change = (current - old) / old
+        worse = -change if higher else change
+        flag = ""
+        if worse > tolerance:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:<36} {old:>10} {current:>10} {change:>+7.1%}{flag}")
+    for key in ("git", "config"):
+        if base.get(key) != new.get(key):
+            print(f"note: {key} differs between runs")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    corpus = parser.add_argument_group("corpus")
+    corpus.add_argument("--corpus-dir", help="样例文档目录；不指定时生成合成语料")
+    corpus.add_argument("--docs", type=int, default=60, help="合成文档数")
+    corpus.add_argument("--formats", nargs="+", default=list(SYNTHETIC_FORMATS))
+    corpus.add_argument("--doc-words", type=int, default=1000, help="每篇合成文档的词数")
+    corpus.add_argument("--seed", type=int, default=0)
+    service = parser.add_argument_group("services")
+    service.add_argument("--backend", choices=("local", "milvus"), default="local")
+    service.add_argument("--collection", default=BENCH_COLLECTION, help="Milvus 集合名（运行前会被清空）")
+    service.add_argument("--index-profile", default="hnsw")
+    service.add_argument("--dim", type=int, default=1024)
+    service.add_argument("--ollama-latency", type=float, default=0.0, help="桩 Ollama 每次请求的延迟（秒）")
+    service.add_argument("--port", type=int, default=0, help="后端端口，默认随机")
+    service.add_argument("--startup-timeout", type=float, default=120)
+    load = parser.add_argument_group("search")
+    load.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    load.add_argument("--requests", type=int, default=300, help="每个并发级别的请求数")
+    load.add_argument("--warmup", type=int, default=20)
+    load.add_argument("--modes", nargs="+", choices=("dense", "hybrid"), default=["dense"])
+    load.add_argument("--k", type=int, default=10)
+    load.add_argument("--recall-queries", type=int, default=200)
+    parser.add_argument("--upload-batch", type=int, default=16, help="每次 /upload/ 请求的文件数")
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    parser.add_argument("--keep", action="store_true", help="保留临时目录（语料、数据和服务日志）和 Milvus 集合")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="比较两份结果 JSON")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="--compare 允许的相对退化")
+    args = parser.parse_args()
+
+    if args.compare:
+        reports = []
+        for path in args.compare:
+            with open(path, encoding="utf-8") as f:
+                reports.append(json.load(f))
+        regressions = compare(*reports, args.tolerance)
+        sys.exit(1 if regressions else 0)
+
+    report = run(args)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Wrote {args.json}")
+    else:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""冷启动基准：导入耗时、到第一个请求的耗时和到就绪的耗时，超出预算时退出码为 1
+
+  1. 导入：在全新的解释器中 `import main`，取多次运行的中位数；并用 -X importtime 列出最慢的后端模块；
+  2. 检查 `import main` 没有导入任何解析库（fitz、pandas、docx 等应在第一次解析对应文件时才加载）；
+  3. 启动：用 `python main.py` 启动服务（本地向量后端 + 桩 Ollama，数据目录在临时目录中），
+     统计进程启动到 /live 返回 200（可以接收请求）和 /ready 返回 200（向量库加载完成）的时间。
+
+    python benchmarks/startup_time.py
+    python benchmarks/startup_time.py --runs 10 --import-budget-ms 800 --json startup.json
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(os.path.dirname(BENCH_DIR), "backend")
+sys.path.insert(0, BENCH_DIR)
+
+from run_suite import free_port  # noqa: E402
+from stub_ollama import start_stub_server  # noqa: E402
+
+# 只应在解析或重排时才导入的重量级模块
+LAZY_MODULES = (
+    "fitz", "pymupdf", "pandas", "openpyxl", "lxml", "docx", "markdown", "PIL", "pytesseract",
+    "sentence_transformers", "torch",
+)
+
+
+def _python(code):
+    return subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+
+
+def import_seconds(runs):
+    """在全新的解释器中导入 main 的耗时（秒），每次运行一个"""
+    code = "import time; start = time.perf_counter(); import main; print(time.perf_counter() - start)"
+    return [float(_python(code).stdout.strip().splitlines()[-1]) for _ in range(runs)]
+
+
+def slowest_imports(top):
+    """-X importtime 输出中累计耗时最多的后端模块和第三方包（只看 main 直接导入的顶层模块）"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # 缩进两格的是 main 直接导入的模块
+        if name.startswith("   ") and not name.startswith("    "):
+            rows.append((name.strip(), int(cumulative) / 1000))
+    rows.sort(key=lambda row: row[1], reverse=True)
+    return [{"module": name, "ms": round(ms, 1)} for name, ms in rows[:top]]
+
+
+def eagerly_imported():
+    code = f"import sys, main; print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    output = _python(code).stdout.strip().splitlines()
+    return [name for name in (output[-1] if output else "").split(",") if name]
+
+
+def serve_startup(args):
+    """启动 python main.py，返回到 /live、/ready 返回 200 的秒数"""
+    work_dir = tempfile.mkdtemp(prefix="rag_startup_")
+    stub, stub_url = start_stub_server(dim=args.dim)
+    port = free_port()
+    env = dict(os.environ)
+    env.update({
+        "NO_PROXY": "127.0.0.1,localhost",
+        "no_proxy": "127.0.0.1,localhost",
+        "PYTHONPATH": BACKEND_DIR + os.pathsep + env.get("PYTHONPATH", ""),
+        "RAG_HOST": "127.0.0.1",
+        "RAG_PORT": str(port),
+        "RAG_LOG_LEVEL": "warning",
+        "RAG_ACCESS_LOG": "0",
+        "RAG_VECTOR_BACKEND": "local",
+        "RAG_OLLAMA_URL": f"{stub_url}/api/embeddings",
+        "RAG_LOCAL_STORE_PATH": os.path.join(work_dir, "data", "local_store"),
+        "RAG_LEXICAL_INDEX_PATH": os.path.join(work_dir, "data", "lexical_index.npz"),
+        "RAG_EMBEDDING_CACHE_PATH": os.path.join(work_dir, "data", "embedding_cache.sqlite3"),
+        "RAG_UPLOAD_SPOOL_DIR": os.path.join(work_dir, "data", "uploads"),
+        "RAG_STATE_DIR": os.path.join(work_dir, "data", "state"),
+    })
+    base_url = f"http://127.0.0.1:{port}"
+    log = open(os.path.join(work_dir, "server.log"), "wb")
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(BACKEND_DIR, "main.py")], cwd=work_dir, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    timings = {}
+    try:
+        with httpx.Client(base_url=base_url, timeout=5, trust_env=False) as client:
+            for name, path in (("live", "/live"), ("ready", "/ready")):
+                deadline = time.monotonic() + args.timeout
+                while True:
+                    if server.poll() is not None:
+                        raise RuntimeError(f"Backend exited with code {server.returncode}, see {log.name}")
+                    if time.monotonic() > deadline:
+                        raise TimeoutError(f"{path} did not return 200 within {args.timeout}s")
+                    try:
+                        if client.get(path).status_code == 200:
+                            break
+                    except httpx.HTTPError:
+                        pass
+                    time.sleep(0.01)
+                timings[f"{name}_seconds"] = round(time.perf_counter() - start, 3)
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        log.close()
+        stub.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="导入耗时的测量次数")
+    parser.add_argument("--top", type=int, default=10, help="列出最慢的 N 个顶层导入")
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--import-budget-ms", type=float, default=400.0, help="import main 的耗时预算（中位数）")
+    parser.add_argument("--live-budget-ms", type=float, default=500.0, help="进程启动到 /live 返回 200 的耗时预算")
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    samples = import_seconds(args.runs)
+    report = {
+        "import_ms": round(statistics.median(samples) * 1000, 1),
+        "import_samples_ms": [round(s * 1000, 1) for s in samples],
+        "slowest_imports": slowest_imports(args.top),
+        "eager_heavy_modules": eagerly_imported(),
+        **serve_startup(args),
+    }
+    report["budgets"] = {"import_ms": args.import_budget_ms, "live_ms": args.live_budget_ms}
+
+    print(f"import main: {report['import_ms']} ms (median of {args.runs})")
+    for row in report["slowest_imports"]:
+        print(f"  {row['module']:<28} {row['ms']:>8.1f} ms")
+    print(f"/live after {report['live_seconds'] * 1000:.0f} ms, /ready after {report['ready_seconds'] * 1000:.0f} ms")
+
+    failures = []
+    if report["eager_heavy_modules"]:
+        failures.append(f"import main loads parser modules eagerly: {report['eager_heavy_modules']}")
+    if report["import_ms"] > args.import_budget_ms:
+        failures.append(f"import main took {report['import_ms']} ms > {args.import_budget_ms} ms")
+    if report["live_seconds"] * 1000 > args.live_budget_ms:
+        failures.append(f"/live took {report['live_seconds'] * 1000:.0f} ms > {args.live_budget_ms} ms")
+    report["failures"] = failures
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Wrote {args.json}")
+    for failure in failures:
+        print(f"OVER BUDGET: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""本地 Ollama 嵌入服务桩，用于基准测试
+
+支持 /api/embeddings（单条 prompt）和 /api/embed（批量 input），
+返回由文本哈希决定的确定性向量，并可模拟每次请求的延迟。
+/api/generate 按 Ollama 的 NDJSON 流式格式逐词返回一段确定性的回答（复述提示词中的问题），
+可以代替生成模型测试 /ask。
+
+    python benchmarks/stub_ollama.py --port 11434 --dim 768 --latency 0.02 --token-latency 0.01
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+def fake_embedding(text: str, dim: int) -> list:
+    """根据文本生成确定性的单位向量"""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:4], "little")
+    vector = np.random.RandomState(seed).standard_normal(dim).astype(np.float32)
+    vector /= np.linalg.norm(vector)
+    return vector.tolist()
+
+
+def fake_answer(prompt: str) -> list:
+    """桩模型的回答：复述提示词最后一行（问题），拆成逐词输出的片段"""
+    lines = [line for line in prompt.splitlines() if line.strip()]
+    question = next((line for line in reversed(lines) if not line.startswith("回答")), "")
+    words = f"Stub answer to: {question} [1]".split(" ")
+    return [word if i == 0 else " " + word for i, word in enumerate(words)]
+
+
+def make_handler(dim: int, latency: float, token_latency: float = 0.0):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # 支持 keep-alive
+        disable_nagle_algorithm = True  # 避免头部与正文分包写入时的延迟确认
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            if latency:
+                time.sleep(latency)
+
+            if self.path.rstrip("/") == "/api/embed":
+                inputs = payload.get("input", [])
+                if isinstance(inputs, str):
+                    inputs = [inputs]
+                body = {"embeddings": [fake_embedding(t, dim) for t in inputs]}
+            elif self.path.rstrip("/") == "/api/embeddings":
+                body = {"embedding": fake_embedding(payload.get("prompt", ""), dim)}
+            elif self.path.rstrip("/") == "/api/generate":
+                self.generate(payload)
+                return
+            else:
+                self.send_error(404)
+                return
+
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def generate(self, payload):
+            prompt = payload.get("prompt", "")
+            pieces = fake_answer(prompt)
+            done = {
+                "model": payload.get("model", "stub"),
+                "done": True,
+                "prompt_eval_count": len(prompt.split()),
+                "eval_count": len(pieces),
+            }
+            if not payload.get("stream", True):
+                data = json.dumps({**done, "response": "".join(pieces)}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                return
+
+            # 分块传输编码，每个片段一行 JSON
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            messages = [{"model": done["model"], "response": piece, "done": False} for piece in pieces] + [done]
+            for i, message in enumerate(messages):
+                if i and token_latency:
+                    time.sleep(token_latency)
+                line = json.dumps(message).encode("utf-8") + b"\n"
+                self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+
+class StubServer(ThreadingHTTPServer):
+    # 默认的 listen backlog 只有 5，高并发压测时新连接会被丢弃并等待 SYN 重传
+    request_queue_size = 1024
+
+
+def start_stub_server(host="127.0.0.1", port=0, dim=768, latency=0.0, token_latency=0.0):
+    """在后台线程中启动桩服务，返回 (server, base_url)"""
+    server = StubServer((host, port), make_handler(dim, latency, token_latency))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub Ollama embedding server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--latency", type=float, default=0.02, help="每次请求的模拟延迟（秒）")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="/api/generate 每个片段之间的延迟（秒）")
+    args = parser.parse_args()
+
+    server, url = start_stub_server(args.host, args.port, args.dim, args.latency, args.token_latency)
+    print(f"Stub Ollama listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -56,6 +56,24 @@ def check_backend_health():
         logger.error(f"Backend health check failed: {e}")
         return False
 
+def wait_for_job(job_id, progress_bar, status_text, interval=1.0):
+    """轮询后台入库任务直到结束，并更新进度"""
+    while True:
+        response = requests.get(urljoin(BACKEND_URL, f"jobs/{job_id}"), timeout=10)
+        response.raise_for_status()
+        job = response.json()
+        if job["status"] in ("completed", "failed"):
+            return job
+        done = job["documents_done"] / max(job["documents_total"], 1)
+        progress_bar.progress(min(99, 30 + int(done * 69)))
+        stages = job["stages"]
+        status_text.text(
+            f"正在处理文件 {job['documents_done']}/{job['documents_total']}："
+            f"已分块 {stages['chunk']['items']}，已嵌入 {stages['embed']['items']}，"
+            f"已写入 {stages['insert']['items']}"
+        )
+        time.sleep(interval)
+
 # 添加标题
 st.title("企业知识库系统")
 
@@ -85,31 +103,43 @@ if uploaded_files:
         status_text = st.empty()
         
         try:
-            files = []
-            for file in uploaded_files:
-                logger.info(f"Processing file: {file.name}")
-                files.append(("files", (file.name, file, f"application/{file.name.split('.')[-1]}")))
-            
-            status_text.text("正在上传文件...")
-            progress_bar.progress(30)
+            # 每个文件单独一个请求上传，避免一次请求携带所有文件
+            job_ids = []
+            upload_errors = []
+            for i, file in enumerate(uploaded_files):
+                logger.info(f"Uploading file: {file.name}")
+                status_text.text(f"正在上传文件 {i + 1}/{len(uploaded_files)}: {file.name}")
+                response = requests.post(
+                    urljoin(BACKEND_URL, "upload/"),
+                    files=[("files", (file.name, file, f"application/{file.name.split('.')[-1]}"))],
+                    timeout=300
+                )
+                if response.status_code == 200:
+                    job_ids.append(response.json()["job_id"])
+                else:
+                    logger.error(f"Upload of {file.name} failed with status code {response.status_code}: {response.text}")
+                    upload_errors.append(f"{file.name}: {response.text}")
+                progress_bar.progress(int(30 * (i + 1) / len(uploaded_files)))
             
-            logger.info("Sending files to backend")
-            response = requests.post(
-                urljoin(BACKEND_URL, "upload/"),
-                files=files,
-                timeout=30
-            )
-            progress_bar.progress(70)
+            inserted = skipped = 0
+            job_errors = []
+            for job_id in job_ids:
+                logger.info(f"Waiting for ingest job: {job_id}")
+                job = wait_for_job(job_id, progress_bar, status_text)
+                inserted += job["inserted"]
+                skipped += job["skipped"]
+                job_errors.extend(job["errors"])
             
-            if response.status_code == 200:
-                logger.info("Files uploaded successfully")
+            if job_ids and not job_errors:
                 progress_bar.progress(100)
-                st.success("文件上传成功！")
+                st.success(f"文件处理完成！新增 {inserted} 个文本块，跳过 {skipped} 个未变化的文本块")
                 status_text.text("处理完成！")
-            else:
-                logger.error(f"Upload failed with status code {response.status_code}: {response.text}")
-                st.error(f"上传失败: {response.text}")
-                status_text.text("上传失败")
+            if job_errors:
+                logger.error(f"Ingest jobs failed: {job_errors}")
+                st.error(f"文件处理失败: {job_errors}")
+                status_text.text("处理失败")
+            if upload_errors:
+                st.error(f"上传失败: {upload_errors}")
         except requests.exceptions.ConnectionError as e:
             logger.error(f"Connection error: {e}")
             st.error("无法连接到后端服务，请确保后端服务正在运行")
@@ -125,6 +155,12 @@ if uploaded_files:
 # 搜索部分
 st.header("搜索知识库")
 query = st.text_input("输入搜索关键词")
+hybrid = st.checkbox("混合检索（语义 + 关键词）", help="适合型号、错误码、产品名等精确词查询")
+rerank = st.checkbox("重排", help="用交叉编码器对候选结果重新打分（需要后端配置 RAG_RERANK_MODEL）")
+doc_types = st.multiselect(
+    "只搜索这些文件类型",
+    [ext for extensions in SUPPORTED_FILE_TYPES.values() for ext in extensions],
+)
 
 if st.button("搜索"):
     if not query:
@@ -135,18 +171,32 @@ if st.button("搜索"):
                 logger.info(f"Searching for query: {query}")
                 response = requests.post(
                     urljoin(BACKEND_URL, "search/"),
-                    json={"query": query},
+                    json={
+                        "query": query,
+                        "mode": "hybrid" if hybrid else "dense",
+                        "rerank": rerank,
+                        "filters": {"doc_type": doc_types} if doc_types else None,
+                    },
                     headers={"Content-Type": "application/json"},
                     timeout=10
                 )
                 
                 if response.status_code == 200:
-                    results = response.json()["results"]
+                    data = response.json()
+                    results = data["results"]
                     logger.info(f"Found {len(results)} results")
                     if results:
                         for i, result in enumerate(results):
-                            score = 1 - result['score']  # 转换为相似度分数
-                            with st.expander(f"结果 {i+1} (相似度: {score:.2%})"):
+                            # COSINE/IP 本身就是相似度，L2 距离需要转换为相似度分数，RRF 融合分数直接显示
+                            if result['score'] is None:
+                                label = "未重排"
+                            elif data.get("metric_type") == "RRF":
+                                label = f"融合分数: {result['score']:.4f}"
+                            elif data.get("metric_type") in ("COSINE", "IP", "RERANK"):
+                                label = f"相似度: {result['score']:.2%}"
+                            else:
+                                label = f"相似度: {1 - result['score']:.2%}"
+                            with st.expander(f"结果 {i+1} ({label})"):
                                 st.write(result["text"])
                     else:
                         st.info("没有找到相关结果")
@@ -163,6 +213,75 @@ if st.button("搜索"):
             logger.error(f"Unexpected error: {e}")
             st.error(f"发生错误: {str(e)}")
 
+def iter_sse(response):
+    """解析 Server-Sent Events 响应，逐条返回 (事件名, 数据)"""
+    event, data = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if line is None:
+            continue
+        if not line:
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+
+# 问答部分
+st.header("知识库问答")
+question = st.text_input("输入问题")
+
+if st.button("生成回答"):
+    if not question:
+        st.warning("请输入问题")
+    else:
+        answer_box = st.empty()
+        try:
+            logger.info(f"Asking question: {question}")
+            with requests.post(
+                urljoin(BACKEND_URL, "ask"),
+                json={
+                    "question": question,
+                    "mode": "hybrid" if hybrid else "dense",
+                    "rerank": rerank,
+                    "filters": {"doc_type": doc_types} if doc_types else None,
+                },
+                stream=True,
+                timeout=(10, 300)
+            ) as response:
+                if response.status_code != 200:
+                    logger.error(f"Ask failed with status code {response.status_code}: {response.text}")
+                    st.error(f"生成回答失败: {response.text}")
+                else:
+                    sources = []
+                    answer = ""
+                    answer_box.info("正在生成回答...")
+                    # 逐段显示生成的文本
+                    for event, data in iter_sse(response):
+                        if event == "sources":
+                            sources = data
+                        elif event == "token":
+                            answer += data["text"]
+                            answer_box.markdown(answer)
+                        elif event == "error":
+                            logger.error(f"Answer generation failed: {data['detail']}")
+                            st.error(f"生成回答失败: {data['detail']}")
+                        elif event == "done":
+                            logger.info(f"Answer finished: {data}")
+                    for source in sources:
+                        with st.expander(f"资料 [{source['index']}] {source['metadata'].get('source', '')}"):
+                            st.write(source["text"])
+        except requests.exceptions.ConnectionError as e:
+            logger.error(f"Connection error: {e}")
+            st.error("无法连接到后端服务，请确保后端服务正在运行")
+        except requests.exceptions.Timeout as e:
+            logger.error(f"Request timeout: {e}")
+            st.error("请求超时，请稍后重试")
+        except Exception as e:
+            logger.error(f"Unexpected error: {e}")
+            st.error(f"发生错误: {str(e)}")
+
 # 添加页脚
 st.markdown("---")
 st.markdown("### 使用说明")
@@ -170,4 +289,5 @@ st.markdown("""
 1. 上传文件：支持多种文件类型（PDF、Excel、Word、Markdown、XML、图片、CSV）
 2. 搜索知识库：输入关键词，系统会返回最相关的内容
 3. 相似度分数：越高表示越相关
+4. 知识库问答：根据检索到的资料生成回答，并列出引用的资料
 """) 
\ No newline at end of file
@@ -1,14 +1,22 @@
 #!/bin/bash
 
-# 启动 Milvus
-docker-compose up -d
+# RAG_VECTOR_BACKEND=local 时使用进程内向量存储，不需要启动 Milvus
+if [ "${RAG_VECTOR_BACKEND:-milvus}" = "milvus" ]; then
+    # 启动 Milvus
+    docker-compose up -d
 
-# 等待 Milvus 启动
-echo "Waiting for Milvus to start..."
-sleep 30
+    # 等待 Milvus 就绪（最多 120 秒）
+    echo "Waiting for Milvus to start..."
+    for i in $(seq 1 120); do
+        if curl -sf http://localhost:9091/healthz > /dev/null; then
+            break
+        fi
+        sleep 1
+    done
+fi
 
 # 安装 Python 依赖
 pip install -r requirements.txt
 
-# 启动 FastAPI 服务
-uvicorn backend.main:app --host 0.0.0.0 --port 8000 --reload 
\ No newline at end of file
+# 启动 FastAPI 服务（监听地址、端口和 worker 数由 RAG_HOST、RAG_PORT、RAG_WORKERS 等环境变量配置）
+cd backend && python main.py
@@ -0,0 +1,172 @@
+"""缓冲写入测试：合并写入、按时间 / 行数触发、flush、写入失败和关闭
+
+    python -m pytest test_bulk_writer.py
+"""
+import os
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from bulk_writer import BulkWriter  # noqa: E402
+from local_store import LocalBackend  # noqa: E402
+from vector_store import VectorStore  # noqa: E402
+
+
+class Recorder:
+    """记录每次写入的批次；每批的结果是批次内容加上写入序号"""
+
+    def __init__(self, fail=False):
+        self.writes = []
+        self.fail = fail
+        self.written = threading.Event()
+
+    def __call__(self, batches):
+        self.writes.append(list(batches))
+        self.written.set()
+        if self.fail:
+            raise RuntimeError("insert failed")
+        return [(batch, len(self.writes)) for batch in batches]
+
+
+def collect(results):
+    def callback(result, error):
+        results.append((result, error))
+    return callback
+
+
+def test_flush_coalesces_batches_and_calls_back_in_order():
+    write = Recorder()
+    writer = BulkWriter(write, max_rows=100, max_delay=60)
+    results = []
+    for name in ("a", "b", "c"):
+        writer.add(name, rows=2, callback=collect(results))
+    assert writer.pending_rows() == 6
+    assert writer.flush() == 6
+    assert write.writes == [["a", "b", "c"]]
+    assert results == [(("a", 1), None), (("b", 1), None), (("c", 1), None)]
+    assert writer.stats() == {"pending_rows": 0, "pending_bytes": 0, "writes": 1, "rows_written": 6, "errors": 0}
+    assert writer.flush() == 0
+    writer.close()
+
+
+def test_background_write_after_max_rows_or_delay():
+    write = Recorder()
+    writer = BulkWriter(write, max_rows=4, max_delay=60)
+    writer.add("a", rows=2)
+    writer.add("b", rows=2)
+    assert write.written.wait(5)
+    assert write.writes == [["a", "b"]]
+    writer.close()
+
+    write = Recorder()
+    writer = BulkWriter(write, max_rows=1000, max_delay=0.05)
+    writer.add("a", rows=1)
+    assert write.written.wait(5)
+    assert write.writes == [["a"]]
+    writer.close()
+
+
+def test_failed_write_reports_error_to_every_batch():
+    write = Recorder(fail=True)
+    writer = BulkWriter(write, max_rows=100, max_delay=60)
+    results = []
+    writer.add("a", rows=1, callback=collect(results))
+    writer.add("b", rows=1, callback=collect(results))
+    assert writer.flush() == 0
+    assert [result for result, _ in results] == [None, None]
+    assert all(isinstance(error, RuntimeError) for _, error in results)
+    assert writer.stats()["errors"] == 1
+    # 失败的数据不会留在缓冲中重复写入
+    assert writer.pending_rows() == 0
+    writer.close()
+    assert len(write.writes) == 1
+
+
+def test_callback_errors_do_not_stop_other_callbacks():
+    writer = BulkWriter(Recorder(), max_rows=100, max_delay=60)
+    results = []
+
+    def broken(result, error):
+        raise ValueError("callback bug")
+
+    writer.add("a", rows=1, callback=broken)
+    writer.add("b", rows=1, callback=collect(results))
+    assert writer.flush() == 2
+    assert results == [(("b", 1), None)]
+    writer.close()
+
+
+def test_close_writes_remaining_rows_and_rejects_new_ones():
+    write = Recorder()
+    writer = BulkWriter(write, max_rows=100, max_delay=60)
+    writer.add("a", rows=3)
+    writer.close()
+    assert write.writes == [["a"]]
+    with pytest.raises(RuntimeError):
+        writer.add("b", rows=1)
+
+
+def test_add_blocks_when_buffer_is_full():
+    gate = threading.Event()
+    started = threading.Event()
+
+    def slow_write(batches):
+        started.set()
+        gate.wait(5)
+        return list(batches)
+
+    writer = BulkWriter(slow_write, max_rows=2, max_delay=60)
+    writer.add("a", rows=2)
+    # 后台线程取走 a 开始写入，阻塞在 gate 上
+    assert started.wait(5)
+    writer.add("b", rows=2)
+    writer.add("c", rows=2)
+    blocked = threading.Thread(target=writer.add, args=("d", 1))
+    blocked.start()
+    blocked.join(0.2)
+    assert blocked.is_alive()
+    gate.set()
+    blocked.join(5)
+    assert not blocked.is_alive()
+    writer.close()
+
+
+def test_vector_store_reports_failed_buffered_insert(tmp_path):
+    backend = LocalBackend(str(tmp_path / "store"), index_profile="flat")
+    store = VectorStore(
+        backend=backend,
+        embedding_dim=4,
+        embedding_cache_path=None,
+        lexical_index_path=None,
+        insert_buffer_delay=60,
+    )
+    try:
+        results = []
+        vectors = np.ones((2, 4), dtype=np.float32)
+        store.write_embeddings(["a", "b"], vectors, [{}, {}], "a.md", ["h1", "h2"], callback=collect(results))
+        insert = backend.insert
+
+        def unavailable(columns):
+            raise RuntimeError("backend down")
+
+        backend.insert = unavailable
+        assert store.flush() == 0
+        assert results[0][0] is None and isinstance(results[0][1], RuntimeError)
+        # 失败的批次不再算作缓冲中的写入，读取文档时不会等待它
+        assert store.get_document_hashes("a.md") == {}
+
+        backend.insert = insert
+        store.write_embeddings(["a"], vectors[:1], [{}], "a.md", ["h1"], callback=collect(results))
+        assert store.flush() == 1
+        assert results[1] == ([0], None)
+        assert store.get_document_hashes("a.md") == {"h1": [0]}
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
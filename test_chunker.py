@@ -0,0 +1,66 @@
+"""分块器测试
+
+    python -m pytest test_chunker.py
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from chunker import TextChunker, count_tokens, truncate_tokens  # noqa: E402
+
+
+def test_chunks_respect_size_and_keep_sentences_whole():
+    chunker = TextChunker(chunk_size=40, chunk_overlap=0)
+    sentences = [f"Sentence number {i} is here. " for i in range(10)]
+    chunks = list(chunker.split_text("".join(sentences)))
+    assert len(chunks) > 1
+    assert all(len(chunk["text"]) <= 40 for chunk in chunks)
+    assert " ".join(chunk["text"] for chunk in chunks) == "".join(sentences).strip()
+
+
+def test_overlap_repeats_trailing_sentences():
+    chunker = TextChunker(chunk_size=20, chunk_overlap=12)
+    chunks = [chunk["text"] for chunk in chunker.split_text("一二三四五。六七八九十。甲乙丙丁戊。己庚辛壬癸。")]
+    assert chunks == ["一二三四五。六七八九十。甲乙丙丁戊。", "六七八九十。甲乙丙丁戊。己庚辛壬癸。"]
+
+
+def test_long_sentence_is_split_by_characters():
+    chunker = TextChunker(chunk_size=10, chunk_overlap=0)
+    chunks = [chunk["text"] for chunk in chunker.split_text("x" * 25)]
+    assert chunks == ["x" * 10, "x" * 10, "x" * 5]
+
+
+def test_token_unit_counts_cjk_characters_and_words():
+    assert count_tokens("检索 RAG pipeline!") == 5
+    assert truncate_tokens("检索 RAG pipeline!", 3) == "检索 RAG"
+    chunker = TextChunker(chunk_size=4, chunk_overlap=0, unit="token")
+    chunks = [chunk["text"] for chunk in chunker.split_text("one two. three four. five six.")]
+    assert chunks == ["one two.", "three four.", "five six."]
+
+
+def test_sections_keep_metadata_and_number_chunks_across_the_document():
+    chunker = TextChunker(chunk_size=20, chunk_overlap=0)
+    sections = [
+        {"text": "First part. Second part. Third part.", "metadata": {"page": 1}},
+        {"text": "   ", "metadata": {"page": 2}},
+        {"text": "Last part.", "metadata": {"page": 3}},
+    ]
+    chunks = list(chunker.split_sections(sections))
+    assert [chunk["metadata"]["chunk_index"] for chunk in chunks] == list(range(len(chunks)))
+    assert [chunk["text"] for chunk in chunks] == ["First part.", "Second part.", "Third part.", "Last part."]
+    assert [chunk["metadata"]["page"] for chunk in chunks] == [1, 1, 1, 3]
+    # 块的元数据是副本，不会改到段落上
+    assert sections[0]["metadata"] == {"page": 1}
+
+
+@pytest.mark.parametrize("kwargs", [{"unit": "word"}, {"chunk_size": 10, "chunk_overlap": 10}, {"chunk_overlap": -1}])
+def test_invalid_settings_are_rejected(kwargs):
+    with pytest.raises(ValueError):
+        TextChunker(**kwargs)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
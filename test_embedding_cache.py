@@ -0,0 +1,140 @@
+"""嵌入缓存测试：键归一化、进程内 LRU 与 SQLite 两级查找、磁盘过期、计数和维度校验
+
+    python -m pytest test_embedding_cache.py
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from embedding_cache import EmbeddingCache, cache_key, normalize_text  # noqa: E402
+
+MODEL = "bge-m3"
+
+
+class Embedder:
+    """记录每次调用的文本；向量第一维是文本长度"""
+
+    def __init__(self, dim=3):
+        self.dim = dim
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return np.array([[float(len(text))] + [1.0] * (self.dim - 1) for text in texts], dtype=np.float32)
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "cache" / "embeddings.sqlite3")
+
+
+def test_keys_ignore_width_and_whitespace_differences():
+    assert normalize_text("  ＡＢＣ　１２３\n\tpump ") == "ABC 123 pump"
+    assert cache_key(MODEL, "ＡＢＣ  pump") == cache_key(MODEL, "ABC pump\n")
+    assert cache_key(MODEL, "pump") != cache_key("other-model", "pump")
+    assert cache_key(MODEL, "pump") != cache_key(MODEL, "pumps")
+
+
+def test_normalized_duplicates_are_computed_once():
+    cache = EmbeddingCache()
+    embed = Embedder()
+    vectors = cache.get_or_compute(MODEL, ["pump", " pump ", "ｐｕｍｐ", "valve"], embed)
+    assert embed.calls == [["pump", "valve"]]
+    assert vectors[:, 0].tolist() == [4.0, 4.0, 4.0, 5.0]
+
+
+def test_disk_hits_are_promoted_to_memory(cache_path):
+    first = EmbeddingCache(cache_path)
+    first.get_or_compute(MODEL, ["pump", "valve"], Embedder())
+    first.close()
+
+    # 新进程：内存为空，从 SQLite 读取并写回内存
+    cache = EmbeddingCache(cache_path)
+    embed = Embedder()
+    vectors = cache.get_or_compute(MODEL, ["pump", "valve", "motor"], embed)
+    assert embed.calls == [["motor"]]
+    assert vectors[:, 0].tolist() == [4.0, 5.0, 5.0]
+    assert cache.stats()["disk"] == {"enabled": True, "hits": 2, "misses": 1}
+
+    cache.get_or_compute(MODEL, ["pump", "valve", "motor"], embed)
+    assert len(embed.calls) == 1
+    stats = cache.stats()
+    assert stats["disk"]["hits"] == 2  # 第二次全部在内存中命中
+    assert stats["memory"]["hits"] == 3
+    assert stats["computed"] == 1
+    cache.close()
+
+
+def test_memory_evictions_fall_back_to_disk(cache_path):
+    cache = EmbeddingCache(cache_path, max_entries=2)
+    embed = Embedder()
+    cache.get_or_compute(MODEL, ["a", "bb", "ccc"], embed)
+    assert cache.stats()["memory"]["evictions"] == 1
+    assert len(cache.memory) == 2
+
+    # "a" 已被淘汰出内存，但磁盘上还有
+    assert cache.get_or_compute(MODEL, ["a"], embed)[0, 0] == 1.0
+    assert len(embed.calls) == 1
+    assert cache.stats()["disk"]["hits"] == 1
+    cache.close()
+
+
+def test_without_disk_evicted_entries_are_recomputed():
+    cache = EmbeddingCache(max_entries=1)
+    embed = Embedder()
+    cache.get_or_compute(MODEL, ["a"], embed)
+    cache.get_or_compute(MODEL, ["bb"], embed)
+    cache.get_or_compute(MODEL, ["a"], embed)
+    assert embed.calls == [["a"], ["bb"], ["a"]]
+    stats = cache.stats()
+    assert stats["disk"]["enabled"] is False
+    assert (stats["memory"]["misses"], stats["memory"]["evictions"], stats["computed"]) == (3, 2, 3)
+
+
+def age_entries(cache, seconds):
+    cache._db.execute("UPDATE embeddings SET created_at = created_at - ?", (seconds,))
+    cache._db.commit()
+
+
+def test_disk_ttl_skips_and_prunes_expired_entries(cache_path):
+    cache = EmbeddingCache(cache_path, disk_ttl=60)
+    cache.get_or_compute(MODEL, ["old", "older"], Embedder())
+    age_entries(cache, 120)
+    cache.get_or_compute(MODEL, ["new"], Embedder())
+    cache.memory.clear()
+
+    embed = Embedder()
+    cache.get_or_compute(MODEL, ["old", "new"], embed)
+    # 过期条目视为未命中并重新计算，重新写入后不再过期
+    assert embed.calls == [["old"]]
+    assert cache.prune() == 1
+    assert cache.get_cached(MODEL, ["older"]) == [None]
+    cache.close()
+
+    no_ttl = EmbeddingCache(cache_path)
+    assert no_ttl.prune() == 0
+    no_ttl.close()
+
+
+def test_dimension_mismatch_is_a_miss(cache_path):
+    cache = EmbeddingCache(cache_path)
+    cache.get_or_compute(MODEL, ["pump"], Embedder(dim=3), dim=3)
+
+    # 换成 4 维模型后，内存和磁盘中的 3 维条目都不能使用
+    embed = Embedder(dim=4)
+    vectors = cache.get_or_compute(MODEL, ["pump"], embed, dim=4)
+    assert embed.calls == [["pump"]]
+    assert vectors.shape == (1, 4)
+
+    cache.memory.clear()
+    assert cache.get_cached(MODEL, ["pump"], dim=4)[0].shape == (4,)
+    assert cache.get_cached(MODEL, ["pump"], dim=5) == [None]
+    cache.close()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
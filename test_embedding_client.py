@@ -0,0 +1,58 @@
+"""嵌入客户端测试：嵌入服务返回的条数或维度不对时报错，不返回未初始化的向量
+
+    python -m pytest test_embedding_client.py
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from embedding_client import AsyncEmbeddingClient, EmbeddingClient  # noqa: E402
+
+BATCH_URL = "http://localhost:11434/api/embed"
+
+
+def short_response(payload):
+    """/api/embed 只返回第一条文本的向量"""
+    return {"embeddings": [[1.0, 0.0, 0.0]]}
+
+
+def test_short_batch_response_is_rejected():
+    client = EmbeddingClient(url=BATCH_URL, dim=3)
+    client._post = short_response
+    try:
+        with pytest.raises(ValueError, match="Expected 3 embeddings"):
+            client.embed(["a", "b", "c"])
+    finally:
+        client.close()
+
+
+def test_async_short_batch_response_is_rejected():
+    client = AsyncEmbeddingClient(url=BATCH_URL, dim=3)
+
+    async def post(payload):
+        return short_response(payload)
+
+    client._post = post
+    with pytest.raises(ValueError, match="Expected 3 embeddings"):
+        asyncio.run(client.embed(["a", "b", "c"]))
+
+
+def test_full_batch_response_fills_every_row():
+    client = EmbeddingClient(url=BATCH_URL, dim=3, batch_size=2)
+    client._post = lambda payload: {"embeddings": [[float(len(text)), 0.0, 1.0] for text in payload["input"]]}
+    try:
+        vectors = client.embed(["a", "bb", "ccc"])
+        assert vectors[:, 0].tolist() == [1.0, 2.0, 3.0]
+        client._post = lambda payload: {"embeddings": [[1.0, 0.0]] * len(payload["input"])}
+        with pytest.raises(ValueError, match="dimension"):
+            client.embed(["a"])
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,76 @@
+"""结构化过滤条件 -> Milvus 表达式，以及标量字段提取的测试
+
+    python -m pytest test_filters.py
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from filters import SCALAR_FIELDS, build_filter_expr, combine_exprs, scalar_values  # noqa: E402
+from local_store import translate_expr  # noqa: E402
+
+
+@pytest.mark.parametrize(
+    "filters, expr",
+    [
+        (None, None),
+        ({}, None),
+        ({"doc_type": "pdf"}, 'doc_type == "pdf"'),
+        ({"source": ["a.pdf", "b.pdf"]}, 'source in ["a.pdf", "b.pdf"]'),
+        ({"page": {"gte": 3, "lte": 10}}, "page >= 3 and page <= 10"),
+        ({"section_path": {"prefix": "第一章"}}, 'section_path like "第一章%"'),
+        ({"doc_id": {"ne": 'say "hi"'}}, 'doc_id != "say \\"hi\\""'),
+        ({"doc_type": ["pdf"], "upload_time": {"gt": 1700000000}}, 'doc_type in ["pdf"] and upload_time > 1700000000'),
+    ],
+)
+def test_build_filter_expr(filters, expr):
+    assert build_filter_expr(filters) == expr
+    if expr:
+        # 生成的表达式本地后端也能解析
+        translate_expr(expr)
+
+
+@pytest.mark.parametrize(
+    "filters",
+    [
+        {"unknown": "x"},
+        {"page": "3"},
+        {"page": True},
+        {"doc_type": 1},
+        {"page": {"between": [1, 2]}},
+        {"page": {}},
+        {"source": []},
+        {"page": {"prefix": "1"}},
+        {"section_path": {"prefix": "50%"}},
+    ],
+)
+def test_invalid_filters_are_rejected(filters):
+    with pytest.raises(ValueError):
+        build_filter_expr(filters)
+
+
+def test_combine_exprs():
+    assert combine_exprs(None, "") is None
+    assert combine_exprs('doc_type == "pdf"', None) == 'doc_type == "pdf"'
+    assert combine_exprs("page > 1", "page < 5 or page == 9") == "(page > 1) and (page < 5 or page == 9)"
+
+
+def test_scalar_values_from_metadata():
+    values = scalar_values({"source": "a.xlsx", "file_type": "xlsx", "sheet": "Parts", "row_start": 2}, 1700000000.7)
+    assert values == {"source": "a.xlsx", "doc_type": "xlsx", "page": 0, "section_path": "Parts", "upload_time": 1700000000}
+    assert scalar_values(None, 0) == {"source": "", "doc_type": "", "page": 0, "section_path": "", "upload_time": 0}
+
+
+def test_scalar_strings_are_truncated_on_character_boundaries():
+    max_bytes = SCALAR_FIELDS["section_path"][1]
+    path = "章" * max_bytes  # 每个汉字 3 个字节
+    value = scalar_values({"path": path}, 0)["section_path"]
+    assert len(value.encode("utf-8")) <= max_bytes
+    assert value == "章" * (max_bytes // 3)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,108 @@
+"""后台入库流水线测试：同一文档的多次入库按提交顺序执行
+
+    python -m pytest test_ingest_jobs.py
+"""
+import hashlib
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from ingest_jobs import IngestPipeline  # noqa: E402
+
+
+class MemoryStore:
+    """只保存 hash -> 文本的向量存储替身"""
+
+    def __init__(self):
+        self.rows = {}
+        self.hash_reads = 0
+
+    def get_document_hashes(self, doc_id):
+        self.hash_reads += 1
+        return {digest: [i] for i, digest in enumerate(self.rows)}
+
+    @staticmethod
+    def chunk_hash(text, metadata=None):
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def get_embeddings(self, texts):
+        return np.zeros((len(texts), 4), dtype=np.float32)
+
+    def write_embeddings(self, texts, embeddings, metadatas, doc_id, chunk_hashes, callback=None):
+        self.rows.update(zip(chunk_hashes, texts))
+        callback(list(range(len(texts))), None)
+
+    def delete_document(self, doc_id, keep_hashes=None):
+        stale = [digest for digest in self.rows if digest not in keep_hashes]
+        for digest in stale:
+            del self.rows[digest]
+        return len(stale)
+
+
+class LineChunker:
+    def split_text(self, text, metadata=None):
+        for line in text.splitlines():
+            yield {"text": line, "metadata": dict(metadata or {})}
+
+
+def wait_finished(pipeline, job):
+    deadline = time.time() + 10
+    while pipeline.get(job.id)["status"] not in ("completed", "failed"):
+        assert time.time() < deadline
+        time.sleep(0.01)
+    return pipeline.get(job.id)
+
+
+def test_reingesting_a_document_waits_for_the_previous_job():
+    gate = threading.Event()
+
+    def extract_sections(doc_id, file_extension, content):
+        if content == "old":
+            gate.wait(10)
+        yield {"text": content, "metadata": {}}
+
+    store = MemoryStore()
+    pipeline = IngestPipeline(store, extract_sections, LineChunker(), parse_workers=2)
+    try:
+        first = pipeline.submit([("a.md", "md", "old")])
+        second = pipeline.submit([("a.md", "md", "new")])
+        time.sleep(0.2)
+        # 第二次入库没有在第一次结束前读取已有的块
+        assert store.hash_reads == 1
+        gate.set()
+        assert wait_finished(pipeline, first)["inserted"] == 1
+        result = wait_finished(pipeline, second)
+        assert (result["inserted"], result["deleted"]) == (1, 1)
+        assert list(store.rows.values()) == ["new"]
+        assert pipeline._doc_turns == {}
+    finally:
+        gate.set()
+        pipeline.close()
+
+
+def test_other_documents_are_not_blocked():
+    gate = threading.Event()
+
+    def extract_sections(doc_id, file_extension, content):
+        if doc_id == "slow.md":
+            gate.wait(10)
+        yield {"text": content, "metadata": {}}
+
+    pipeline = IngestPipeline(MemoryStore(), extract_sections, LineChunker(), parse_workers=2)
+    try:
+        pipeline.submit([("slow.md", "md", "slow")])
+        job = pipeline.submit([("b.md", "md", "b")])
+        assert wait_finished(pipeline, job)["status"] == "completed"
+    finally:
+        gate.set()
+        pipeline.close()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
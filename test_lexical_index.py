@@ -0,0 +1,82 @@
+"""BM25 关键词索引和倒数排名融合测试
+
+    python -m pytest test_lexical_index.py
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+import lexical_index  # noqa: E402
+from lexical_index import LexicalIndex, reciprocal_rank_fusion, tokenize  # noqa: E402
+
+DOCS = {
+    10: "Error E1.02 on pump AB-1234 after restart",
+    11: "Pump maintenance schedule and torque values",
+    12: "Torque spec for AB-5678 flange bolts",
+    13: "General safety instructions",
+}
+
+
+def make_index(path=None):
+    index = LexicalIndex(path=path)
+    index.add(list(DOCS), list(DOCS.values()))
+    return index
+
+
+def test_model_numbers_are_kept_whole_and_split():
+    assert tokenize("ＡＢ-1234 Error") == ["ab-1234", "ab", "1234", "error"]
+
+
+@pytest.mark.skipif(lexical_index.jieba is not None, reason="jieba is installed")
+def test_cjk_falls_back_to_bigrams():
+    assert tokenize("产品型号") == ["产品", "品型", "型号"]
+
+
+def test_exact_terms_rank_first():
+    index = make_index()
+    assert index.search("AB-1234", k=2)[0][0] == 10
+    assert index.search("e1.02", k=1)[0][0] == 10
+    assert [pk for pk, _ in index.search("torque", k=5)] in ([11, 12], [12, 11])
+    assert index.search("nothing matches", k=5) == []
+
+
+def test_delete_and_readd():
+    index = make_index()
+    index.delete([12])
+    assert len(index) == 3
+    assert [pk for pk, _ in index.search("torque", k=5)] == [11]
+    # 同一主键重新加入时以最后一次为准
+    index.add([11], ["completely different text"])
+    assert index.search("torque", k=5) == []
+    assert index.search("different", k=5)[0][0] == 11
+
+
+def test_save_and_load_keep_results(tmp_path):
+    path = str(tmp_path / "lexical.npz")
+    index = make_index(path)
+    # 删除超过 1/4 时保存前会压缩
+    index.delete([12, 13])
+    expected = [pk for pk, _ in index.search("pump torque", k=5)]
+    index.save()
+
+    loaded = LexicalIndex(path=path)
+    assert len(loaded) == 2
+    # 压缩前已删除文档仍计入文档频率，所以只比较排序
+    assert [pk for pk, _ in loaded.search("pump torque", k=5)] == expected
+    loaded.add([14], ["torque wrench"])
+    assert {pk for pk, _ in loaded.search("torque", k=5)} == {11, 14}
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 1]], k=60)
+    assert [pk for pk, _ in fused] == [1, 3, 2]
+    assert fused[0][1] == pytest.approx(1 / 61 + 1 / 62)
+    assert fused[1][1] == pytest.approx(1 / 63 + 1 / 61)
+    assert reciprocal_rank_fusion([[], []]) == []
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
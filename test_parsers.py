@@ -0,0 +1,221 @@
+"""文档解析测试：进程内解析和解析子进程的结果应一致
+
+    python -m pytest test_parsers.py
+
+缺少对应解析库（xlwt/xlrd 等）的用例会跳过。
+"""
+import os
+import pickle
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from parsers import extract_sections, parse_sections_list  # noqa: E402
+from parsing_executor import ParsingError, ParsingExecutor  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def executor():
+    executor = ParsingExecutor(max_workers=2, task_timeout=60, memory_limit_mb=None, pages_per_task=4)
+    yield executor
+    executor.shutdown()
+
+
+def make_pdf(path, pages, headings):
+    """每页一行正文，headings 中的页（从 1 开始）开头加一个大字号标题"""
+    fitz = pytest.importorskip("fitz")
+    doc = fitz.open()
+    for page_no in range(1, pages + 1):
+        page = doc.new_page()
+        y = 72
+        if page_no in headings:
+            page.insert_text((72, y), headings[page_no], fontsize=24)
+            y += 40
+        page.insert_text((72, y), f"body text on page {page_no}", fontsize=11)
+    doc.save(str(path))
+    doc.close()
+
+
+def test_pdf_sections_carry_across_page_ranges(executor, tmp_path):
+    path = tmp_path / "manual.pdf"
+    # pages_per_task=4：第 5、9 页起的页段开头没有标题，第 10 页的新章节要带到后面的页段
+    make_pdf(path, 20, {1: "Chapter One", 10: "Chapter Two"})
+
+    sections = list(executor.extract_sections("manual.pdf", "pdf", str(path)))
+    assert [s["metadata"]["page"] for s in sections] == list(range(1, 21))
+    assert [s["metadata"]["path"] for s in sections] == ["Chapter One"] * 9 + ["Chapter Two"] * 11
+    assert sections == list(extract_sections("manual.pdf", "pdf", path.read_bytes()))
+
+
+def test_pdf_without_headings_is_untitled(executor, tmp_path):
+    path = tmp_path / "plain.pdf"
+    make_pdf(path, 6, {})
+    sections = list(executor.extract_sections("plain.pdf", "pdf", str(path)))
+    assert {s["metadata"]["path"] for s in sections} == {"Untitled"}
+
+
+def make_xls(path, rows):
+    xlwt = pytest.importorskip("xlwt")
+    pytest.importorskip("xlrd")
+    workbook = xlwt.Workbook()
+    sheet = workbook.add_sheet("Parts")
+    for r, values in enumerate(rows):
+        for c, value in enumerate(values):
+            sheet.write(r, c, value)
+    workbook.save(str(path))
+
+
+def test_xls_through_executor(executor, tmp_path):
+    path = tmp_path / "parts.xls"
+    make_xls(path, [["part", "torque"], ["AB-1", 12], ["AB-2", 30]])
+
+    sections = list(executor.extract_sections("parts.xls", "xls", str(path)))
+    assert len(sections) == 1
+    assert sections[0]["text"] == "part: AB-1; torque: 12\npart: AB-2; torque: 30"
+    assert sections[0]["metadata"] == {
+        "source": "parts.xls", "file_type": "xls", "row_start": 2, "row_end": 3, "sheet": "Parts",
+    }
+    assert sections == list(extract_sections("parts.xls", "xls", path.read_bytes()))
+
+
+def test_csv_rows_become_header_value_records():
+    from tabular_processor import TabularProcessor
+
+    content = "part,torque,note\nAB-1,12,\nAB-2,30,loose\nAB-3,8,\n".encode("utf-8")
+    sections = list(TabularProcessor(rows_per_section=2, csv_chunk_rows=1).iter_csv_sections(content))
+    assert sections == [
+        {"text": "part: AB-1; torque: 12\npart: AB-2; torque: 30; note: loose",
+         "metadata": {"row_start": 2, "row_end": 3}},
+        {"text": "part: AB-3; torque: 8", "metadata": {"row_start": 4, "row_end": 4}},
+    ]
+
+
+def test_csv_falls_back_to_gb18030():
+    from tabular_processor import TabularProcessor
+
+    content = "型号,扭矩\nAB-1,12\n".encode("gb18030")
+    sections = list(TabularProcessor().iter_csv_sections(content))
+    assert sections[0]["text"] == "型号: AB-1; 扭矩: 12"
+
+
+def test_xlsx_sheets_skip_leading_blank_rows(tmp_path):
+    openpyxl = pytest.importorskip("openpyxl")
+    path = tmp_path / "parts.xlsx"
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = "Parts"
+    for row in [[None, None], ["part", "torque"], ["AB-1", 12], [None, None], ["AB-2", 30.0]]:
+        sheet.append(row)
+    workbook.create_sheet("Empty")
+    workbook.save(str(path))
+
+    sections = list(extract_sections("parts.xlsx", "xlsx", str(path)))
+    assert sections == [{
+        "text": "part: AB-1; torque: 12\npart: AB-2; torque: 30",
+        "metadata": {"source": "parts.xlsx", "file_type": "xlsx", "row_start": 3, "row_end": 5, "sheet": "Parts"},
+    }]
+
+
+XML = b"""<?xml version="1.0"?>
+<document>
+  <section title="Intro" level="1">
+    <content page="1">First paragraph.</content>
+    <section title="Details" level="2">
+      <content page="2">Nested paragraph.</content>
+    </section>
+  </section>
+  <catalog>
+    <item><name>Pump</name><model>AB-1</model></item>
+    <item><name>Valve</name><model>CD-2</model></item>
+    <notice>Read the <b>manual</b> first.</notice>
+  </catalog>
+</document>
+"""
+
+
+def test_xml_keeps_section_and_tag_paths():
+    from xml_processor import XMLProcessor
+
+    chunks = list(XMLProcessor().iter_chunks(XML))
+    assert chunks == [
+        {"text": "First paragraph.", "metadata": {"path": "Intro", "level": 1, "page": 1}},
+        {"text": "Nested paragraph.", "metadata": {"path": "Intro > Details", "level": 2, "page": 2}},
+        {"text": "name: Pump; model: AB-1", "metadata": {"path": "document > catalog > item", "level": 3}},
+        {"text": "name: Valve; model: CD-2", "metadata": {"path": "document > catalog > item", "level": 3}},
+        {"text": "Read the manual first.", "metadata": {"path": "document > catalog > notice", "level": 3}},
+    ]
+
+
+def test_xml_sections_merge_chunks_with_the_same_path(tmp_path):
+    from xml_processor import XMLProcessor
+
+    path = tmp_path / "catalog.xml"
+    path.write_bytes(XML)
+    sections = list(XMLProcessor().iter_sections(str(path)))
+    assert [section["metadata"]["path"] for section in sections] == [
+        "Intro", "Intro > Details", "document > catalog > item", "document > catalog > notice",
+    ]
+    assert sections[2]["text"] == "name: Pump; model: AB-1\nname: Valve; model: CD-2"
+
+
+def test_flat_xml_flushes_pending_leaves():
+    from xml_processor import XMLProcessor
+
+    xml = "<rows>" + "".join(f"<v>{i}</v>" for i in range(7)) + "</rows>"
+    chunks = list(XMLProcessor(max_pending_leaves=3).iter_chunks(xml))
+    assert [chunk["text"] for chunk in chunks] == ["v: 0; v: 1; v: 2", "v: 3; v: 4; v: 5", "v: 6"]
+
+
+def run_in_thread(executor, name, seconds, results):
+    def run():
+        try:
+            results[name] = list(executor._run_ordered(name, iter([(time.sleep, seconds)])))
+        except ParsingError as e:
+            results[name] = e
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def test_task_timeout_excludes_time_waiting_for_a_process():
+    executor = ParsingExecutor(max_workers=1, task_timeout=1.5, memory_limit_mb=None)
+    try:
+        results = {}
+        # 只有一个子进程：第二个任务排队约 1 秒，开始执行后只用 1 秒，不算超时
+        threads = [run_in_thread(executor, name, 1.0, results) for name in ("a", "b")]
+        for thread in threads:
+            thread.join(30)
+        assert results == {"a": [None], "b": [None]}
+    finally:
+        executor.shutdown()
+
+
+def test_timeout_only_fails_the_slow_task():
+    executor = ParsingExecutor(max_workers=2, task_timeout=1.5, memory_limit_mb=None)
+    try:
+        results = {}
+        slow = run_in_thread(executor, "slow", 60, results)
+        quick = run_in_thread(executor, "quick", 1.0, results)
+        slow.join(30)
+        quick.join(30)
+        assert isinstance(results["slow"], ParsingError) and "timed out" in str(results["slow"])
+        # 终止超时进程会让进程池中其他任务一起失败，这些任务会重新提交
+        assert results["quick"] == [None]
+        assert list(executor._run_ordered("after", iter([(time.sleep, 0)]))) == [None]
+    finally:
+        executor.shutdown()
+
+
+def test_pool_tasks_return_picklable_results(tmp_path):
+    path = tmp_path / "parts.csv"
+    path.write_text("part,torque\nAB-1,12\n")
+    sections = parse_sections_list("csv", str(path))
+    assert pickle.loads(pickle.dumps(sections)) == sections
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
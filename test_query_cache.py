@@ -0,0 +1,85 @@
+"""检索结果缓存测试：精确 / 语义命中，以及写入后按 generation 失效
+
+    python -m pytest test_query_cache.py
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from local_store import LocalBackend  # noqa: E402
+from query_cache import QueryCache  # noqa: E402
+from vector_store import VectorStore  # noqa: E402
+
+RESULTS = [{"id": 1, "text": "cached", "score": 0.9}]
+
+
+def test_exact_hit_ignores_case_and_whitespace():
+    cache = QueryCache()
+    cache.put("Pump  Torque", "k=5", 0, RESULTS)
+    assert cache.get("pump torque", "k=5", 0) == RESULTS
+    assert cache.get("pump torque", "k=10", 0) is None
+
+
+def test_write_invalidates_exact_and_semantic_entries():
+    cache = QueryCache(similarity_threshold=0.9)
+    embedding = np.array([1.0, 0.0, 0.0])
+    cache.put("pump torque", "k=5", 3, RESULTS, embedding=embedding)
+    assert cache.get("pump torque", "k=5", 4) is None
+    assert cache.get_similar(embedding, "k=5", 4) is None
+    assert cache.stats()["stale"] == 2
+    # 失效的条目已删除，回到旧 generation 也不会再命中
+    assert cache.get("pump torque", "k=5", 3) is None
+    assert cache.get_similar(embedding, "k=5", 3) is None
+
+
+def test_semantic_hit_needs_same_params_and_close_vector():
+    cache = QueryCache(similarity_threshold=0.95)
+    cache.put("pump torque", "k=5", 0, RESULTS, embedding=[1.0, 0.0, 0.0])
+    assert cache.get_similar([0.99, 0.05, 0.0], "k=5", 0) == RESULTS
+    assert cache.get_similar([0.99, 0.05, 0.0], "k=10", 0) is None
+    assert cache.get_similar([0.7, 0.7, 0.0], "k=5", 0) is None
+    stats = cache.stats()["semantic"]
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+
+
+def test_semantic_slots_evict_least_recently_used():
+    cache = QueryCache(max_semantic_entries=2, similarity_threshold=0.99)
+    cache.put("a", "k", 0, ["a"], embedding=[1.0, 0.0])
+    cache.put("b", "k", 0, ["b"], embedding=[0.0, 1.0])
+    assert cache.get_similar([1.0, 0.0], "k", 0) == ["a"]
+    cache.put("c", "k", 0, ["c"], embedding=[-1.0, 0.0])
+    assert cache.get_similar([0.0, 1.0], "k", 0) is None
+    assert cache.get_similar([1.0, 0.0], "k", 0) == ["a"]
+
+
+def test_vector_store_generation_changes_on_every_write(tmp_path):
+    store = VectorStore(
+        backend=LocalBackend(str(tmp_path / "store"), index_profile="flat"),
+        embedding_dim=4,
+        embedding_cache_path=None,
+        lexical_index_path=None,
+        generation_path=str(tmp_path / "generation"),
+    )
+    store.embedder.embed = lambda texts: np.ones((len(texts), 4), dtype=np.float32)
+    try:
+        cache = QueryCache()
+        cache.put("query", "k=5", store.generation, RESULTS)
+        store.upsert_document("a.md", [{"text": "new chunk", "metadata": {}}])
+        assert cache.get("query", "k=5", store.generation) is None
+
+        cache.put("query", "k=5", store.generation, RESULTS)
+        # 内容没有变化的重新上传不会让缓存失效
+        store.upsert_document("a.md", [{"text": "new chunk", "metadata": {}}])
+        assert cache.get("query", "k=5", store.generation) == RESULTS
+        store.delete_document("a.md")
+        assert cache.get("query", "k=5", store.generation) is None
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
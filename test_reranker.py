@@ -0,0 +1,93 @@
+"""交叉编码器重排测试：打分失败或超出预算时保持召回顺序，不让检索请求失败
+
+    python -m pytest test_reranker.py
+"""
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from reranker import CrossEncoderReranker  # noqa: E402
+
+
+class LengthModel:
+    """分数为文本长度；文本中含 fail 的批次抛出异常"""
+
+    def __init__(self, gate=None):
+        self.gate = gate
+
+    def predict(self, pairs, batch_size=None):
+        if self.gate is not None:
+            self.gate.wait(5)
+        if any("fail" in text for _, text in pairs):
+            raise RuntimeError("CUDA out of memory")
+        return [len(text) for _, text in pairs]
+
+
+def make_reranker(model, **kwargs):
+    reranker = CrossEncoderReranker(**kwargs)
+    reranker._model = model
+    return reranker
+
+
+def hits(*texts):
+    return [{"text": text, "score": 1.0 / (i + 1)} for i, text in enumerate(texts)]
+
+
+def test_scores_and_sorts_candidates():
+    reranker = make_reranker(LengthModel(), batch_size=2)
+    try:
+        results = reranker.rerank("q", hits("a", "ccc", "bb"), k=2)
+        assert [hit["text"] for hit in results] == ["ccc", "bb"]
+        assert results[0]["score"] == 3.0 and results[0]["retrieval_score"] == 0.5
+    finally:
+        reranker.close()
+
+
+def test_failed_batch_keeps_retrieval_order():
+    reranker = make_reranker(LengthModel(), batch_size=2)
+    try:
+        results = reranker.rerank("q", hits("fail", "x", "long text", "yy"))
+        # 第一批打分失败，排在第二批已打分的候选之后，批内保持召回顺序
+        assert [hit["text"] for hit in results] == ["long text", "yy", "fail", "x"]
+        assert results[2]["score"] is None
+        assert reranker.stats()["errors"] == 1
+    finally:
+        reranker.close()
+
+
+def test_unavailable_model_returns_retrieval_order():
+    reranker = CrossEncoderReranker()
+
+    def missing():
+        raise ImportError("No module named 'sentence_transformers'")
+
+    reranker._get_model = missing
+    try:
+        results = reranker.rerank("q", hits("a", "bbb"))
+        assert [hit["text"] for hit in results] == ["a", "bbb"]
+        assert reranker.stats()["errors"] == 1
+    finally:
+        reranker.close()
+
+
+def test_running_batches_are_cached_after_the_budget():
+    gate = threading.Event()
+    reranker = make_reranker(LengthModel(gate), batch_size=1, max_workers=1, budget_ms=50)
+    try:
+        results = reranker.rerank("q", hits("a", "bbb"))
+        assert [hit["score"] for hit in results] == [None, None]
+        assert reranker.stats()["over_budget"] == 1
+        gate.set()
+        reranker._executor.shutdown(wait=True)
+        # 已经开始的第一批算完后写入缓存，还没开始的第二批被取消
+        assert reranker.stats()["scored_pairs"] == 1
+    finally:
+        reranker.close()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
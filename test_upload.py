@@ -0,0 +1,78 @@
+"""上传接口测试：没有交给入库流水线的临时文件要删除并归还额度
+
+    python -m pytest test_upload.py
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+pytest.importorskip("httpx")
+from fastapi.testclient import TestClient  # noqa: E402
+
+import main  # noqa: E402
+from ingest_jobs import IngestPipeline  # noqa: E402
+from upload_spool import IngestBudgetExceeded, UploadSpool  # noqa: E402
+
+
+@pytest.fixture
+def failing_pipeline(monkeypatch):
+    """submit 在文件进入队列前失败的入库流水线"""
+    pipeline = IngestPipeline(None, None, None)
+
+    def broken(jobs):
+        raise RuntimeError("job store unavailable")
+
+    pipeline._persist = broken
+    monkeypatch.setattr(main, "ingest_pipeline", pipeline)
+    yield pipeline
+    pipeline.close()
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    spool = UploadSpool(str(tmp_path / "uploads"), max_bytes=1024)
+    monkeypatch.setattr(main, "upload_spool", spool)
+    main.app.dependency_overrides[main.tenant_store] = lambda: object()
+    # 不进入 with 块，不触发启动事件（不连接向量库、不启动解析进程池）
+    yield TestClient(main.app), spool
+    main.app.dependency_overrides.clear()
+
+
+def spooled_files(spool):
+    return os.listdir(spool.directory)
+
+
+def test_failed_submit_discards_spooled_files(client, failing_pipeline):
+    client, spool = client
+    response = client.post("/upload/", files=[("files", ("a.md", b"aaa")), ("files", ("b.md", b"bbb"))])
+    assert response.status_code == 500
+    assert spool.used == 0 and spooled_files(spool) == []
+
+
+def test_budget_exceeded_discards_earlier_files(client, failing_pipeline):
+    client, spool = client
+    response = client.post("/upload/", files=[("files", ("a.md", b"a" * 600)), ("files", ("b.md", b"b" * 600))])
+    assert response.status_code == 503
+    assert spool.used == 0 and spooled_files(spool) == []
+
+
+def test_discard_during_spool_releases_the_budget(tmp_path):
+    spool = UploadSpool(str(tmp_path), max_bytes=1024)
+    path = spool.new_path("txt")
+
+    class Reader:
+        def read(self, size):
+            # 写入过程中被 discard（请求被取消）
+            spool.discard(path)
+            return b"x"
+
+    with pytest.raises(IngestBudgetExceeded):
+        spool.spool(Reader(), "txt", path)
+    assert spool.used == 0 and not os.path.exists(path)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
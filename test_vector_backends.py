@@ -0,0 +1,348 @@
+"""向量存储后端一致性测试：Milvus 和本地后端运行同一组用例
+
+    python -m pytest test_vector_backends.py
+
+本地后端不依赖任何外部服务；Milvus 后端需要 localhost:19530 上的 Milvus，连接不上时跳过。
+"""
+import hashlib
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from filters import SCALAR_FIELDS  # noqa: E402
+from local_store import LocalBackend, translate_expr  # noqa: E402
+from vector_store import VectorStore  # noqa: E402
+
+DIM = 16
+ROWS = 400
+DOC_TYPES = ["pdf", "docx", "xml", "csv"]
+
+
+def make_columns(n, seed=0, doc_prefix="doc"):
+    rng = np.random.default_rng(seed)
+    columns = {
+        "doc_id": [f"{doc_prefix}{i % 10}" for i in range(n)],
+        "chunk_hash": [hashlib.sha256(f"{doc_prefix}{seed}-{i}".encode()).hexdigest() for i in range(n)],
+        "text": [f"chunk {i} of {doc_prefix}{i % 10}" for i in range(n)],
+        "embedding": rng.normal(size=(n, DIM)).astype(np.float32),
+        "metadata": [{"chunk_index": i, "lang": "zh" if i % 2 else "en"} for i in range(n)],
+        "source": [f"{doc_prefix}{i % 10}" for i in range(n)],
+        "doc_type": [DOC_TYPES[i % len(DOC_TYPES)] for i in range(n)],
+        "page": [i % 7 for i in range(n)],
+        "section_path": [("A > B" if i % 3 == 0 else "C") for i in range(n)],
+        "upload_time": [1700000000 + i for i in range(n)],
+    }
+    assert set(SCALAR_FIELDS) <= set(columns)
+    return columns
+
+
+def milvus_backend():
+    try:
+        from pymilvus import utility
+        from milvus_store import MilvusBackend
+    except ImportError:
+        pytest.skip("pymilvus is not installed")
+    try:
+        backend = MilvusBackend(collection_name="conformance_test", index_profile="flat", max_retries=1)
+    except Exception as e:
+        pytest.skip(f"Milvus is not available: {e}")
+    if backend.collection is not None:
+        utility.drop_collection("conformance_test")
+        backend.collection = None
+    return backend
+
+
+@pytest.fixture(params=["local-flat", "local-ivf", "milvus"])
+def backend(request, tmp_path):
+    if request.param == "milvus":
+        backend = milvus_backend()
+    else:
+        profile = "flat" if request.param == "local-flat" else "ivf_flat"
+        backend = LocalBackend(str(tmp_path / "store"), index_profile=profile)
+    backend.prepare(DIM)
+    yield backend
+    backend.close()
+    if request.param == "milvus":
+        backend.collection.drop()
+
+
+@pytest.fixture
+def loaded(backend):
+    columns = make_columns(ROWS)
+    ids = backend.insert(columns)
+    backend.flush()
+    return backend, columns, ids
+
+
+def ordered(backend, scores):
+    """L2 距离越小越相关，其他度量越大越相关"""
+    if backend.metric_type == "L2":
+        return scores == sorted(scores)
+    return scores == sorted(scores, reverse=True)
+
+
+def test_insert_returns_unique_ids(loaded):
+    backend, columns, ids = loaded
+    assert len(ids) == ROWS
+    assert len(set(ids)) == ROWS
+    assert backend.count() == ROWS
+
+
+def test_search_finds_stored_vector(loaded):
+    backend, columns, ids = loaded
+    results = backend.search(columns["embedding"][:5], limit=10)
+    assert len(results) == 5
+    for i, hits in enumerate(results):
+        assert len(hits) == 10
+        assert hits[0]["id"] == ids[i]
+        assert hits[0]["text"] == columns["text"][i]
+        assert hits[0]["metadata"] == columns["metadata"][i]
+        assert ordered(backend, [hit["score"] for hit in hits])
+
+
+@pytest.mark.parametrize(
+    "expr, predicate",
+    [
+        ('doc_type == "pdf"', lambda c, i: c["doc_type"][i] == "pdf"),
+        ('doc_type in ["xml", "csv"]', lambda c, i: c["doc_type"][i] in ("xml", "csv")),
+        ("page >= 2 and page <= 4", lambda c, i: 2 <= c["page"][i] <= 4),
+        ('section_path like "A%"', lambda c, i: c["section_path"][i].startswith("A")),
+        ('not (doc_id == "doc1") and page != 0', lambda c, i: c["doc_id"][i] != "doc1" and c["page"][i] != 0),
+        ('doc_type == "pdf" or page == 6', lambda c, i: c["doc_type"][i] == "pdf" or c["page"][i] == 6),
+        ('metadata["lang"] == "zh"', lambda c, i: c["metadata"][i]["lang"] == "zh"),
+    ],
+)
+def test_search_applies_filter(loaded, expr, predicate):
+    backend, columns, ids = loaded
+    index = {pk: i for i, pk in enumerate(ids)}
+    expected = [i for i in range(ROWS) if predicate(columns, i)]
+    hits = backend.search(columns["embedding"][expected[:1]], limit=20, expr=expr)[0]
+    assert hits[0]["id"] == ids[expected[0]]
+    assert all(predicate(columns, index[hit["id"]]) for hit in hits)
+
+    rows = list(backend.query(expr, ["doc_type"]))
+    assert sorted(row["id"] for row in rows) == sorted(ids[i] for i in expected)
+
+
+def test_filter_without_matches_returns_nothing(loaded):
+    backend, columns, ids = loaded
+    assert backend.search(columns["embedding"][:2], limit=5, expr='doc_type == "md"') == [[], []]
+
+
+def test_query_returns_requested_fields(loaded):
+    backend, columns, ids = loaded
+    rows = list(backend.query('doc_id == "doc3"', ["chunk_hash", "text", "metadata"]))
+    expected = {ids[i]: i for i in range(ROWS) if columns["doc_id"][i] == "doc3"}
+    assert sorted(row["id"] for row in rows) == sorted(expected)
+    for row in rows:
+        i = expected[row["id"]]
+        assert row["chunk_hash"] == columns["chunk_hash"][i]
+        assert row["text"] == columns["text"][i]
+        assert row["metadata"] == columns["metadata"][i]
+
+
+def test_delete_removes_rows(loaded):
+    backend, columns, ids = loaded
+    backend.delete(ids[:10])
+    backend.flush()
+    assert backend.count() == ROWS - 10
+    hits = backend.search(columns["embedding"][:10], limit=5)
+    assert not {hit["id"] for query_hits in hits for hit in query_hits} & set(ids[:10])
+    assert not {row["id"] for row in backend.query("id >= 0", [])} & set(ids[:10])
+
+
+def test_insert_after_delete_keeps_ids_unique(loaded):
+    backend, columns, ids = loaded
+    backend.delete(ids[-5:])
+    new_ids = backend.insert(make_columns(5, seed=1, doc_prefix="new"))
+    assert not set(new_ids) & set(ids)
+
+
+def test_search_params_are_validated(loaded):
+    backend, columns, ids = loaded
+    with pytest.raises(ValueError):
+        backend.check_search_params({"not_a_param": 1})
+
+
+def test_local_store_persists_across_restarts(tmp_path):
+    path = str(tmp_path / "store")
+    backend = LocalBackend(path, index_profile="ivf_flat")
+    backend.prepare(DIM)
+    columns = make_columns(ROWS)
+    ids = backend.insert(columns)
+    backend.delete(ids[:3])
+    backend.close()
+
+    reopened = LocalBackend(path, index_profile="ivf_flat")
+    assert reopened.existing_dim() == DIM
+    reopened.prepare(DIM)
+    assert reopened.count() == ROWS - 3
+    hits = reopened.search(columns["embedding"][3:4], limit=1)[0]
+    assert hits[0]["id"] == ids[3]
+    reopened.close()
+
+
+def test_deleted_tail_ids_are_not_reused_after_restart(tmp_path):
+    path = str(tmp_path / "store")
+    backend = LocalBackend(path, index_profile="flat")
+    backend.prepare(DIM)
+    ids = backend.insert(make_columns(10))
+    backend.delete(ids[-3:])
+    backend.close()
+
+    reopened = LocalBackend(path, index_profile="flat")
+    reopened.prepare(DIM)
+    new_ids = reopened.insert(make_columns(5, seed=1))
+    assert not set(new_ids) & set(ids)
+    assert min(new_ids) > max(ids)
+    reopened.close()
+
+
+@pytest.mark.parametrize(
+    "expr",
+    ["doc_type ==", "unknown == 1", 'doc_type = "pdf"', "page in [1, 2", "(page > 1", 'doc_type like 1', "metadata == 1"],
+)
+def test_invalid_expressions_are_rejected(expr):
+    with pytest.raises(ValueError):
+        translate_expr(expr)
+
+
+def fake_embed(texts):
+    """由文本哈希生成的确定性向量，代替 Ollama"""
+    return np.stack([
+        np.random.default_rng(int(hashlib.sha256(t.encode()).hexdigest()[:8], 16)).normal(size=DIM)
+        for t in texts
+    ]).astype(np.float32)
+
+
+def test_vector_store_on_local_backend(tmp_path):
+    store = VectorStore(
+        backend=LocalBackend(str(tmp_path / "store"), index_profile="flat"),
+        embedding_dim=DIM,
+        embedding_cache_path=str(tmp_path / "cache.sqlite3"),
+        lexical_index_path=str(tmp_path / "lexical.npz"),
+    )
+    store.embedder.embed = fake_embed
+    try:
+        chunks = [
+            {"text": f"part AB-{i} torque spec", "metadata": {"source": "a.pdf", "file_type": "pdf", "page": i}}
+            for i in range(1, 6)
+        ]
+        assert store.upsert_document("a.pdf", chunks)["inserted"] == 5
+        assert store.upsert_document("a.pdf", chunks)["skipped"] == 5
+        store.insert_embeddings(["other file"], fake_embed(["other file"]), [{"file_type": "md"}], "b.md")
+
+        hits = store.search("part AB-3 torque spec", k=3)
+        assert hits[0]["text"] == "part AB-3 torque spec"
+        hits = store.search("AB-4", k=1, mode="hybrid")
+        assert hits[0]["text"] == "part AB-4 torque spec"
+        hits = store.search("other file", k=10, expr='doc_type == "pdf" and page <= 2')
+        assert sorted(hit["metadata"]["page"] for hit in hits) == [1, 2]
+
+        assert store.delete_document("a.pdf") == 5
+        assert [hit["text"] for hit in store.search("part AB-3 torque spec", k=5)] == ["other file"]
+    finally:
+        store.close()
+
+
+def test_hybrid_search_fuses_and_filters_lexical_hits(tmp_path):
+    store = VectorStore(
+        backend=LocalBackend(str(tmp_path / "store"), index_profile="flat"),
+        embedding_dim=DIM,
+        embedding_cache_path=None,
+        lexical_index_path=str(tmp_path / "lexical.npz"),
+    )
+    store.embedder.embed = fake_embed
+    try:
+        texts = [f"filler text {i}" for i in range(30)] + ["pump AB-1234 manual", "pump AB-1234 datasheet"]
+        metadatas = [{"file_type": "md"}] * 30 + [{"file_type": "pdf"}, {"file_type": "csv"}]
+        ids = store.insert_embeddings(texts, fake_embed(texts), metadatas, "docs")
+
+        # 稠密检索找不到型号，关键词检索只命中两个块
+        hits = store.search("AB-1234", k=5, mode="hybrid")
+        assert {hit["id"] for hit in hits[:2]} == set(ids[-2:])
+        assert all(hits[i]["score"] >= hits[i + 1]["score"] for i in range(len(hits) - 1))
+        # 只在关键词结果中出现的块同样要满足过滤条件
+        hits = store.search("AB-1234", k=5, mode="hybrid", expr='doc_type == "pdf"')
+        assert [hit["id"] for hit in hits] == [ids[-2]]
+        assert hits[0]["metadata"] == {"file_type": "pdf"}
+    finally:
+        store.close()
+
+
+def test_upsert_only_embeds_changed_chunks(tmp_path):
+    store = VectorStore(
+        backend=LocalBackend(str(tmp_path / "store"), index_profile="flat"),
+        embedding_dim=DIM,
+        embedding_cache_path=None,
+        lexical_index_path=None,
+    )
+    embedded = []
+
+    def counting_embed(texts):
+        embedded.extend(texts)
+        return fake_embed(texts)
+
+    store.embedder.embed = counting_embed
+    try:
+        chunks = [{"text": f"chunk {i}", "metadata": {"chunk_index": i}} for i in range(5)]
+        assert store.upsert_document("a.md", chunks) == {"inserted": 5, "skipped": 0, "deleted": 0}
+
+        # 改一块、删一块、其余块位置变化（chunk_index 不参与内容哈希）
+        store.embedding_cache.memory.clear()
+        embedded.clear()
+        changed = [{"text": "chunk 0 edited", "metadata": {"chunk_index": 0}}] + [
+            {"text": f"chunk {i}", "metadata": {"chunk_index": i - 1}} for i in (1, 2, 4)
+        ]
+        assert store.upsert_document("a.md", changed) == {"inserted": 1, "skipped": 3, "deleted": 2}
+        assert embedded == ["chunk 0 edited"]
+        texts = sorted(row["text"] for row in store.backend.query('doc_id == "a.md"', ["text"]))
+        assert texts == ["chunk 0 edited", "chunk 1", "chunk 2", "chunk 4"]
+
+        # 历史上重复写入的块只保留一条；其他文档不受影响
+        store.insert_embeddings(["chunk 1"], fake_embed(["chunk 1"]), [{"chunk_index": 1}], "a.md")
+        store.insert_embeddings(["chunk 1"], fake_embed(["chunk 1"]), [{}], "b.md")
+        assert store.upsert_document("a.md", changed) == {"inserted": 0, "skipped": 4, "deleted": 1}
+        assert store.backend.count() == 5
+    finally:
+        store.close()
+
+
+def test_binary_rescoring_does_not_call_the_embedder(tmp_path):
+    backend = LocalBackend(str(tmp_path / "store"), index_profile="flat")
+    # 模拟二值向量后端：检索后由 VectorStore 用全精度向量重新打分
+    backend.rescore = True
+    store = VectorStore(
+        backend=backend,
+        embedding_dim=DIM,
+        embedding_cache_path=None,
+        lexical_index_path=None,
+        rescore_vectors_path=str(tmp_path / "rescore.sqlite3"),
+    )
+    store.embedder.embed = fake_embed
+    try:
+        texts = [f"chunk {i}" for i in range(20)]
+        store.add_documents(texts, [{"file_type": "md"}] * len(texts), doc_id="a.md")
+        store.embedding_cache.memory.clear()
+
+        def unavailable(texts):
+            raise RuntimeError("embedding service is down")
+
+        store.embedder.embed = unavailable
+        query = fake_embed(["chunk 7"])[0]
+        hits = store.search("chunk 7", k=3, query_embedding=query)
+        assert hits[0]["text"] == "chunk 7"
+        assert hits[0]["score"] == pytest.approx(1.0, abs=1e-5)
+
+        assert store.delete_document("a.md") == 20
+        assert store.rescore_vectors.get(range(100)) == {}
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))